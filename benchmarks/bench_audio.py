@@ -0,0 +1,119 @@
+"""Narration playback: the AudioEngine against the null output device.
+
+Pulls blocks from the engine's stream callback by hand to check that queued
+clips come out back to back without a gap (at several block sizes), that skip
+moves straight on to the next clip and that volume scales the samples. It then
+streams two sentences from the mock AllTalk server (see mock_backends.py) and
+checks that /skip drops the whole first sentence, not just one downloaded
+piece of it. Finally it plays real-time on AUDIO_DEVICE=null to show that
+play() returns at once while the clips take their full length to play out.
+
+    python benchmarks/bench_audio.py
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+
+import numpy as np
+
+from mock_backends import MockBackends
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+def make_clips(count, rng):
+    return [rng.integers(-30000, 30000, size=(int(rng.integers(1, 5000)), 1), dtype=np.int16) for _ in range(count)]
+
+def pull(engine, frames, blocks):
+    out = []
+    for _ in range(blocks):
+        outdata = np.empty((frames, 1), dtype=np.int16)
+        engine._callback(outdata, frames, None, None)
+        out.append(outdata[:, 0].copy())
+    return np.concatenate(out)
+
+def check_gapless(clips, blocksize):
+    engine = main.AudioEngine(blocksize=blocksize)
+    engine.clips.extend(enumerate(clips))
+    expected = np.concatenate(clips)[:, 0]
+    played = pull(engine, blocksize, len(expected) // blocksize + 2)
+    assert np.array_equal(played[:len(expected)], expected), f"clips not joined sample-exact at block size {blocksize}"
+    assert not played[len(expected):].any(), "an idle stream must play silence"
+    assert engine.wait(0), "the engine should be idle once the queue has played out"
+
+def check_skip_and_volume():
+    first, second = np.full((4000, 1), 1000, dtype=np.int16), np.full((4000, 1), 2000, dtype=np.int16)
+    engine = main.AudioEngine(blocksize=256)
+    engine.clips.extend([(1, first), (2, second)])
+    pull(engine, 256, 2)
+    engine.skip()
+    assert (pull(engine, 256, 1) == 2000).all(), "skip should go straight to the next clip"
+    engine.set_volume(0.5)
+    assert (pull(engine, 256, 1) == 1000).all(), "volume 0.5 should halve the samples"
+    engine.stop()
+    assert not pull(engine, 256, 1).any() and engine.wait(0), "stop should drop everything queued"
+
+def check_skip_streamed():
+    backends = MockBackends(tts_latency=0).start()
+    main.alltalk_client = main.BackendClient(backends.url)
+    main.health_monitor.is_available = lambda name: True
+    main.TTS_STREAMING = True
+    main.tts_cache = None
+    # Never started: the stream is pulled by hand below
+    engine = main.audio_engine = main.AudioEngine(blocksize=256)
+    engine.stream = main.NullOutputStream(engine.samplerate, engine.blocksize, engine._callback)
+    narrator = main.NarrationPipeline()
+    first, second = "The torchlight flickers across the damp stone walls.", "A bell rings."
+    try:
+        for text in (first, second):
+            clip = engine.new_clip()
+            main.fetch_speech(text, main.DEFAULT_VOICE, functools.partial(narrator._play, narrator.generation, clip))
+    finally:
+        backends.stop()
+    pieces = sum(1 for clip, _ in engine.clips if clip == engine.clips[0][0])
+    assert pieces > 1, "the first sentence should arrive in several pieces"
+    second_seconds = engine.queued_seconds() - sum(len(samples) for clip, samples in engine.clips
+                                                   if clip == engine.clips[0][0]) / engine.samplerate
+    pull(engine, 256, 20)
+    main.audio_command("/skip")
+    assert abs(engine.queued_seconds() - second_seconds) < 1e-9, "/skip should drop the whole sentence"
+    engine.play(np.ones(4000, dtype=np.int16), engine.samplerate, clip)
+    engine.play(np.ones(4000, dtype=np.int16), engine.samplerate, clip - 1)
+    assert abs(engine.queued_seconds() - second_seconds - 4000 / engine.samplerate) < 1e-9, \
+        "pieces of the skipped sentence still downloading should be dropped"
+    return pieces, second_seconds
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=1.0, help="audio to play in real time on the null device")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    clips = make_clips(args.clips, rng)
+    for blocksize in (64, 1000, main.AUDIO_BLOCK_SIZE, 4096):
+        check_gapless(clips, blocksize)
+    print(f"Gapless: {args.clips} clips joined sample-exact at block sizes 64-4096")
+    check_skip_and_volume()
+    print("Skip, stop and volume behave")
+    pieces, left = check_skip_streamed()
+    print(f"/skip on streamed audio: a sentence in {pieces} pieces skipped at once, {left:.2f} s of the next left")
+
+    engine = main.AudioEngine(device="null")
+    sentences = [np.zeros(int(main.AUDIO_SAMPLE_RATE * args.seconds / 4), dtype=np.int16) for _ in range(4)]
+    started = time.perf_counter()
+    for clip in sentences:
+        engine.play(clip)
+    queued = time.perf_counter() - started
+    engine.wait()
+    played = time.perf_counter() - started
+    engine.close()
+    print(f"play() of {len(sentences)} clips returned in {queued * 1e3:.2f} ms "
+          f"(sd.play + sd.wait blocked for about {args.seconds:.2f} s); played out in {played:.2f} s")
+
+if __name__ == "__main__":
+    main_cli()
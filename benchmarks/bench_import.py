@@ -0,0 +1,81 @@
+"""Importing main: time, and proof that it does no I/O.
+
+Imports main in a fresh interpreter under python -X importtime, from an empty
+working directory, with input(), subprocesses, socket connections and new
+threads all made to fail. Then it reports the import time of main and of the
+heaviest modules it pulls in, checks that no file was written (the log file
+is only opened by main()), and times the first sanitize_response call, which
+compiles the sanitizer rules that used to be compiled at import.
+
+    python benchmarks/bench_import.py --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+GUARDED_IMPORT = """
+import builtins, socket, subprocess, sys, threading, time
+def refuse(what):
+    def fail(*args, **kwargs):
+        raise AssertionError(f"import main {{what}}")
+    return fail
+builtins.input = refuse("asked for input")
+subprocess.Popen.__init__ = refuse("started a subprocess")
+socket.socket.connect = refuse("opened a connection")
+threading.Thread.start = refuse("started a thread")
+sys.path.insert(0, {root!r})
+import main
+del threading.Thread.start
+started = time.perf_counter()
+main.sanitize_response("The gate opens. What will you do?")
+print(f"first_sanitize {{(time.perf_counter() - started) * 1e3:.2f}}")
+"""
+
+def run_import(cwd):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", GUARDED_IMPORT.format(root=ROOT)],
+                            cwd=cwd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "self" not in line:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((name.strip(), int(own), int(cumulative), len(name) - len(name.lstrip())))
+    # importtime lists a module after everything it imported, indented deeper
+    index = next(i for i, row in enumerate(rows) if row[0] == "main")
+    _, own, cumulative, depth = rows[index]
+    children = []
+    for name, _, child_cumulative, indent in reversed(rows[:index]):
+        if indent <= depth:
+            break
+        if indent == depth + 2:
+            children.append((child_cumulative, name))
+    first_sanitize = float(result.stdout.split()[-1])
+    return own, cumulative, sorted(children, reverse=True), first_sanitize
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(args.repeat):
+            runs.append(run_import(cwd))
+        written = os.listdir(cwd)
+    assert not written, f"import main wrote {written}"
+    print("import main: no input(), subprocess, connection, thread or file")
+
+    own, cumulative, children, first_sanitize = min(runs, key=lambda run: run[1])
+    print(f"main: {cumulative / 1e3:.1f} ms in total, {own / 1e3:.1f} ms in main.py itself (best of {args.repeat})")
+    for cumulative, name in children[:args.top]:
+        print(f"  {name:24} {cumulative / 1e3:7.1f} ms")
+    print(f"first sanitize_response (compiles the rules): {first_sanitize:.2f} ms")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,229 @@
+"""Save loading on a long synthetic campaign.
+
+Plays a scripted campaign (10k turns by default) through GameSession with a
+canned DM, then writes it out as an old adventure.txt and as a save slot with
+an autosave journal, and times:
+
+  - the adventure.txt scraper main() used before the single loader (baseline)
+  - parse_legacy_save, the one-pass importer for adventure.txt
+  - GameSession.load of the snapshot alone, and with the journal replayed
+
+It also checks that a load restores exactly the saved game, that loading
+twice does not pile up consequences, and that a journal whose last record
+was torn by a crash keeps the turns autosaved after recovering from it.
+
+    python benchmarks/bench_load.py --turns 10000 --journal 120
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+PARTY = [("Aria", "Mage"), ("Borin", "Knight"), ("Cale", "Thief")]
+GENRE = "Fantasy"
+LOCATION = "Castle Ravenspire"
+ACTIONS = [
+    "I search the room for hidden doors",
+    "I take the silver key {n}",
+    "I smash the old crate {n}",
+    "I ask the innkeeper about the missing caravan",
+    "I follow the tracks into the forest",
+]
+REPLIES = [
+    "Dust rises as the stones shift, revealing a narrow passage. You find {n} arrows in a niche.",
+    "Guard{tag} joins the party while Bandit{tag} falls to the floor.",
+    "The Merchant faction likes you more. The {place} is destroyed in the blaze.",
+    "You discover a hidden shrine {n}. Quest 'Relic {n}' has been given.",
+    "The innkeeper lowers his voice. 'They took the north road three nights ago.'\nNone have returned.",
+]
+
+def legacy_load(content, session):
+    # The parser main() carried twice (startup and /load) before load_slot
+    if "### Party Information ###" in content:
+        party_section = content.split("### Party Information ###")[1]
+        party_section = party_section.split("### Persistent World State ###")[0].strip()
+        genre_match = re.search(r"Genre: (.+)", party_section)
+        if genre_match:
+            session.selected_genre = genre_match.group(1).strip()
+        loc_match = re.search(r"Starting Location: (.+)", party_section)
+        if loc_match:
+            session.starting_location = loc_match.group(1).strip()
+        player_lines = [line.strip() for line in party_section.splitlines() if line.startswith("- ")]
+        session.party = []
+        for line in player_lines:
+            match = re.match(r"- (.+?) \((.+?)\)", line)
+            if match:
+                session.party.append((match.group(1).strip(), match.group(2).strip()))
+    session.conversation = content.split("### Persistent World State ###")[0].strip()
+    session.set_context(main.ConversationContext.from_transcript(session.conversation, [name for name, _ in session.party]))
+    last_dm_pos = session.conversation.rfind("Dungeon Master:")
+    if last_dm_pos != -1:
+        session.last_ai_reply = session.conversation[last_dm_pos + len("Dungeon Master:"):].strip()
+    if "### Persistent World State ###" in content:
+        state_section = content.split("### Persistent World State ###")[1]
+        if "Currency (" in state_section:
+            currency_section = state_section.split("Currency (")[1]
+            for player, amount in re.findall(r"- (.+?): (\d+)", currency_section.split("):")[1]):
+                session.player_choices.currency[player] = int(amount)
+        if "Allies:" in state_section:
+            allies_line = state_section.split("Allies:")[1].split("\n")[0].strip()
+            if allies_line != "None":
+                session.player_choices.allies = main.OrderedSet(a.strip() for a in allies_line.split(","))
+        if "Enemies:" in state_section:
+            enemies_line = state_section.split("Enemies:")[1].split("\n")[0].strip()
+            if enemies_line != "None":
+                session.player_choices.enemies = main.OrderedSet(e.strip() for e in enemies_line.split(","))
+        if "Resources:" in state_section:
+            resources_section = state_section.split("Resources:")[1]
+            if "Faction Relationships:" in resources_section:
+                resources_section = resources_section.split("Faction Relationships:")[0]
+            for resource, amount in re.findall(r"- (.+?): (\d+)", resources_section):
+                session.player_choices.resources[resource.strip()] = int(amount)
+        if "Consequences:" in state_section:
+            cons_section = state_section.split("Consequences:")[1]
+            if "Object States:" in cons_section:
+                cons_section = cons_section.split("Object States:")[0]
+            for cons in re.findall(r"- (.+)", cons_section):
+                session.player_choices.consequences.append(cons.strip())
+        if "Object States:" in state_section:
+            obj_section = state_section.split("Object States:")[1]
+            for obj, status in re.findall(r"- (.+?): (.+)", obj_section):
+                session.player_choices.set_object(obj.strip(), status.strip())
+        session.player_choices.changed(*main.WorldState.BLOCKS)
+
+def canned_session():
+    counter = iter(range(10 ** 9))
+
+    def canned_dm(prompt, label="", on_reply=None, model=None):
+        n = next(counter)
+        return REPLIES[n % len(REPLIES)].format(n=n, tag=chr(65 + n % 26), place=f"tower {n % 40}")
+
+    return main.GameSession(narrate_fn=canned_dm, announce_fn=lambda message: None)
+
+def play_campaign(turns, journal_turns, saves_dir):
+    session = canned_session()
+    session.voice = False
+    session.setup(GENRE, PARTY, LOCATION)
+    session.begin()
+    path = main.slot_path("campaign", saves_dir)
+    for i in range(turns):
+        if i == turns - journal_turns:
+            session.autosave(path)
+        session.play_turn(ACTIONS[i % len(ACTIONS)].format(n=i))
+        if i % 50 == 0:
+            session.context.compact()
+    session.stop_autosave()
+
+    legacy_path = os.path.join(saves_dir, "adventure.txt")
+    with open(legacy_path, "w", encoding="utf-8") as f:
+        f.write(session.conversation)
+        f.write("\n\n### Party Information ###\n")
+        f.write(f"Genre: {session.selected_genre}\n")
+        f.write(f"Starting Location: {session.starting_location}\n")
+        for name, player_class in session.party:
+            f.write(f"- {name} ({player_class})\n")
+        f.write("\n### Persistent World State ###\n")
+        f.write(session.state_text(full=True))
+    return session, path, legacy_path
+
+def check_torn_tail(saves_dir):
+    """Crash mid-record, recover, play on, and load the slot twice more."""
+    path = main.slot_path("torn", saves_dir)
+    session = canned_session()
+    session.voice = False
+    session.setup(GENRE, PARTY, LOCATION)
+    session.begin()
+    session.autosave(path)
+    for i in range(6):
+        session.play_turn(ACTIONS[i % len(ACTIONS)].format(n=i))
+    session.stop_autosave()
+    with open(main.journal_path(path), "ab") as f:
+        f.write(b'{"type": "turn", "seq": 999, "play')
+
+    recovered = canned_session()
+    recovered.voice = False
+    recovered.load(path)
+    recovered.autosave(path)
+    for i in range(3):
+        recovered.play_turn(ACTIONS[i % len(ACTIONS)].format(n=100 + i))
+    # Taken while autosaving, so a round summary it applies is journaled too
+    expected = recovered.snapshot()
+    recovered.stop_autosave()
+    for _ in range(2):
+        reloaded = main.GameSession()
+        reloaded.load(path)
+        assert reloaded.snapshot() == expected, "turns autosaved after a torn record were lost on reload"
+
+def best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10000)
+    parser.add_argument("--journal", type=int, default=120, help="turns left in the journal after the last snapshot")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Context compaction normally asks the LLM; summarize deterministically instead
+    main.get_ai_response = lambda prompt, *a, **k: f"The party has been busy ({len(prompt)} characters of events)."
+
+    with tempfile.TemporaryDirectory() as saves_dir:
+        print(f"Playing a {args.turns}-turn campaign...")
+        live, path, legacy_path = play_campaign(args.turns, args.journal, saves_dir)
+        expected = live.snapshot()
+        print(f"adventure.txt: {os.path.getsize(legacy_path) / 1e6:.1f} MB, "
+              f"snapshot: {os.path.getsize(path) / 1e6:.1f} MB, "
+              f"journal: {os.path.getsize(main.journal_path(path)) / 1e3:.0f} kB")
+
+        session = main.GameSession()
+        session.load(path)
+        actual = session.snapshot()
+        for snapshot in (expected, actual):
+            snapshot["meta"].pop("journal_seq")
+        assert actual == expected, "load did not restore the saved game"
+        consequences = list(session.player_choices.consequences)
+        session.load(path)
+        assert list(session.player_choices.consequences) == consequences, "consequences piled up on reload"
+        print("Restore: snapshot + journal reproduce the live game; reloading is idempotent")
+        check_torn_tail(saves_dir)
+        print("Torn journal: turns played after recovering from it survive two more reloads")
+
+        def read_legacy():
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        def import_legacy():
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                main.parse_legacy_save(f)
+
+        def load_snapshot():
+            # Snapshot only: hide the journal for this measurement
+            os.replace(main.journal_path(path), path + ".hidden")
+            try:
+                main.GameSession().load(path)
+            finally:
+                os.replace(path + ".hidden", main.journal_path(path))
+
+        records = sum(1 for _ in main.TurnJournal.read(main.journal_path(path)))
+        results = [
+            ("old adventure.txt scraper", best_of(args.repeat, lambda: legacy_load(read_legacy(), main.GameSession()))),
+            ("parse_legacy_save (import)", best_of(args.repeat, import_legacy)),
+            ("GameSession.load, snapshot", best_of(args.repeat, load_snapshot)),
+            (f"GameSession.load + {records} records", best_of(args.repeat, lambda: main.GameSession().load(path))),
+        ]
+        for label, ms in results:
+            print(f"{label:<36} {ms:10.1f} ms")
+
+if __name__ == "__main__":
+    main_cli()
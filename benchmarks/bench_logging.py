@@ -0,0 +1,90 @@
+"""Logging on the game thread: a file handler vs. the queue configure_logging sets up.
+
+Logs --records INFO records with structured fields, the way a turn does, first
+through a RotatingFileHandler written on the calling thread (what the game
+thread would pay for verbose logging without the queue) and then through
+configure_logging()'s QueueHandler, whose listener thread does the writing.
+Reports the time each log call takes on the caller, checks that every record
+reaches the file as valid JSON with its correlation ids and that a logged
+exception keeps its traceback in the "exception" field, and times a DEBUG
+call that the level filters out.
+
+    python benchmarks/bench_logging.py --records 20000
+"""
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+def log_turns(records):
+    """Per-call seconds of log_event, sorted."""
+    timings = []
+    for turn in range(records):
+        with main.log_context(session="bench", turn=turn):
+            started = time.perf_counter()
+            main.log_event(logging.INFO, "Turn", player="Aria", action_chars=24, prompt_chars=5200,
+                           reply_chars=230, seconds=0.431)
+            timings.append(time.perf_counter() - started)
+    return sorted(timings)
+
+def describe(label, timings):
+    p50 = timings[len(timings) // 2]
+    p99 = timings[len(timings) * 99 // 100]
+    print(f"{label:34} p50 {p50 * 1e6:6.1f} us   p99 {p99 * 1e6:7.1f} us   max {timings[-1] * 1e6:8.1f} us")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    with tempfile.TemporaryDirectory() as workdir:
+        # Synchronous: the formatter and the file write run in the caller
+        handler = logging.handlers.RotatingFileHandler(os.path.join(workdir, "sync.log"), maxBytes=main.LOG_MAX_BYTES,
+                                                       backupCount=main.LOG_BACKUPS, encoding="utf-8")
+        handler.setFormatter(main.LogFormatter(json_lines=True))
+        handler.addFilter(main.LogContextFilter())
+        root.addHandler(handler)
+        describe("file handler on the caller", log_turns(args.records))
+        root.removeHandler(handler)
+        handler.close()
+
+        main.LOG_LEVEL, main.LOG_FORMAT = "INFO", "json"
+        main.LOG_FILE = os.path.join(workdir, "queued.log")
+        main.configure_logging()
+        describe("queue (configure_logging)", log_turns(args.records))
+        try:
+            raise ConnectionError("AllTalk went away")
+        except ConnectionError:
+            with main.log_context(session="bench", turn=args.records):
+                logging.exception("Error in speech generation")
+        started = time.perf_counter()
+        main.stop_logging()
+        print(f"listener finished writing {(time.perf_counter() - started) * 1e3:.0f} ms after the last call")
+
+        with open(main.LOG_FILE, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        failure = entries.pop()
+        assert failure["message"] == "Error in speech generation", "the traceback leaked into the message"
+        assert "ConnectionError: AllTalk went away" in failure.get("exception", ""), "the traceback was lost"
+        assert len(entries) == args.records, f"{len(entries)} of {args.records} records written"
+        assert all(entry["session"] == "bench" and entry["turn"] == turn for turn, entry in enumerate(entries))
+        print(f"{len(entries)} JSON records, in order, each with its session and turn id")
+        print(f"an exception keeps its traceback in its own field ({len(failure['exception'])} characters)")
+
+        started = time.perf_counter()
+        for _ in range(args.records):
+            main.log_event(logging.DEBUG, "Ollama generation", model="llama3", eval_count=40)
+        print(f"{'DEBUG call filtered out at INFO':34} {(time.perf_counter() - started) / args.records * 1e6:6.2f} us")
+
+if __name__ == "__main__":
+    main_cli()
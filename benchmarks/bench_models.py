@@ -0,0 +1,165 @@
+"""Model selection: /change, per-request routing and warm-up.
+
+Plays turns through GameSession and the real narrate/get_ai_response path
+against a fake Ollama client that takes --load seconds to load a model the
+first time it is asked for it and --generate seconds per reply. It checks
+that a model picked with /change is used from the next request on (the old
+get_ai_response bound its default model once, at definition), that round
+summaries and context compaction go to the model routed to them while
+narration stays on the active one, and then times the first turn after a
+/change with and without the model being warmed up while the player types.
+
+    python benchmarks/bench_models.py --load 1.0 --generate 0.1 --think 1.5
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+PARTY = [("Aria", "Warrior"), ("Borin", "Mage")]
+ACTIONS = ["I scout ahead", "I light a torch", "I open the gate", "I listen at the door"]
+
+class FakeResponse:
+    def __init__(self, body, lines=None):
+        self.body = body
+        self.lines = lines or []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+class FakeOllama:
+    def __init__(self, load, generate):
+        self.load_time = load
+        self.generate_time = generate
+        self.lock = threading.Lock()
+        self.loaded = set()
+        self.requests = []  # (kind, model) of every generation
+
+    def post(self, path, json=None, timeout=None, stream=False):
+        model = json["model"]
+        with self.lock:
+            cold = model not in self.loaded
+            self.loaded.add(model)
+        if cold:
+            time.sleep(self.load_time)
+        if "prompt" not in json:
+            return FakeResponse({"model": model, "done": True})
+        with self.lock:
+            self.requests.append((request_kind(json["prompt"]), model))
+        time.sleep(self.generate_time)
+        reply = f"The torchlight shows a passage to the north ({model})."
+        if not stream:
+            return FakeResponse({"response": reply, "done": True})
+        words = reply.split(" ")
+        lines = [dumps({"response": word + ("" if i == len(words) - 1 else " "), "done": False}) for i, word in enumerate(words)]
+        return FakeResponse(None, lines + [dumps({"response": "", "done": True})])
+
+def dumps(obj):
+    return json.dumps(obj).encode("utf-8")
+
+def request_kind(prompt):
+    if prompt.startswith(main.SUMMARY_PROMPT[:40]):
+        return "compaction"
+    if "has completed a full round" in prompt:
+        return "summary"
+    return "narration"
+
+def new_session():
+    session = main.GameSession()
+    session.voice = False
+    session.setup("Fantasy", PARTY, "The Enchanted Forest")
+    with contextlib.redirect_stdout(io.StringIO()):
+        session.begin()
+    return session
+
+def play(session, action):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        session.play_turn(action)
+    return time.perf_counter() - started
+
+def check_change(backend):
+    # The old signature: the default is evaluated once, when the function is defined
+    def legacy_get_ai_response(prompt, model=main.ollama_model):
+        return model
+    session = new_session()
+    session.models.select("big:70b")
+    main.ollama_model = "big:70b"
+    assert legacy_get_ai_response("") == main.DEFAULT_MODEL
+    backend.requests.clear()
+    play(session, ACTIONS[0])
+    assert backend.requests == [("narration", "big:70b")], backend.requests
+    print(f"/change: the next turn uses the new model (the old default stayed on {main.DEFAULT_MODEL})")
+    main.ollama_model = main.DEFAULT_MODEL
+
+def check_routing(backend):
+    session = new_session()
+    session.models.select("big:70b")
+    session.models.select("small:3b", "summary")
+    session.models.select("small:3b", "compaction")
+    backend.requests.clear()
+    for turn in range(12):
+        play(session, ACTIONS[turn % len(ACTIONS)])
+        if session.context.compactor:
+            session.context.compactor.join()
+    used = {}
+    for kind, model in backend.requests:
+        used.setdefault(kind, set()).add(model)
+    assert used == {"narration": {"big:70b"}, "summary": {"small:3b"}, "compaction": {"small:3b"}}, used
+    counts = {kind: sum(1 for k, _ in backend.requests if k == kind) for kind in used}
+    print(f"Routing: {counts['narration']} narrations on big:70b; "
+          f"{counts['summary']} round summaries and {counts['compaction']} compactions on small:3b")
+
+def first_turn_after_change(backend, model, warm_up, think):
+    main.MODEL_WARMUP = warm_up
+    session = new_session()
+    session.models.select(model)
+    # The player reads the confirmation and types their action
+    time.sleep(think)
+    return play(session, ACTIONS[0])
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--load", type=float, default=1.0, help="seconds Ollama takes to load a model")
+    parser.add_argument("--generate", type=float, default=0.1, help="seconds per generation")
+    parser.add_argument("--think", type=float, default=1.5, help="seconds between /change and the next action")
+    args = parser.parse_args()
+
+    backend = FakeOllama(args.load, args.generate)
+    main.ollama_client = main.model_warmer.client = backend
+    main.health_monitor.is_available = lambda name: True
+    main.speak = lambda *a, **k: None
+    main.NARRATION_PIPELINE = False
+    main.CONTEXT_KEEP_EXCHANGES = 2
+    main.CONTEXT_TOKEN_BUDGET = 100
+
+    check_change(backend)
+    check_routing(backend)
+
+    cold = first_turn_after_change(backend, "cold:13b", False, args.think)
+    warm = first_turn_after_change(backend, "warm:13b", True, args.think)
+    print(f"first turn after /change, no warm-up: {cold:.2f} s")
+    print(f"first turn after /change, warmed up:  {warm:.2f} s")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,90 @@
+"""Turn stage timing: what /perf shows, and what the timing costs.
+
+Plays --turns turns through GameSession against the mock Ollama and AllTalk
+servers (see mock_backends.py) with PERF_FILE set, then prints the /perf
+report and the stages of one exported turn record. It then times a span
+with timing on and off against an empty with-block, and puts the cost of a
+turn's spans next to the turn itself.
+
+    python benchmarks/bench_perf.py --turns 12
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from mock_backends import MockBackends
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+PARTY = [("Aria", "Warrior"), ("Borin", "Mage"), ("Cale", "Thief")]
+ACTIONS = ["I scout ahead", "I light a torch", "I open the gate", "I listen at the door"]
+
+def per_call(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+def play(main, turns, export_path):
+    main.perf.export_path = export_path
+    session = main.GameSession()
+    session.setup("Fantasy", PARTY, "The Enchanted Forest")
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        session.begin()
+        for turn in range(turns):
+            started = time.perf_counter()
+            with main.perf.turn():
+                session.play_turn(ACTIONS[turn % len(ACTIONS)])
+            latencies.append(time.perf_counter() - started)
+    main.narrator.cancel()
+    return sorted(latencies)[len(latencies) // 2]
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=200000)
+    args = parser.parse_args()
+
+    backends = MockBackends().start()
+    os.environ["OLLAMA_BASE_URL"] = os.environ["ALLTALK_BASE_URL"] = backends.url
+    os.environ["AUDIO_DEVICE"] = "null"
+    sys.path.insert(0, ROOT)
+    import main
+    main.tts_cache = None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        export_path = os.path.join(workdir, "perf.jsonl")
+        turn_time = play(main, args.turns, export_path)
+        with open(export_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+    backends.stop()
+    assert len(records) == args.turns, f"{len(records)} turn records for {args.turns} turns"
+    print(main.perf_command("/perf"))
+    last = records[-1]
+    print(f"\nExported turn {last['turn']}: {last['total'] * 1e3:.1f} ms, "
+          + ", ".join(f"{stage} {seconds * 1e3:.1f}" for stage, seconds in last["stages"].items()))
+
+    spans = max(sum(1 for _ in record["stages"]) for record in records)
+    samples = sum(len(values) for values in main.perf.samples.values())
+    per_turn = samples / (args.turns + 1)
+    empty = per_call(lambda: contextlib.nullcontext().__enter__(), args.repeat)
+
+    def timed():
+        with main.perf.span("bench"):
+            pass
+    on = per_call(timed, args.repeat)
+    main.perf.enabled = False
+    off = per_call(timed, args.repeat)
+    print(f"\nspan, timing on:  {on * 1e9:7.0f} ns")
+    print(f"span, timing off: {off * 1e9:7.0f} ns (an empty with-block: {empty * 1e9:.0f} ns)")
+    print(f"about {per_turn:.0f} timed samples per turn ({spans} stages on the turn's thread): "
+          f"{per_turn * on * 1e6:.1f} us on, {per_turn * off * 1e6:.2f} us off, "
+          f"against a {turn_time * 1e3:.0f} ms turn")
+
+if __name__ == "__main__":
+    main_cli()
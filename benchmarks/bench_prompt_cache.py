@@ -0,0 +1,119 @@
+"""Prompt-eval tokens per turn: legacy prompt layout vs. build_dm_prompt.
+
+Ollama keeps the tokens of the previous prompt and reply in its KV cache and
+only evaluates the part of a new prompt after the longest common prefix. By
+default this benchmark simulates that cache over a scripted session (token
+counts use estimate_tokens, about 4 characters per token). With --live the
+prompts are sent to a running Ollama and its own prompt_eval_count is reported.
+
+    python benchmarks/bench_prompt_cache.py --turns 60
+    python benchmarks/bench_prompt_cache.py --turns 20 --live
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+PARTY = [("Aria", "Mage"), ("Borin", "Knight"), ("Cale", "Thief")]
+GENRE = "Fantasy"
+LOCATION = "Castle Ravenspire"
+ACTIONS = [
+    "I search the room for hidden doors",
+    "I ask the innkeeper about the missing caravan",
+    "I cast a light spell and look around",
+    "I take the silver key from the table",
+    "I follow the tracks into the forest",
+    "I offer the guard 5 gold to let us pass",
+]
+REPLIES = [
+    "Dust rises as the stones shift, revealing a narrow passage that smells of damp earth. Somewhere below, water drips steadily.",
+    "The innkeeper lowers his voice and glances at the door. 'They took the north road three nights ago, and none have returned.'",
+    "Pale light fills the chamber and shadows scatter across carved runes. A faint humming answers from the far wall.",
+    "The key is cold to the touch. As it leaves the table, a bell rings somewhere deep in the keep.",
+    "The tracks lead past a broken cart to a clearing where the grass has been burned in a perfect circle.",
+    "The guard pockets the coins and steps aside, muttering that he never saw you. The gate groans open.",
+]
+
+def legacy_prompt(system_prompt, conversation, state, turn):
+    # Layout used before build_dm_prompt: state ahead of the whole transcript,
+    # and the transcript itself starts with another copy of the system prompt
+    return (
+        f"{system_prompt}\n\n"
+        f"### Current World State ###\n{state}\n\n"
+        f"{conversation}\n"
+        f"{turn}\n"
+        "Dungeon Master:"
+    )
+
+def common_prefix(a, b):
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+class SimulatedCache:
+    def __init__(self):
+        self.cached = ""
+
+    def evaluate(self, prompt, reply):
+        shared = common_prefix(self.cached, prompt)
+        self.cached = prompt + reply
+        return main.estimate_tokens(prompt[shared:])
+
+class LiveOllama:
+    def evaluate(self, prompt, reply):
+        main.get_ai_response(prompt)
+        return main.last_generation_stats.get("prompt_eval_count", 0)
+
+def run(turns, backend_factory, seed):
+    rng = random.Random(seed)
+    system_prompt = main.format_system_prompt(PARTY, LOCATION, GENRE)
+    player_choices = main.new_player_choices()
+    player_choices.currency = {name: 20 for name, _ in PARTY}
+    opening = f"### Adventure Setting ###\nGenre: {GENRE}\nStarting Location: {LOCATION}\n\nDungeon Master: {REPLIES[0]}"
+    conversation = f"{system_prompt}\n\n{opening}"
+    context = main.ConversationContext(opening)
+    # Compaction needs a live model; here the window just trims
+    context.compact_async = lambda: None
+
+    legacy, current = backend_factory(), backend_factory()
+    results = []
+    for turn in range(turns):
+        name, _ = PARTY[turn % len(PARTY)]
+        action = f"{name}: {rng.choice(ACTIONS)}"
+        reply = rng.choice(REPLIES)
+        state = player_choices.render(GENRE)
+
+        old = legacy.evaluate(legacy_prompt(system_prompt, conversation, state, action), reply)
+        new = current.evaluate(main.build_dm_prompt(system_prompt, context, state, action), reply)
+        results.append((old, new))
+
+        conversation += f"\n{action}\nDungeon Master: {reply}"
+        context.add(f"{action}\nDungeon Master: {reply}")
+        main.update_world_state(action, reply, player_choices, GENRE, name)
+    return results
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--live", action="store_true", help="measure with a running Ollama")
+    args = parser.parse_args()
+
+    results = run(args.turns, LiveOllama if args.live else SimulatedCache, args.seed)
+    print(f"{'turn':>5} {'legacy':>8} {'stable prefix':>14}")
+    for turn, (old, new) in enumerate(results, 1):
+        print(f"{turn:>5} {old:>8} {new:>14}")
+    total_old = sum(old for old, _ in results)
+    total_new = sum(new for _, new in results)
+    print(f"\nprompt-eval tokens, total: legacy {total_old}, stable prefix {total_new}")
+    print(f"prompt-eval tokens, mean per turn: legacy {total_old / len(results):.0f}, "
+          f"stable prefix {total_new / len(results):.0f}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,161 @@
+"""End of round: serial round summary vs. the speculative one.
+
+Plays rounds through GameSession with a fake DM that takes --generate seconds
+per reply and a fake voice that takes --speak seconds to read a reply out
+(as speak() does with NARRATION_PIPELINE off). Times how long the party waits
+from the last action of a round to the round summary being shown, first the
+way the game used to (reply, speech, then the summary) and then with the
+summary generated while the reply is spoken. It also checks that a /redo of
+the round's last reply drops the summary made from the old reply, that a
+summary already shown survives a crash (with and without a /redo after it),
+and that a discarded summary gives its LLM scheduler slot back at once
+instead of generating to the end (against the mock Ollama, see
+mock_backends.py).
+
+    python benchmarks/bench_round_summary.py --generate 0.3 --speak 0.5
+"""
+import argparse
+import functools
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+from mock_backends import MockBackends
+
+GENRE = "Fantasy"
+PARTY = [("Aria", "Warrior"), ("Borin", "Mage")]
+LOCATION = "The Enchanted Forest"
+
+class FakeDM:
+    def __init__(self, generate, speak):
+        self.generate_time = generate
+        self.speak_time = speak
+        self.counter = itertools.count()
+        self.shown = []
+        self.summary_shown_at = None
+
+    def narrate(self, prompt, label="", on_reply=None, model=None):
+        time.sleep(self.generate_time)
+        reply = f"Reply {next(self.counter)}: the path bends north."
+        if on_reply:
+            on_reply(reply)
+        time.sleep(self.speak_time)
+        return reply
+
+    def generate(self, prompt, model=None):
+        time.sleep(self.generate_time)
+        return f"Summary {next(self.counter)}: night falls over the forest."
+
+    def present(self, text, label=""):
+        self.shown.append(text)
+        self.summary_shown_at = time.perf_counter()
+
+    def serial_round_end(self, session):
+        # What the game did before: the summary only started once the reply was spoken
+        self.narrate("")
+        self.present(self.generate(""))
+
+def new_session(dm):
+    session = main.GameSession(narrate_fn=dm.narrate, announce_fn=lambda message: None,
+                               generate_fn=dm.generate, present_fn=dm.present)
+    session.voice = False
+    session.setup(GENRE, PARTY, LOCATION)
+    session.begin()
+    return session
+
+def check_crash_after_summary(redo):
+    dm = FakeDM(0.01, 0.0)
+    with tempfile.TemporaryDirectory() as saves_dir:
+        path = os.path.join(saves_dir, "round.sav")
+        session = new_session(dm)
+        session.autosave(path)
+        session.play_turn("I scout ahead")
+        session.play_turn("I light a torch")
+        if redo:
+            session.redo()
+        assert session.pending_round is not None
+        # Crash here: the journal is not closed and nothing commits the round.
+        # Load before snapshot(), which would commit (and journal) it
+        recovered = main.GameSession()
+        recovered.load(path)
+        actual = recovered.snapshot()
+        expected = session.snapshot()
+    for snapshot in (expected, actual):
+        snapshot["meta"].pop("journal_seq")
+    assert actual == expected, "a round summary that was shown did not survive the crash"
+
+def check_discard_frees_slot(get_ai_response):
+    """Seconds from discard() until another request gets the only slot,
+    and the seconds the whole summary takes to generate."""
+    main.get_ai_response = get_ai_response
+    backends = MockBackends(latency=0.0, token_rate=50.0, reply_tokens=100).start()
+    main.ollama_client = main.BackendClient(backends.url)
+    main.health_monitor.is_available = lambda name: True
+    main.llm_scheduler = main.LLMScheduler(max_in_flight=1)
+    try:
+        job = main.SpeculativeSummary(functools.partial(main.generate_reply, model="mock:latest"), "Summarize the round.")
+        time.sleep(0.3)
+        started = time.perf_counter()
+        job.discard()
+        with main.llm_scheduler.slot():
+            freed = time.perf_counter() - started
+        assert job.wait() is None
+    finally:
+        backends.stop()
+    return freed, backends.reply_tokens / backends.token_rate
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--generate", type=float, default=0.3, help="seconds per DM generation")
+    parser.add_argument("--speak", type=float, default=0.5, help="seconds to speak a reply")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    # Context compaction normally asks the LLM; summarize deterministically instead
+    get_ai_response = main.get_ai_response
+    main.get_ai_response = lambda prompt, *a, **k: f"The party has been busy ({len(prompt)} characters of events)."
+
+    dm = FakeDM(args.generate, args.speak)
+    session = new_session(dm)
+    serial = speculative = 0.0
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        dm.serial_round_end(session)
+        serial += dm.summary_shown_at - started
+
+        session.play_turn("I scout ahead")
+        started = time.perf_counter()
+        session.play_turn("I light a torch")
+        speculative += dm.summary_shown_at - started
+    print(f"last action to round summary, serial:      {serial / args.rounds:.2f} s")
+    print(f"last action to round summary, speculative: {speculative / args.rounds:.2f} s")
+
+    dm = FakeDM(0.05, 0.0)
+    session = new_session(dm)
+    session.play_turn("I scout ahead")
+    session.play_turn("I light a torch")
+    stale = session.pending_round
+    session.redo()
+    fresh = session.pending_round
+    session.play_turn("I rest")
+    summaries = [line for line in session.conversation.splitlines() if "(Round Summary)" in line]
+    assert stale != fresh and summaries == [f"Dungeon Master (Round Summary): {fresh}"], summaries
+    assert session.round_count == 1
+    print("/redo: the summary of the replaced reply is dropped; only the new one is applied")
+
+    check_crash_after_summary(redo=False)
+    check_crash_after_summary(redo=True)
+    print("Crash: a round summary that was shown is restored on load, also after a /redo")
+    freed, generating = check_discard_frees_slot(get_ai_response)
+    assert freed < 0.2, f"the discarded summary held its slot for {freed:.2f} s"
+    print(f"Discard: the scheduler slot was free {freed * 1e3:.0f} ms after discard() "
+          f"0.3 s into a summary that takes {generating:.1f} s to generate")
+
+if __name__ == "__main__":
+    main_cli()
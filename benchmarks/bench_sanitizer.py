@@ -0,0 +1,131 @@
+"""sanitize_response: legacy sequential passes vs. the compiled ResponseSanitizer.
+
+Fuzzes both implementations with generated replies built from the phrases the
+sanitizer targets (mixed case, odd whitespace, unicode case-fold edge cases)
+and checks the output is byte-identical, then reports throughput on realistic
+replies.
+
+    python benchmarks/bench_sanitizer.py --fuzz 50000 --replies 5000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+def legacy_sanitize_response(response):
+    # sanitize_response as it was before ResponseSanitizer, kept as the reference
+    if not response:
+        return "The story continues..."
+    question_phrases = [
+        r"what will you do", r"how do you respond", r"what do you do",
+        r"what is your next move", r"what would you like to do",
+        r"what would you like to say", r"how will you proceed",
+        r"do you:", r"choose one", r"select an option", r"pick one"
+    ]
+    for phrase in question_phrases:
+        pattern = re.compile(rf'{phrase}.*?$', re.IGNORECASE)
+        response = pattern.sub('', response)
+    structure_phrases = [
+        r"a\)", r"b\)", r"c\)", r"d\)", r"e\)", r"option [a-e]:",
+        r"immediate consequence:", r"new situation:", r"next challenges:",
+        r"choices:", r"options:"
+    ]
+    for phrase in structure_phrases:
+        pattern = re.compile(phrase, re.IGNORECASE)
+        response = pattern.sub('', response)
+    player_action_patterns = [
+        r"you (?:try to|attempt to|begin to|start to|decide to) .+?\.",
+        r"you (?:successfully|carefully|quickly) .+?\.",
+        r"you (?:manage to|fail to) .+?\."
+    ]
+    for pattern in player_action_patterns:
+        response = re.sub(pattern, '', response, flags=re.IGNORECASE)
+    response = re.sub(r'(?:\n|\. )?[A-Ea-e]\)[^\.\?\!\n]*(\n|\. |$)', '', response, flags=re.IGNORECASE)
+    response = re.sub(r'(?:something else|other) \(.*?\)', '', response, flags=re.IGNORECASE)
+    response = re.sub(r'\s{2,}', ' ', response).strip()
+    if response and response[-1] not in ('.', '!', '?', ':', ','):
+        response += '.'
+    response = re.sub(r'\[[^\]]*State Tracking[^\]]*\]', '', response)
+    return response
+
+FRAGMENTS = main.ResponseSanitizer.QUESTION_PHRASES + main.ResponseSanitizer.STRUCTURE_PHRASES + [
+    "option c:", "you try to", "you carefully", "you fail to", "you manage to", "something else (",
+    "other (", "A)", "b)", "E)", "f)", "(", ")", ".", ". ", "!", "?", ":", ",", "\n", "\n\n", "  ", "\t",
+    " ", "[State Tracking: hp 10]", "State Tracking", "[", "]", "the goblin snarls", "Gorn", "x",
+    "İ", "ı", "ſ", "K", "OPTİON A:", "ſelect an option", "picK one",
+]
+
+PROSE = [
+    "The torchlight gutters as the tunnel narrows.",
+    "Gorn the innkeeper slams a tankard on the counter and laughs.",
+    "Rain hammers the neon signs above the market.",
+    "You carefully step over the tripwire.",
+    "A distant bell tolls three times.",
+    "The dragon's eye opens, amber and ancient.",
+    "You try to pick the lock but the tumblers resist.",
+]
+TAILS = [
+    "\nWhat will you do?",
+    " What do you do next?",
+    "\n\nChoices:\nA) Fight\nB) Flee\nC) Something else (describe it)",
+    "\n[State Tracking: Gold 40]",
+    "",
+    "",
+]
+
+def random_case(rng, text):
+    return "".join(c.upper() if rng.random() < 0.3 else c for c in text)
+
+def fuzz_corpus(count, seed):
+    rng = random.Random(seed)
+    corpus = ["", " ", "\n"]
+    for _ in range(count):
+        parts = [random_case(rng, rng.choice(FRAGMENTS)) for _ in range(rng.randint(1, 14))]
+        corpus.append("".join(parts) if rng.random() < 0.5 else " ".join(parts))
+    return corpus
+
+def reply_corpus(count, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(PROSE) for _ in range(rng.randint(3, 8))) + rng.choice(TAILS)
+            for _ in range(count)]
+
+def timed(sanitize, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for reply in corpus:
+            sanitize(reply)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=50000)
+    parser.add_argument("--replies", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    checked = 0
+    for corpus in (fuzz_corpus(args.fuzz, args.seed), reply_corpus(args.replies, args.seed)):
+        for text in corpus:
+            expected = legacy_sanitize_response(text)
+            actual = main.sanitize_response(text)
+            assert expected == actual, f"sanitizer mismatch for {text!r}: {expected!r} != {actual!r}"
+            checked += 1
+    print(f"Equivalence: byte-identical output on {checked} inputs")
+
+    corpus = reply_corpus(args.replies, args.seed)
+    legacy = timed(legacy_sanitize_response, corpus, args.repeat)
+    compiled = timed(main.sanitize_response, corpus, args.repeat)
+    print(f"legacy:      {len(corpus) / legacy:10.0f} replies/s")
+    print(f"compiled:    {len(corpus) / compiled:10.0f} replies/s  ({legacy / compiled:.2f}x)")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,110 @@
+"""World-state rendering per turn: get_current_state vs. the WorldState cache.
+
+Plays a long campaign through the legacy update_world_state on a plain dict
+and through update_world_state on a WorldState (unbounded, so both keep the
+same objects) side by side, checks after every turn that the cached render is
+identical to get_current_state and that the prompt render respects
+STATE_PROMPT_MAX_CHARS, and reports render time per turn as objects,
+resources and factions pile up. It then checks that long DM replies quoted in
+the consequences do not crowd resources, factions and objects out of the
+capped text.
+
+    python benchmarks/bench_state_render.py --turns 20000
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+from bench_world_state import legacy_update_world_state
+
+GENRE = "Fantasy"
+PLAYERS = ["Aria", "Borin", "Cale"]
+ACTIONS = [
+    "I take the brass key {n}",
+    "I look around the hall",
+    "I smash the barrel {n}",
+    "I talk to the guard",
+]
+REPLIES = [
+    "The hall is quiet. Dust drifts through the light from the high windows.",
+    "You find {n} herbs{m} in the garden and receive {n} gold from the steward.",
+    "The Guild{m} faction respects you more after the trial.",
+    "Captain{c} joins the party. The tower {m} is destroyed in the storm.",
+    "Your reputation increases as the crowd cheers.",
+]
+
+def turn(i):
+    m = i % 997
+    return (ACTIONS[i % len(ACTIONS)].format(n=i),
+            REPLIES[i % len(REPLIES)].format(n=i % 50 + 1, m=m, c=chr(65 + i % 26)),
+            PLAYERS[i % len(PLAYERS)])
+
+def check_long_replies():
+    """Consequences quoting long replies (about 870 characters each, what
+    num_predict=250 allows) leave room for the other blocks."""
+    state = main.WorldState()
+    state.currency.update({name: 100 for name in PLAYERS})
+    filler = " The wind howls through the broken shutters as the fire gutters low." * 12
+    for i in range(1, 61):
+        action, reply, player = turn(i)
+        main.update_world_state(action, reply + filler, state, GENRE, player)
+    prompt = main.state_prompt(state, GENRE)
+    assert len(prompt) <= main.STATE_PROMPT_MAX_CHARS, "prompt render over the cap"
+    full_lines = set(state.render(GENRE).split("\n"))
+    for line in prompt.split("\n"):
+        assert line in full_lines or line.endswith(("...", "entries not shown)")), f"line cut short: {line!r}"
+    for heading in ("Resources:", "Faction Relationships:", "Object States:"):
+        block = prompt.split(heading)[1].split("\n") if heading in prompt else []
+        shown = [line for line in block[1:] if line.startswith("  - ") and "not shown" not in line]
+        assert shown, f"no {heading} entries left next to long consequences"
+    return len(prompt)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--report-every", type=int, default=2500)
+    args = parser.parse_args()
+
+    plain = copy.deepcopy(main.player_choices_template)
+    cached = main.WorldState(world_event_retention=None, object_retention=None)
+    plain['currency'].update({name: 100 for name in PLAYERS})
+    cached.currency.update({name: 100 for name in PLAYERS})
+    cached.changed("currency")
+
+    plain_time = cached_time = 0.0
+    print(f"{'turn':>7} {'objects':>8} {'state chars':>12} {'get_current_state':>18} {'state_prompt':>13} {'prompt chars':>13}")
+    for i in range(1, args.turns + 1):
+        action, reply, player = turn(i)
+        legacy_update_world_state(action, reply, plain, GENRE, player)
+        main.update_world_state(action, reply, cached, GENRE, player)
+
+        # What a turn used to pay for the prompt, and what it pays now
+        started = time.perf_counter()
+        expected = main.get_current_state(plain, GENRE)
+        plain_time += time.perf_counter() - started
+        started = time.perf_counter()
+        prompt = main.state_prompt(cached, GENRE)
+        cached_time += time.perf_counter() - started
+
+        assert cached.render(GENRE) == expected, f"render differs from get_current_state at turn {i}"
+        if len(expected) <= main.STATE_PROMPT_MAX_CHARS:
+            assert prompt == expected, f"prompt render differs from get_current_state at turn {i}"
+        else:
+            assert len(prompt) <= main.STATE_PROMPT_MAX_CHARS, f"prompt render over the cap at turn {i}"
+        if i % args.report_every == 0:
+            print(f"{i:>7} {len(plain['objects']):>8} {len(expected):>12} "
+                  f"{plain_time / args.report_every * 1e6:>15.1f} us {cached_time / args.report_every * 1e6:>10.1f} us "
+                  f"{len(prompt):>13}")
+            plain_time = cached_time = 0.0
+    print(f"Equivalence: cached render identical to get_current_state for {args.turns} turns")
+    chars = check_long_replies()
+    print(f"Long replies: resources, factions and objects kept in a {chars}-character prompt")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,111 @@
+"""Narration synthesis with and without the TTS cache.
+
+Replaces the AllTalk request with a fake that takes --latency seconds per
+clip, then narrates a session's worth of lines twice: cold (every line a
+miss) and again, the way a reload re-reads the last reply and round
+summaries repeat. It checks that cached clips are byte-identical to the
+synthesized ones, that the cache stays under its size cap by evicting the
+least recently played clips, and reports time per line and backend calls.
+
+    python benchmarks/bench_tts_cache.py --lines 40 --latency 0.2
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.headers = {"Content-Type": "audio/wav"}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+class FakeAllTalk:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def post(self, path, data=None, stream=False, timeout=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        # A WAV of 2 samples per character, different for every text and voice
+        seed = f"{data['character_voice_gen']}|{data['text_input']}".encode("utf-8")
+        out = io.BytesIO()
+        with wave.open(out, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(main.AUDIO_SAMPLE_RATE)
+            wav.writeframes((seed * (4 * len(data["text_input"]) // len(seed) + 1))[:4 * len(data["text_input"])])
+        return FakeResponse(out.getvalue())
+
+def synthesize(line):
+    """The clip for line, collected from fetch_speech the way the game plays it."""
+    pieces = []
+    main.fetch_speech(line, main.DEFAULT_VOICE, lambda samples, samplerate: pieces.append(samples))
+    return b"".join(samples.tobytes() for samples in pieces)
+
+def narrate_all(lines):
+    started = time.perf_counter()
+    clips = [synthesize(line) for line in lines]
+    return clips, (time.perf_counter() - started) / len(lines)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds AllTalk takes per clip")
+    args = parser.parse_args()
+
+    backend = FakeAllTalk(args.latency)
+    main.alltalk_client = backend
+    main.health_monitor.is_available = lambda name: True
+    lines = [f"The lantern flickers as the party reaches gate {i}, and the wind carries a distant song." for i in range(args.lines)]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        main.tts_cache = main.TTSCache(cache_dir)
+        cold, cold_time = narrate_all(lines)
+        cold_calls = backend.calls
+        warm, warm_time = narrate_all(lines)
+        assert warm == cold, "cached clips differ from the synthesized ones"
+        assert backend.calls == cold_calls, "a cached line went to AllTalk"
+        print(f"cold: {cold_time * 1e3:8.2f} ms/line, {cold_calls} AllTalk calls")
+        print(f"warm: {warm_time * 1e3:8.2f} ms/line, {backend.calls - cold_calls} AllTalk calls")
+        print(main.tts_cache.report())
+        clip_size = max(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+
+    # Capped at half the lines: replaying one line keeps it while newer lines push out older ones
+    with tempfile.TemporaryDirectory() as cache_dir:
+        half = args.lines // 2
+        main.tts_cache = capped = main.TTSCache(cache_dir, max_bytes=clip_size * half)
+        narrate_all(lines[:half + half // 2])
+        narrate_all(lines[half // 2:half // 2 + 1])
+        narrate_all(lines[half + half // 2:])
+        on_disk = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+        assert on_disk <= capped.max_bytes, "cache over its size cap"
+        calls = backend.calls
+        synthesize(lines[half // 2])
+        assert backend.calls == calls, "a recently replayed clip was evicted"
+        synthesize(lines[half // 2 + 1])
+        assert backend.calls == calls + 1, "the least recently played clip was kept"
+        print(f"LRU cap: {len(os.listdir(cache_dir))} clips, {on_disk} of {capped.max_bytes} bytes on disk")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,315 @@
+"""Turn latency of the real game loop, against mock Ollama and AllTalk servers.
+
+Starts MockBackends (see mock_backends.py) on a local port, points the game
+at it and runs main.main() in a temporary directory with scripted input: a
+new adventure for --players players, then --rounds rounds of seeded actions
+and /exit. Every backend call goes over HTTP through the game's own clients,
+narration included (AUDIO_DEVICE=null plays it in real time and discards it).
+
+For every turn it records the time from the action to the next prompt, to the
+first DM text on screen and to the first clip of its narration being ready to play,
+and the size of the narration prompt. It prints p50/p95 of each and turns per
+second, and saves them with the commit and settings as JSON, by default to
+benchmarks/results/turns-<commit>.json; --compare prints the change against
+an earlier file.
+
+    python benchmarks/bench_turns.py --players 3 --rounds 6
+    python benchmarks/bench_turns.py --compare benchmarks/results/turns-1234abc.json
+"""
+import argparse
+import builtins
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+from mock_backends import MockBackends
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+PLAYER_NAMES = ["Aria", "Borin", "Cale", "Dara", "Edric"]
+ACTIONS = [
+    "I search the room for hidden doors",
+    "I ask the innkeeper about the missing caravan",
+    "I cast a light spell and look around",
+    "I take the silver key from the table",
+    "I follow the tracks into the forest",
+    "I offer the guard 5 gold to let us pass",
+    "I listen at the door",
+    "I climb the tower stairs",
+]
+
+class Screen:
+    """Stands in for stdout: notes when text appears, and shows it only with --echo."""
+
+    def __init__(self, echo):
+        self.echo = echo
+        self.first_text = None
+
+    def write(self, text):
+        if text.strip() and self.first_text is None:
+            self.first_text = time.perf_counter()
+        if self.echo:
+            sys.__stdout__.write(text)
+        return len(text)
+
+    def flush(self):
+        if self.echo:
+            sys.__stdout__.flush()
+
+class ScriptedPlayers:
+    """Answers main()'s prompts: sets up the adventure, then plays the actions
+    and times each turn from the action to the next player prompt."""
+
+    def __init__(self, players, actions, screen, backends):
+        self.players = players
+        self.actions = deque(actions)
+        self.screen = screen
+        self.backends = backends
+        self.acted_at = None
+        self.first_audio = None
+        # Sentences are synthesized in the order they are queued: the turn's
+        # first clip is the one for the first sentence queued after the action
+        self.queued = 0
+        self.synthesized = 0
+        self.first_sentence = None
+        self.generations = 0
+        self.started = None
+        self.finished = None
+        self.turns = []
+
+    def sentence_queued(self):
+        if self.acted_at is not None and self.first_sentence is None:
+            self.first_sentence = self.queued
+        self.queued += 1
+
+    def synthesizing(self, on_audio):
+        """on_audio, timed if this is the turn's first sentence."""
+        index, self.synthesized = self.synthesized, self.synthesized + 1
+        if index != self.first_sentence:
+            return on_audio
+
+        def first_clip(*args):
+            if self.first_audio is None:
+                self.first_audio = time.perf_counter()
+            return on_audio(*args)
+        return first_clip
+
+    def input(self, prompt=""):
+        now = time.perf_counter()
+        if prompt.endswith("> "):
+            if self.acted_at is not None:
+                self.finish_turn(now)
+            if not self.actions:
+                self.finished = now
+                self.acted_at = None
+                return "/exit"
+            self.started = self.started or now
+            self.screen.first_text = None
+            self.first_audio = None
+            self.first_sentence = None
+            self.generations = len(self.backends.history)
+            self.acted_at = time.perf_counter()
+            return self.actions.popleft()
+        if "Select a model" in prompt:
+            return "1"
+        if "How many players" in prompt:
+            return str(self.players)
+        if "Enter the number of your choice" in prompt:
+            return "1"
+        if "Enter name for Player" in prompt:
+            return PLAYER_NAMES[int(prompt.split("Player ")[1].split(":")[0]) - 1]
+        if "Choose a class" in prompt or "Enter location number" in prompt:
+            return "1"
+        if "save slot" in prompt:
+            return ""
+        raise RuntimeError(f"Unexpected prompt: {prompt!r}")
+
+    def finish_turn(self, now):
+        narration = [g for g in self.backends.history[self.generations:] if g["stream"]]
+        self.turns.append({
+            "latency": now - self.acted_at,
+            "first_text": self.screen.first_text - self.acted_at if self.screen.first_text else None,
+            "first_audio": self.first_audio - self.acted_at if self.first_audio else None,
+            "prompt_tokens": narration[0]["prompt_tokens"] if narration else None,
+            "prompt_eval_tokens": narration[0]["prompt_eval_tokens"] if narration else None,
+            "round_end": len(self.turns) % self.players == self.players - 1,
+        })
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def summarize(values):
+    """p50/p95/mean/max in milliseconds."""
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50) * 1e3, 1),
+        "p95": round(percentile(values, 95) * 1e3, 1),
+        "mean": round(sum(values) / len(values) * 1e3, 1),
+        "max": round(max(values) * 1e3, 1),
+        "count": len(values),
+    }
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_session(args, backends):
+    # main reads the backend URLs and audio device when it is imported
+    os.environ["OLLAMA_BASE_URL"] = os.environ["ALLTALK_BASE_URL"] = backends.url
+    os.environ["AUDIO_DEVICE"] = "null"
+    sys.path.insert(0, ROOT)
+    import main
+
+    if not args.tts_cache:
+        main.tts_cache = None
+    rng = random.Random(args.seed)
+    actions = [rng.choice(ACTIONS) for _ in range(args.players * args.rounds)]
+    screen = Screen(args.echo)
+    players = ScriptedPlayers(args.players, actions, screen, backends)
+    enqueue, fetch_speech = main.narrator._enqueue, main.fetch_speech
+
+    def timed_enqueue(text):
+        if text.strip():
+            players.sentence_queued()
+        return enqueue(text)
+
+    main.narrator._enqueue = timed_enqueue
+    main.fetch_speech = lambda text, voice, on_audio: fetch_speech(text, voice, players.synthesizing(on_audio))
+    cwd = os.getcwd()
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        stdout, sys.stdout = sys.stdout, screen
+        input_fn, builtins.input = builtins.input, players.input
+        try:
+            main.main()
+        finally:
+            sys.stdout, builtins.input = stdout, input_fn
+            os.chdir(cwd)
+    return players
+
+def report(args, backends, players):
+    turns = players.turns
+    prompts = [t["prompt_tokens"] for t in turns if t["prompt_tokens"] is not None]
+    elapsed = players.finished - players.started
+    return {
+        "benchmark": "turns",
+        "commit": git_commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "settings": {key: value for key, value in vars(args).items() if key not in ("out", "compare", "echo")},
+        "turns": len(turns),
+        "seconds": round(elapsed, 3),
+        "turns_per_second": round(len(turns) / elapsed, 3),
+        "turn_latency": summarize([t["latency"] for t in turns]),
+        "round_end_latency": summarize([t["latency"] for t in turns if t["round_end"]]),
+        "first_text": summarize([t["first_text"] for t in turns]),
+        "first_audio": summarize([t["first_audio"] for t in turns]),
+        "prompt_tokens": {
+            "first": prompts[0] if prompts else None,
+            "last": prompts[-1] if prompts else None,
+            "max": max(prompts, default=None),
+            "growth_per_turn": round((prompts[-1] - prompts[0]) / (len(prompts) - 1), 1) if len(prompts) > 1 else None,
+            "per_turn": prompts,
+        },
+        "prompt_eval_tokens_per_turn": [t["prompt_eval_tokens"] for t in turns],
+        "backend": dict(backends.stats),
+    }
+
+METRICS = [
+    ("turn latency p50 (ms)", ("turn_latency", "p50")),
+    ("turn latency p95 (ms)", ("turn_latency", "p95")),
+    ("round end p50 (ms)", ("round_end_latency", "p50")),
+    ("first text p50 (ms)", ("first_text", "p50")),
+    ("first text p95 (ms)", ("first_text", "p95")),
+    ("first audio p50 (ms)", ("first_audio", "p50")),
+    ("prompt tokens, last turn", ("prompt_tokens", "last")),
+    ("prompt growth per turn", ("prompt_tokens", "growth_per_turn")),
+    ("turns per second", ("turns_per_second",)),
+]
+
+def lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or result.get(key) is None:
+            return None
+        result = result[key]
+    return result
+
+def print_results(result, previous=None):
+    header = f"{'':28}{'this run':>12}"
+    if previous:
+        header += f"{previous['commit']:>14}{'change':>10}"
+    print(header)
+    for label, path in METRICS:
+        value = lookup(result, path)
+        line = f"{label:28}{'-' if value is None else value:>12}"
+        if previous:
+            old = lookup(previous, path)
+            change = f"{(value - old) / old:+.1%}" if value is not None and old else "-"
+            line += f"{'-' if old is None else old:>14}{change:>10}"
+        print(line)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before Ollama's first token")
+    parser.add_argument("--prompt-rate", type=float, default=2000.0, help="uncached prompt tokens evaluated per second")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="reply tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="seconds AllTalk takes per clip")
+    parser.add_argument("--tts-cache", action="store_true", help="keep the narration cache on")
+    parser.add_argument("--echo", action="store_true", help="show the game's output")
+    parser.add_argument("--out", help="JSON file for the results (default: benchmarks/results/turns-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    backends = MockBackends(seed=args.seed, latency=args.latency, prompt_rate=args.prompt_rate,
+                            token_rate=args.token_rate, reply_tokens=args.reply_tokens,
+                            tts_latency=args.tts_latency).start()
+    try:
+        players = run_session(args, backends)
+    finally:
+        backends.stop()
+    if len(players.turns) != args.players * args.rounds:
+        raise SystemExit(f"Only {len(players.turns)} of {args.players * args.rounds} turns were played")
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    result = report(args, backends, players)
+    out = args.out or os.path.join(RESULTS_DIR, f"turns-{result['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+
+    print(f"{result['turns']} turns of {args.players} players in {result['seconds']:.2f} s")
+    print_results(result, previous)
+    print(f"Saved {out}")
+
+if __name__ == "__main__":
+    main_cli()
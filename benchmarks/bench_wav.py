@@ -0,0 +1,118 @@
+"""Narration decoding: WavDecoder vs. np.frombuffer on the raw response.
+
+Builds WAV files with the stdlib wave module (8/16/32-bit, mono and stereo,
+several sample rates, an extra chunk before the samples) and checks that
+decode_wav and WavDecoder fed in odd-sized pieces return exactly the samples
+wave reads back, that 16-bit audio is decoded without copying, and that
+AudioEngine only converts clips whose format differs from its stream. Then it
+times decoding a long clip and how soon a streamed clip has audio to play.
+
+    python benchmarks/bench_wav.py --seconds 30
+"""
+import argparse
+import io
+import os
+import struct
+import sys
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+def make_wav(frames, channels, width, samplerate, extra_chunk=False):
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(samplerate)
+        wav.writeframes(frames)
+    data = out.getvalue()
+    if extra_chunk:
+        # A LIST chunk between fmt and data, as some encoders write
+        extra = b"LIST" + struct.pack("<I", 5) + b"INFO\x00\x00"
+        data = data[:36] + extra + data[36:]
+        data = data[:4] + struct.pack("<I", len(data) - 8) + data[8:]
+    return data
+
+def expected_samples(frames, channels, width):
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2")
+    else:
+        samples = (np.frombuffer(frames, dtype="<i4") >> 16).astype(np.int16)
+    return samples.reshape(-1, channels)
+
+def fed(data, piece):
+    decoder = main.WavDecoder()
+    pieces = [decoder.feed(data[start:start + piece]) for start in range(0, len(data), piece)]
+    return np.concatenate([p for p in pieces if p is not None]), decoder.format
+
+def check_formats(rng):
+    cases = 0
+    for width in (1, 2, 4):
+        for channels in (1, 2):
+            for samplerate in (16000, 22050, 24000, 44100):
+                frames = rng.integers(0, 256, size=999 * channels * width, dtype=np.uint8).tobytes()
+                expected = expected_samples(frames, channels, width)
+                for extra_chunk in (False, True):
+                    data = make_wav(frames, channels, width, samplerate, extra_chunk)
+                    samples, rate = main.decode_wav(data)
+                    assert rate == samplerate and np.array_equal(samples, expected), f"decode_wav: {width * 8}-bit x{channels}"
+                    for piece in (1, 7, 4096):
+                        streamed, wav_format = fed(data + b"trailing", piece)
+                        assert wav_format.samplerate == samplerate and np.array_equal(streamed, expected), \
+                            f"WavDecoder in {piece}-byte pieces: {width * 8}-bit x{channels}"
+                    cases += 1
+    return cases
+
+def check_no_conversion():
+    data = make_wav(np.arange(-500, 500, dtype="<i2").tobytes(), 1, 2, 24000)
+    samples, rate = main.decode_wav(data)
+    assert np.shares_memory(samples, np.frombuffer(data, dtype=np.uint8)), "16-bit PCM was copied"
+    engine = main.AudioEngine(samplerate=rate)
+    assert engine.convert(samples, rate) is samples, "a clip in the stream's format was converted"
+    assert len(engine.convert(samples, rate * 2)) == len(samples) // 2, "a clip at another rate was not resampled"
+    assert engine.convert(np.repeat(samples, 2, axis=1), rate).shape == samples.shape, "stereo was not mixed down"
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of the timed clip")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"Equivalence: {check_formats(rng)} WAV layouts decode exactly as the wave module reads them")
+    check_no_conversion()
+    print("16-bit PCM is a view of the response; clips are converted only when their format differs")
+
+    samplerate = 24000
+    frames = rng.integers(-30000, 30000, size=int(samplerate * args.seconds), dtype=np.int16).tobytes()
+    data = make_wav(frames, 1, 2, samplerate)
+    raw = np.frombuffer(data, dtype=np.int16)
+    print(f"np.frombuffer on the raw response plays {len(raw) - len(frames) // 2} header samples as noise "
+          f"and assumes 22050 Hz for a {samplerate} Hz clip")
+
+    for label, decode in (("np.frombuffer(...).copy()", lambda: np.frombuffer(data, dtype=np.int16).copy()),
+                          ("decode_wav", lambda: main.decode_wav(data))):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            decode()
+        print(f"{label:26} {(time.perf_counter() - started) / args.repeat * 1e6:9.1f} us for {len(data) / 1e6:.1f} MB")
+
+    decoder = main.WavDecoder()
+    first = None
+    for start in range(0, len(data), main.TTS_CHUNK_BYTES):
+        if decoder.feed(data[start:start + main.TTS_CHUNK_BYTES]) is not None:
+            first = start + main.TTS_CHUNK_BYTES
+            break
+    print(f"streamed: audio to play after {first / 1e3:.0f} kB of {len(data) / 1e6:.1f} MB "
+          f"({first / len(data):.2%} of the download)")
+
+if __name__ == "__main__":
+    main_cli()
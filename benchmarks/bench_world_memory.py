@@ -0,0 +1,101 @@
+"""World-state memory on a long campaign: the legacy dict vs. WorldState.
+
+Plays the same scripted campaign (50k turns by default) through the legacy
+update_world_state on a plain dict and through update_world_state on a
+WorldState with the default retention, then reports the memory each state
+holds at the end (tracemalloc), how many entries it keeps, and the update and
+prompt-render cost per turn over the last stretch of the campaign.
+
+    python benchmarks/bench_world_memory.py --turns 50000
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+from bench_world_state import legacy_update_world_state
+
+GENRE = "Fantasy"
+PLAYERS = ["Aria", "Borin", "Cale"]
+ACTIONS = [
+    "I destroy the statue {n}", "I take the silver key {n}", "I smash crate {n}",
+    "I pick up the lantern {n}", "I talk to the innkeeper",
+]
+REPLIES = [
+    "The bridge {n} is destroyed. You gain 2 herbs.",
+    "You receive 5 gold and learn about the vault {n}.",
+    "The {f} faction respects you more. Captain{c} joins the party.",
+    "A tower of {w} has been revealed in the hills. You use 1 herbs.",
+    "Captain{c} turns against you. Your reputation increases.",
+]
+
+def word(i):
+    # Event locations are letters only, so spell the turn number
+    return "".join(chr(97 + int(digit)) for digit in str(i))
+
+def turn(i):
+    return (ACTIONS[i % len(ACTIONS)].format(n=i),
+            REPLIES[i % len(REPLIES)].format(n=i, w=word(i), f=f"Guild{i % 200}", c=chr(65 + i % 26)),
+            PLAYERS[i % len(PLAYERS)])
+
+def legacy_state():
+    player_choices = copy.deepcopy(main.player_choices_template)
+    player_choices["currency"] = {name: 100 for name in PLAYERS}
+    return player_choices
+
+def world_state():
+    player_choices = main.WorldState()
+    player_choices.currency = {name: 100 for name in PLAYERS}
+    return player_choices
+
+def play(update, render, fresh_state, turns, window):
+    # Compile the rule table outside the trace so it is not counted as state
+    update(*turn(0)[:2], fresh_state(), GENRE, PLAYERS[0])
+    tracemalloc.start()
+    state = fresh_state()
+    for i in range(1, turns - window + 1):
+        action, reply, player = turn(i)
+        update(action, reply, state, GENRE, player)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Time whole turns (update plus the prompt render) once the state is large
+    started = time.perf_counter()
+    for i in range(turns - window + 1, turns + 1):
+        action, reply, player = turn(i)
+        update(action, reply, state, GENRE, player)
+        render(state)
+    return state, current, peak, (time.perf_counter() - started) / window
+
+def sizes(data):
+    return ", ".join(f"{key} {len(data[key])}" for key in ("world_events", "consequences", "objects", "discoveries"))
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50000)
+    parser.add_argument("--window", type=int, default=1000, help="turns at the end to time")
+    args = parser.parse_args()
+
+    print(f"Playing a {args.turns}-turn campaign twice...")
+    legacy, legacy_current, legacy_peak, legacy_turn = play(
+        legacy_update_world_state, lambda state: main.get_current_state(state, GENRE),
+        legacy_state, args.turns, args.window)
+    compact, compact_current, compact_peak, compact_turn = play(
+        main.update_world_state, lambda state: main.state_prompt(state, GENRE),
+        world_state, args.turns, args.window)
+
+    print(f"dict:       {sizes(legacy)}")
+    print(f"WorldState: {sizes(compact.to_dict())}")
+    print(f"{'':12}{'held':>10} {'peak':>10} {'per turn':>11}")
+    for label, current, peak, per_turn in (("dict", legacy_current, legacy_peak, legacy_turn),
+                                           ("WorldState", compact_current, compact_peak, compact_turn)):
+        print(f"{label:12}{current / 1e6:>7.2f} MB {peak / 1e6:>7.2f} MB {per_turn * 1e6:>8.1f} us")
+    print(f"held memory: {legacy_current / compact_current:.1f}x smaller")
+
+if __name__ == "__main__":
+    main_cli()
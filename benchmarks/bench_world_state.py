@@ -0,0 +1,174 @@
+"""update_world_state: legacy per-call regexes vs. the precompiled rule table.
+
+Runs both implementations over the same corpus of generated DM replies for every
+genre, checks that they leave player_choices in exactly the same state (the
+WorldState with unbounded retention, compared through to_dict), then reports
+extraction throughput.
+
+    python benchmarks/bench_world_state.py --replies 5000
+"""
+import argparse
+import copy
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+
+def legacy_update_world_state(action, response, player_choices, genre, current_player):
+    # update_world_state as it was before the rule table, kept as the reference
+    currency_name = main.CURRENCY_MAP.get(genre, "currency")
+    player_choices['consequences'].append(f"{current_player} '{action}': {response}")
+    if len(player_choices['consequences']) > 5:
+        player_choices['consequences'] = player_choices['consequences'][-5:]
+    ally_matches = re.findall(r'(\b[A-Z][a-z]+\b) (?:joins|helps|saves|allies with|becomes your ally|supports you)', response, re.IGNORECASE)
+    for ally in ally_matches:
+        if ally not in player_choices['allies']:
+            player_choices['allies'].append(ally)
+            if ally in player_choices['enemies']:
+                player_choices['enemies'].remove(ally)
+    enemy_matches = re.findall(r'(\b[A-Z][a-z]+\b) (?:dies|killed|falls|perishes|becomes your enemy|turns against you|hates you)', response, re.IGNORECASE)
+    for enemy in enemy_matches:
+        if enemy not in player_choices['enemies']:
+            player_choices['enemies'].append(enemy)
+        if enemy in player_choices['allies']:
+            player_choices['allies'].remove(enemy)
+    for amount, resource in re.findall(r'(?:get|find|acquire|obtain|receive|gain|steal|take) (\d+) (\w+)', response, re.IGNORECASE):
+        resource = resource.lower()
+        player_choices['resources'].setdefault(resource, 0)
+        player_choices['resources'][resource] += int(amount)
+    for amount, resource in re.findall(r'(?:lose|drop|spend|use|expend|give|donate|surrender) (\d+) (\w+)', response, re.IGNORECASE):
+        resource = resource.lower()
+        if resource in player_choices['resources']:
+            player_choices['resources'][resource] = max(0, player_choices['resources'][resource] - int(amount))
+    for amount in re.findall(r'(?:find|earn|receive|get|acquire|obtain|gain|steal|take) (\d+) ' + re.escape(currency_name), response, re.IGNORECASE):
+        if current_player in player_choices['currency']:
+            player_choices['currency'][current_player] += int(amount)
+    for amount in re.findall(r'(?:spend|pay|lose|drop|use|expend|give|donate|surrender) (\d+) ' + re.escape(currency_name), response, re.IGNORECASE):
+        if current_player in player_choices['currency']:
+            player_choices['currency'][current_player] = max(0, player_choices['currency'][current_player] - int(amount))
+    for location, event in re.findall(r'(?:The|A|An) ([A-Za-z\s]+) (?:is|has been|becomes) (destroyed|created|changed|revealed|altered|ruined|rebuilt)', response, re.IGNORECASE):
+        player_choices['world_events'].append(f"{location.strip()} {event}")
+    if "quest completed" in response.lower() or "completed the quest" in response.lower():
+        quest_match = re.search(r'quest ["\']?(.*?)["\']? (?:is|has been)? completed', response, re.IGNORECASE)
+        if quest_match:
+            quest_name = quest_match.group(1).strip()
+            if quest_name in player_choices['active_quests']:
+                player_choices['active_quests'].remove(quest_name)
+                player_choices['completed_quests'].append(quest_name)
+    if "new quest" in response.lower() or "quest started" in response.lower() or "quest given" in response.lower():
+        quest_match = re.search(r'quest ["\']?(.*?)["\']? (?:is|has been)? (?:given|started)', response, re.IGNORECASE)
+        if quest_match:
+            quest_name = quest_match.group(1).strip()
+            if quest_name not in player_choices['active_quests'] and quest_name not in player_choices['completed_quests']:
+                player_choices['active_quests'].append(quest_name)
+    if "reputation increases" in response.lower() or "reputation improved" in response.lower():
+        player_choices['reputation'] += 1
+    elif "reputation decreases" in response.lower() or "reputation damaged" in response.lower():
+        player_choices['reputation'] = max(-5, player_choices['reputation'] - 1)
+    for faction in re.findall(r'(?:The|Your) (\w+) faction (?:likes|respects|trusts|appreciates) you more', response, re.IGNORECASE):
+        player_choices['factions'][faction] += 1
+    for faction in re.findall(r'(?:The|Your) (\w+) faction (?:dislikes|distrusts|hates|condemns) you more', response, re.IGNORECASE):
+        player_choices['factions'][faction] -= 1
+    for discovery in re.findall(r'(?:discover|find|uncover|learn about|reveal) (?:a |an |the )?(.+?)\.', response, re.IGNORECASE):
+        if discovery not in player_choices['discoveries']:
+            player_choices['discoveries'].append(discovery)
+    for obj in re.findall(r'(?:destroy|break|smash) (?:the |a |an )?([\w\s]+)', action, re.IGNORECASE):
+        player_choices['objects'][obj.strip()] = "destroyed"
+    for obj in re.findall(r'(?:take|steal|grab|pick up) (?:the |a |an )?([\w\s]+)', action, re.IGNORECASE):
+        player_choices['objects'][obj.strip()] = "taken"
+
+NAMES = ["Gorn", "Elara", "Vex", "Mira", "Thane", "Quill", "Sable", "Orrin"]
+THINGS = ["arrows", "potions", "rations", "batteries", "ammo", "scrap", "herbs", "gems"]
+PLACES = ["old bridge", "watchtower", "Neon Market", "reactor core", "village well", "north gate"]
+FACTIONS = ["Merchant", "Thieves", "Corporate", "Raider", "Temple"]
+SENTENCES = [
+    "{name} joins the party, grinning as {name2} falls to the floor.",
+    "You find {n} {thing} hidden beneath the floorboards.",
+    "The guard takes {n} {currency} from the table and you spend {n2} {currency} on drinks.",
+    "The {place} is destroyed in a roar of flame.",
+    "A {place} has been revealed behind the waterfall.",
+    "Quest 'The Lost Crown' has been given by the old king. New quest available.",
+    "The quest 'The Lost Crown' is completed, and quest completed rings out.",
+    "Your reputation increases as the crowd cheers.",
+    "Reputation damaged: the townsfolk whisper behind your back.",
+    "The {faction} faction respects you more after tonight.",
+    "Your {faction} faction distrusts you more now.",
+    "You discover a {place} nobody has mapped before.",
+    "{name} becomes your enemy and swears revenge.",
+    "{name} helps you up while {name2} turns against you.",
+    "The wind howls across the empty plain.",
+    "Somewhere a dog barks, and the lanterns flicker.",
+    "You lose {n} {thing} in the river and use {n2} {thing} to bandage the wound.",
+    "You receive {n} {currency} as a reward and learn about the hidden vault.",
+    # Unicode that re.IGNORECASE folds onto ASCII letters
+    "İRIS DİES quietly. Vex ſupports you.",
+    "The King's faction likes you more. Maıa falls.",
+]
+ACTIONS = ["I destroy the old statue", "I take the silver key", "I break a window and grab the map",
+           "I smash the crates", "I pick up the lantern", "I talk to the innkeeper", "I steal 5 gems"]
+
+def make_corpus(count, seed):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        genre = rng.choice(list(main.CURRENCY_MAP))
+        fields = {
+            "name": rng.choice(NAMES), "name2": rng.choice(NAMES), "thing": rng.choice(THINGS),
+            "place": rng.choice(PLACES), "faction": rng.choice(FACTIONS),
+            "n": rng.randint(1, 50), "n2": rng.randint(1, 20), "currency": main.CURRENCY_MAP[genre],
+        }
+        reply = " ".join(rng.choice(SENTENCES).format(**fields) for _ in range(rng.randint(2, 6)))
+        corpus.append((genre, rng.choice(ACTIONS), reply))
+    return corpus
+
+def legacy_state():
+    player_choices = copy.deepcopy(main.player_choices_template)
+    player_choices["currency"] = {"Aria": 100, "Borin": 100}
+    return player_choices
+
+def world_state():
+    # Unbounded, to match what the legacy dict keeps
+    player_choices = main.WorldState(world_event_retention=None, object_retention=None)
+    player_choices.currency = {"Aria": 100, "Borin": 100}
+    return player_choices
+
+def run(update, corpus, fresh_state):
+    states = {genre: fresh_state() for genre in main.CURRENCY_MAP}
+    for i, (genre, action, reply) in enumerate(corpus):
+        update(action, reply, states[genre], genre, "Aria" if i % 2 else "Borin")
+    return states
+
+def timed(update, corpus, fresh_state, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(update, corpus, fresh_state)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replies", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.replies, args.seed)
+    expected = run(legacy_update_world_state, corpus, legacy_state)
+    actual = run(main.update_world_state, corpus, world_state)
+    for genre in expected:
+        assert expected[genre] == actual[genre].to_dict(), f"player_choices differ for {genre}"
+    print(f"Equivalence: identical player_choices for {len(corpus)} replies across {len(expected)} genres")
+
+    legacy = timed(legacy_update_world_state, corpus, legacy_state, args.repeat)
+    compiled = timed(main.update_world_state, corpus, world_state, args.repeat)
+    print(f"legacy:      {len(corpus) / legacy:10.0f} replies/s")
+    print(f"rule table:  {len(corpus) / compiled:10.0f} replies/s  ({legacy / compiled:.2f}x)")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,261 @@
+"""Stand-in Ollama and AllTalk servers for benchmarks that need no GPU.
+
+MockBackends serves, from a thread of the benchmark's own process, the
+endpoints the game uses:
+
+  GET  /                             Ollama health check
+  GET  /api/tags                     installed models
+  POST /api/generate                 replies, streamed (NDJSON) or not, and
+                                     prompt-less warm-up requests
+  GET  /api/ready                    AllTalk health check
+  POST /api/tts-generate             a real 16-bit mono WAV for the text
+  GET  /api/tts-generate-streaming   the same WAV, sent in chunks
+
+Replies are picked from REPLY_SENTENCES by a seeded generator, so a run with
+the same seed sees the same text. Generation time follows a simple model:
+--latency seconds, plus the prompt tokens that miss a simulated KV prefix
+cache at prompt_rate tokens/s, before the first token, then token_rate
+tokens/s. Point the game at it with OLLAMA_BASE_URL and ALLTALK_BASE_URL
+before importing main.
+"""
+import http.server
+import json
+import random
+import struct
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+REPLY_SENTENCES = [
+    "The torchlight flickers across the damp stone walls.",
+    "A cold wind carries the smell of smoke from the north.",
+    "You find 5 gold coins hidden beneath a loose flagstone.",
+    "An old hermit named Edrin joins the party, leaning on a crooked staff.",
+    "Somewhere below, water drips steadily into an unseen pool.",
+    "The guard captain eyes you warily but lets you pass.",
+    "Carved runes along the archway glow faintly as you approach.",
+    "A wolf howls in the distance, and the horses grow restless.",
+    "The merchant offers a silver amulet for 20 gold coins.",
+    "Dust rises as the stones shift, revealing a narrow passage.",
+    "The innkeeper lowers his voice and glances toward the door.",
+    "A bell rings somewhere deep within the keep.",
+]
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+def make_wav(text, samplerate=24000, seconds_per_char=0.06):
+    """A WAV of a quiet tone, as long as text would take to read out."""
+    frames = max(1, int(len(text) * seconds_per_char * samplerate))
+    data = (3000 * np.sin(2 * np.pi * 220 / samplerate * np.arange(frames))).astype("<i2").tobytes()
+    header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(data), b"WAVE", b"fmt ", 16, 1, 1,
+                         samplerate, samplerate * 2, 2, 16, b"data", len(data))
+    return header + data
+
+class MockBackends:
+    """Mock Ollama and AllTalk on one local port, with request counters."""
+
+    def __init__(self, seed=1, latency=0.05, prompt_rate=2000.0, token_rate=200.0, reply_tokens=40,
+                 tts_latency=0.05, load_time=0.0, cache_slots=2, models=("mock:latest",)):
+        self.seed = seed
+        self.latency = latency
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.tts_latency = tts_latency
+        self.load_time = load_time
+        self.cache_slots = cache_slots
+        self.models = list(models)
+        self.lock = threading.Lock()
+        self.generations = 0
+        self.loaded = set()
+        self.cached = []  # prompt + reply of the most recent generations, newest last
+        self.history = []  # one entry per generation, in the order they were asked for
+        self.stats = {"generate": 0, "generate_stream": 0, "warm_up": 0, "prompt_tokens": 0,
+                      "prompt_eval_tokens": 0, "eval_tokens": 0, "tts": 0}
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        backends = self
+
+        class Handler(MockHandler):
+            mock = backends
+
+        self.server = QuietServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def reply(self):
+        with self.lock:
+            rng = random.Random(f"{self.seed}:{self.generations}")
+            self.generations += 1
+        words = []
+        while len(words) < self.reply_tokens:
+            words.extend(rng.choice(REPLY_SENTENCES).split(" "))
+        text = " ".join(words[:self.reply_tokens])
+        # Finish on a sentence end so the narration pipeline flushes cleanly
+        return text if text.endswith(".") else text + "."
+
+    def evaluate(self, model, prompt):
+        """Seconds before the first token, and the prompt tokens evaluated."""
+        with self.lock:
+            cold = model not in self.loaded
+            self.loaded.add(model)
+            shared = max((common_prefix(prompt, cached) for cached in self.cached), default=0)
+        evaluated = estimate_tokens(prompt[shared:]) if shared < len(prompt) else 0
+        delay = self.latency + evaluated / self.prompt_rate + (self.load_time if cold else 0)
+        return delay, evaluated
+
+    def remember(self, text):
+        with self.lock:
+            self.cached.append(text)
+            del self.cached[:-self.cache_slots]
+
+    def record(self, streaming, prompt_tokens, evaluated, tokens):
+        with self.lock:
+            self.history.append({"stream": streaming, "prompt_tokens": prompt_tokens, "prompt_eval_tokens": evaluated})
+            self.stats["generate_stream" if streaming else "generate"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["prompt_eval_tokens"] += evaluated
+            self.stats["eval_tokens"] += tokens
+
+    def count(self, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+def common_prefix(a, b):
+    """Length of the longest common prefix, by bisection on slice compares."""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The game's connection pool drops idle keep-alive connections
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class MockHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type="application/json", status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/":
+            self.send_body(b"Ollama is running", "text/plain")
+        elif url.path == "/api/tags":
+            models = [{"name": name} for name in self.mock.models]
+            self.send_body(json.dumps({"models": models}).encode("utf-8"))
+        elif url.path == "/api/ready":
+            self.send_body(b"Ready", "text/plain")
+        elif url.path == "/api/tts-generate-streaming":
+            text = parse_qs(url.query).get("text", [""])[0]
+            self.mock.count(tts=1)
+            time.sleep(self.mock.tts_latency)
+            wav = make_wav(text)
+            self.start_chunked("audio/wav")
+            for start in range(0, len(wav), 8192):
+                self.send_chunk(wav[start:start + 8192])
+            self.end_chunked()
+        else:
+            self.send_body(b"not found", "text/plain", 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.read_body()
+        if url.path == "/api/generate":
+            self.generate(json.loads(body))
+        elif url.path == "/api/tts-generate":
+            text = parse_qs(body.decode("utf-8")).get("text_input", [""])[0]
+            self.mock.count(tts=1)
+            time.sleep(self.mock.tts_latency)
+            self.send_body(make_wav(text), "audio/wav")
+        else:
+            self.send_body(b"not found", "text/plain", 404)
+
+    def generate(self, request):
+        mock = self.mock
+        model = request.get("model", "")
+        prompt = request.get("prompt")
+        if prompt is None:
+            # Warm-up: load the model and answer at once
+            delay, _ = mock.evaluate(model, "")
+            mock.count(warm_up=1)
+            time.sleep(delay)
+            self.send_body(json.dumps({"model": model, "done": True}).encode("utf-8"))
+            return
+
+        delay, evaluated = mock.evaluate(model, prompt)
+        reply = mock.reply()
+        tokens = reply.split(" ")
+        streaming = request.get("stream", True)
+        mock.record(streaming, estimate_tokens(prompt), evaluated, len(tokens))
+        final = {
+            "model": model, "done": True,
+            "prompt_eval_count": evaluated, "eval_count": len(tokens),
+            "prompt_eval_duration": int(delay * 1e9), "eval_duration": int(len(tokens) / mock.token_rate * 1e9),
+        }
+        time.sleep(delay)
+        if not streaming:
+            time.sleep(len(tokens) / mock.token_rate)
+            mock.remember(prompt + reply)
+            self.send_body(json.dumps({**final, "response": reply}).encode("utf-8"))
+            return
+
+        self.start_chunked("application/x-ndjson")
+        for i, token in enumerate(tokens):
+            text = token if i == len(tokens) - 1 else token + " "
+            self.send_chunk(json.dumps({"model": model, "response": text, "done": False}).encode("utf-8") + b"\n")
+            time.sleep(1 / mock.token_rate)
+        self.send_chunk(json.dumps({**final, "response": ""}).encode("utf-8") + b"\n")
+        self.end_chunked()
+        mock.remember(prompt + reply)
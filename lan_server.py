@@ -0,0 +1,660 @@
+"""LAN multiplayer for the RPG adventure.
+
+One machine hosts the games and talks to Ollama/AllTalk; every player (and any
+number of spectators) connects from their own computer. A single host process
+can run several independent tables at once; their model requests share the
+LLMScheduler in main.py. Messages are JSON objects, one per line, over plain TCP.
+
+    python lan_server.py host --players 3 --genre Fantasy
+    python lan_server.py connect 192.168.1.10 --name Aria --class Mage
+    python lan_server.py connect 192.168.1.10 --name Mum --spectator
+    python lan_server.py connect 192.168.1.10 --name Kim --table tuesday --players 4
+    python lan_server.py loopback --tables 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+
+import main as game
+
+DEFAULT_PORT = 7777
+MIN_PLAYERS = 2
+MAX_PLAYERS = 5
+DEFAULT_TABLE = "main"
+MAX_TABLES = 8
+# Messages queued for one client before it is considered stuck and dropped
+CLIENT_QUEUE_LIMIT = 1000
+
+def encode(message):
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+class Client:
+    def __init__(self, writer, name, role):
+        self.writer = writer
+        self.name = name
+        self.role = role
+        self.outbox = asyncio.Queue(CLIENT_QUEUE_LIMIT)
+        self.sender = None
+
+    def send(self, message):
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            logging.error(f"Dropping client {self.name}: too many unsent messages")
+            self.writer.close()
+
+    async def pump(self):
+        # Each client has its own writer task so a slow connection never
+        # holds up the broadcast to everybody else
+        try:
+            while True:
+                message = await self.outbox.get()
+                self.writer.write(encode(message))
+                await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+class Table:
+    """One adventure: a GameSession plus the connections of its players and spectators.
+
+    Turn order follows the order in which players joined, exactly like
+    current_player_index in the console game. LLM and TTS calls run in worker
+    threads, so the event loop keeps serving every client while the DM talks.
+    """
+
+    def __init__(self, name, num_players, genre, starting_location, reply_fn=None, voice=False, priority=0, host=None):
+        self.name = name
+        self.num_players = num_players
+        self.genre = genre
+        self.starting_location = starting_location
+        self.reply_fn = reply_fn or game.stream_reply
+        self.voice = voice
+        self.priority = priority
+        self.host = host
+        self.session = game.GameSession(narrate_fn=self._narrate, announce_fn=self._announce,
+                                        generate_fn=self._generate, present_fn=self._present)
+        self.session.voice = voice
+        self.seats = []  # (name, player_class) in join order
+        self.players = {}  # name -> Client, absent while disconnected
+        self.spectators = []
+        self.busy = False
+        self.loop = asyncio.get_running_loop()
+
+    @property
+    def empty(self):
+        return not self.players and not self.spectators
+
+    # --- connection handling ---
+
+    def join(self, writer, message):
+        name = str(message.get("name", "")).strip()
+        role = "spectator" if message.get("role") == "spectator" else "player"
+        if not name:
+            writer.write(encode({"type": "error", "text": "A name is required."}))
+            return None
+
+        if role == "player":
+            seat_names = [seat_name for seat_name, _ in self.seats]
+            if name in self.players:
+                writer.write(encode({"type": "error", "text": "Name already taken. Please choose a different name."}))
+                return None
+            if name not in seat_names:
+                if len(self.seats) >= self.num_players:
+                    writer.write(encode({"type": "error", "text": "The party is full. Join as a spectator instead."}))
+                    return None
+                self.seats.append((name, self.pick_class(message.get("class"))))
+
+        client = Client(writer, name, role)
+        client.sender = asyncio.ensure_future(client.pump())
+        if role == "player":
+            self.players[name] = client
+        else:
+            self.spectators.append(client)
+
+        client.send({"type": "welcome", "name": name, "role": role, "table": self.name,
+                     "genre": self.genre, "party": self.party_list()})
+        self.broadcast({"type": "info", "text": f"{name} joined as a {role}."})
+        if self.session.adventure_started:
+            client.send({"type": "narration_end", "label": "Dungeon Master", "text": self.session.last_ai_reply})
+            client.send({"type": "turn", "player": self.session.current_player[0]})
+        elif len(self.players) == self.num_players and not self.busy:
+            asyncio.ensure_future(self.begin())
+        else:
+            self.broadcast({"type": "info", "text": f"Waiting for players ({len(self.players)}/{self.num_players})."})
+        return client
+
+    def leave(self, client):
+        if client.sender:
+            client.sender.cancel()
+        if client.role == "player" and self.players.get(client.name) is client:
+            del self.players[client.name]
+            if not self.session.adventure_started and not self.busy:
+                self.seats = [seat for seat in self.seats if seat[0] != client.name]
+            self.broadcast({"type": "info", "text": f"{client.name} disconnected. Their seat is kept; reconnect with the same name."})
+        elif client in self.spectators:
+            self.spectators.remove(client)
+
+    def pick_class(self, requested):
+        roles = next((roles for genre, roles in game.genres.values() if genre == self.genre), [])
+        for role in roles:
+            if requested and role.lower() == str(requested).lower():
+                return role
+        return random.choice(roles)
+
+    def party_list(self):
+        return [{"name": name, "class": player_class, "connected": name in self.players}
+                for name, player_class in self.seats]
+
+    # --- messaging ---
+
+    def broadcast(self, message):
+        for client in list(self.players.values()) + self.spectators:
+            client.send(message)
+
+    def broadcast_threadsafe(self, message):
+        self.loop.call_soon_threadsafe(self.broadcast, message)
+
+    def _announce(self, text):
+        self.broadcast_threadsafe({"type": "info", "text": text.strip()})
+
+    def _narrate(self, prompt, label="Dungeon Master", on_reply=None, model=None):
+        # Runs in a worker thread: stream sanitized text to every client and
+        # optionally narrate it on the host's speakers
+        label = label.strip()
+        self.broadcast_threadsafe({"type": "narration_start", "label": label})
+
+        def on_text(text):
+            self.broadcast_threadsafe({"type": "narration", "text": text})
+            if self.voice and game.NARRATION_PIPELINE:
+                game.narrator.feed(text)
+
+        with game.llm_scheduler.session(self.name, self.priority):
+            reply, consistent = self.reply_fn(prompt, on_text, model)
+        self.broadcast_threadsafe({"type": "narration_end", "label": label, "text": reply, "replace": not consistent})
+        if reply and on_reply:
+            on_reply(reply)
+        if self.voice and not reply and game.NARRATION_PIPELINE:
+            # A failed generation: drop the sentences it already queued
+            game.narrator.cancel()
+        if self.voice and reply:
+            if not game.NARRATION_PIPELINE:
+                game.speak(reply)
+            elif consistent:
+                game.narrator.flush()
+            else:
+                game.narrator.cancel()
+                game.narrator.say(reply)
+        return reply
+
+    def _generate(self, prompt, model=None):
+        # The speculative round summary: generated in the background, shown later by _present
+        with game.llm_scheduler.session(self.name, self.priority):
+            reply, _ = self.reply_fn(prompt, lambda text: None, model)
+        return reply
+
+    def _present(self, text, label="Dungeon Master"):
+        label = label.strip()
+        self.broadcast_threadsafe({"type": "narration_start", "label": label})
+        self.broadcast_threadsafe({"type": "narration", "text": text})
+        self.broadcast_threadsafe({"type": "narration_end", "label": label, "text": text, "replace": False})
+        if self.voice:
+            game.speak(text)
+
+    # --- game flow ---
+
+    async def begin(self):
+        self.busy = True
+        try:
+            self.session.setup(self.genre, self.seats, self.starting_location)
+            self.broadcast({"type": "start", "genre": self.genre, "location": self.starting_location,
+                            "scenario": self.session.starting_scenario, "party": self.party_list()})
+            await self.loop.run_in_executor(None, self.session.begin)
+        finally:
+            self.busy = False
+        if self.session.adventure_started:
+            self.announce_turn()
+        else:
+            self.broadcast({"type": "error", "text": "The Dungeon Master could not start the adventure. Is Ollama running?"})
+
+    def play_turn(self, text):
+        with game.perf.turn(table=self.name):
+            return self.session.play_turn(text)
+
+    def announce_turn(self):
+        self.broadcast({"type": "turn", "player": self.session.current_player[0]})
+
+    async def handle_action(self, client, text):
+        if not text:
+            return
+        if text.startswith("/"):
+            await self.handle_command(client, text.lower())
+            return
+        if client.role != "player":
+            client.send({"type": "error", "text": "Spectators cannot act."})
+            return
+        if not self.session.adventure_started:
+            client.send({"type": "error", "text": "The adventure has not started yet."})
+            return
+        if self.busy:
+            client.send({"type": "error", "text": "The Dungeon Master is still narrating."})
+            return
+        if self.session.current_player[0] != client.name:
+            client.send({"type": "error", "text": f"It is {self.session.current_player[0]}'s turn."})
+            return
+
+        self.busy = True
+        try:
+            self.broadcast({"type": "action", "player": client.name, "text": text})
+            error_msg, _ = await self.loop.run_in_executor(None, self.play_turn, text)
+        finally:
+            self.busy = False
+        if error_msg:
+            client.send({"type": "dm", "text": error_msg})
+        self.announce_turn()
+
+    async def handle_command(self, client, cmd):
+        session = self.session
+        if cmd in ["/?", "/help"]:
+            client.send({"type": "reply", "text": LAN_HELP})
+        elif cmd == "/state":
+            client.send({"type": "reply", "text": session.state_text(full=True)})
+        elif cmd == "/players":
+            lines = [f"{i}. {p['name']} the {p['class']}{'' if p['connected'] else ' (disconnected)'}"
+                     for i, p in enumerate(self.party_list(), 1)]
+            lines += [f"   {s.name} (spectator)" for s in self.spectators]
+            client.send({"type": "reply", "text": "\n".join(lines)})
+        elif cmd == "/consequences":
+            with session.lock:
+                consequences = list(session.player_choices.consequences)[-5:]
+            text = "\n".join(f"{i}. {c}" for i, c in enumerate(consequences, 1)) or "No consequences recorded yet."
+            client.send({"type": "reply", "text": text})
+        elif cmd == "/status":
+            lines = session.models.report() + game.health_monitor.report() + game.llm_scheduler.report()
+            client.send({"type": "reply", "text": "\n".join(lines)})
+        elif cmd in ("/skip", "/stop") or cmd.split()[0] == "/volume":
+            # Narration only plays on the host's speakers
+            client.send({"type": "reply", "text": game.audio_command(cmd)})
+        elif cmd.split()[0] == "/perf":
+            client.send({"type": "reply", "text": game.perf_command(cmd)})
+        elif cmd == "/cache":
+            text = game.tts_cache.report() if game.tts_cache is not None else "The narration cache is off."
+            client.send({"type": "reply", "text": text})
+        elif cmd == "/tables" and self.host:
+            client.send({"type": "reply", "text": "\n".join(self.host.table_list())})
+        elif cmd == "/redo":
+            if client.name != session.last_player_name:
+                client.send({"type": "error", "text": "Only the player who acted last can redo."})
+            elif self.busy:
+                client.send({"type": "error", "text": "The Dungeon Master is still narrating."})
+            else:
+                self.busy = True
+                try:
+                    redone = await self.loop.run_in_executor(None, session.redo)
+                finally:
+                    self.busy = False
+                if not redone:
+                    client.send({"type": "error", "text": "Nothing to redo."})
+        else:
+            client.send({"type": "error", "text": f"Unknown command {cmd}. Type /help."})
+
+class GameHost:
+    """Accepts connections and routes each one to its table.
+
+    A join message names the table (DEFAULT_TABLE if omitted). Unknown tables
+    are opened on the fly with the joiner's player count and genre, falling
+    back to the host defaults, and closed again once everyone has left.
+    """
+
+    def __init__(self, num_players=2, genre=None, reply_fn=None, voice=True, priorities=None, max_tables=MAX_TABLES):
+        self.num_players = num_players
+        self.genre = genre
+        self.reply_fn = reply_fn
+        self.voice = voice
+        self.priorities = priorities or {}
+        self.max_tables = max_tables
+        self.tables = {}
+        self.server = None
+
+    async def start(self, host="0.0.0.0", port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    def open_table(self, name, message):
+        table = self.tables.get(name)
+        if table is not None:
+            return table, None
+        if len(self.tables) >= self.max_tables:
+            return None, "This host is already running as many tables as it can."
+        try:
+            num_players = int(message.get("players") or self.num_players)
+        except (TypeError, ValueError):
+            num_players = self.num_players
+        if not MIN_PLAYERS <= num_players <= MAX_PLAYERS:
+            return None, f"A table seats {MIN_PLAYERS} to {MAX_PLAYERS} players."
+        known = [genre for genre, _ in game.genres.values() if genre != "Random"]
+        genre = message.get("genre") if message.get("genre") in known else (self.genre or random.choice(known))
+        location = random.choice(game.GENRE_LOCATIONS.get(genre, ["Location 1"]))
+        # Only the default table narrates on the host's own speakers
+        table = Table(name, num_players, genre, location, self.reply_fn,
+                      voice=self.voice and name == DEFAULT_TABLE,
+                      priority=self.priorities.get(name, 0), host=self)
+        self.tables[name] = table
+        game.log_event(logging.INFO, f"Opened table {name}", session=table.session.session_id,
+                       players=num_players, genre=genre, location=location)
+        return table, None
+
+    def table_list(self):
+        lines = []
+        for name, table in self.tables.items():
+            state = f"round {table.session.rounds_completed}" if table.session.adventure_started else "waiting for players"
+            lines.append(f"{name}: {table.genre}, {len(table.players)}/{table.num_players} players, "
+                         f"{len(table.spectators)} spectators, {state}, priority {table.priority}")
+        return lines
+
+    async def handle_client(self, reader, writer):
+        table = client = None
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            name = str(message.get("table") or DEFAULT_TABLE).strip()[:32]
+            table, error = self.open_table(name, message)
+            if table is None:
+                writer.write(encode({"type": "error", "text": error}))
+                return
+            client = table.join(writer, message)
+            if client is None:
+                return
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("type") == "action":
+                    await table.handle_action(client, str(message.get("text", "")).strip())
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logging.error(f"Client connection error: {e}")
+        finally:
+            if client is not None:
+                table.leave(client)
+            if table is not None and table.empty and not table.busy and self.tables.get(table.name) is table:
+                del self.tables[table.name]
+            writer.close()
+
+LAN_HELP = """Available commands:
+/? or /help       - Show this help message
+/state            - Show current world state
+/players          - Show party members and spectators
+/consequences     - Show recent consequences of your actions
+/status           - Show the models in use and Ollama/AllTalk availability and latency
+/redo             - Regenerate the last DM reply (last player only)
+/tables           - Show every table running on this host
+/skip             - Skip the narration clip playing on the host
+/stop             - Stop all narration queued on the host
+/volume [0-100]   - Show or set the host's narration volume
+/cache            - Show the host's narration cache size and hit rate
+/perf [reset]     - Show how long each stage of a turn takes on the host
+Anything else is your action when it is your turn."""
+
+# --- command line client ---
+
+async def run_client(host, port, name, role, player_class=None, table=None, players=None, genre=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode({"type": "join", "name": name, "role": role, "class": player_class,
+                         "table": table, "players": players, "genre": genre}))
+    await writer.drain()
+
+    async def send_input():
+        while True:
+            text = await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+            if not text:
+                break
+            writer.write(encode({"type": "action", "text": text.strip()}))
+            await writer.drain()
+
+    sender = asyncio.ensure_future(send_input())
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                print("\nDisconnected from the game host.")
+                break
+            message = json.loads(line)
+            kind = message.get("type")
+            if kind == "narration_start":
+                print(f"\n{message['label']}: ", end="", flush=True)
+            elif kind == "narration":
+                print(message["text"], end="", flush=True)
+            elif kind == "narration_end":
+                if message.get("replace"):
+                    print(f"\n{message['label']}: {message['text']}", end="")
+                print()
+            elif kind == "turn":
+                if message["player"] == name and role == "player":
+                    print(f"\n{name}> ", end="", flush=True)
+                else:
+                    print(f"\n[{message['player']}'s turn]")
+            elif kind == "action":
+                if message["player"] != name:
+                    print(f"{message['player']}: {message['text']}")
+            elif kind == "start":
+                print(f"\n--- Adventure Start: The {message['genre']} Party ---")
+                for player in message["party"]:
+                    print(f"  - {player['name']} the {player['class']}")
+                print(f"Starting location: {message['location']}")
+                print(f"Starting scenario: {message['scenario']}")
+            elif kind == "dm":
+                print(f"Dungeon Master: {message['text']}")
+            elif kind == "welcome":
+                print(f"Joined table {message['table']} as {message['name']} ({message['role']}). "
+                      "Type '/?' or '/help' for commands.")
+            elif kind == "error":
+                print(f"! {message['text']}")
+            else:
+                print(message.get("text", ""))
+    finally:
+        sender.cancel()
+        writer.close()
+
+# --- loopback harness ---
+
+LOOPBACK_REPLIES = [
+    "Dust rises as the stones shift, revealing a narrow passage. Somewhere below, water drips steadily.",
+    "The innkeeper lowers his voice. 'They took the north road three nights ago, and none have returned.'",
+    "Pale light fills the chamber and shadows scatter across carved runes. A faint humming answers.",
+    "The key is cold to the touch. As it leaves the table, a bell rings somewhere deep in the keep.",
+]
+
+def fake_stream_reply(prompt, on_text, model=None, token_delay=0.002):
+    """Stand-in for stream_reply: streams a canned reply word by word.
+
+    It takes a scheduler slot like a real generation, so the loopback run
+    exercises the cross-table queueing too.
+    """
+    text = LOOPBACK_REPLIES[len(prompt) % len(LOOPBACK_REPLIES)]
+    with game.llm_scheduler.slot():
+        for word in text.split(" "):
+            time.sleep(token_delay)
+            on_text(word + " ")
+    return text, True
+
+class ScriptedClient:
+    def __init__(self, name, table, role="player", actions=()):
+        self.name = name
+        self.table = table
+        self.role = role
+        self.actions = list(actions)
+        self.turns = []
+        self.narrations = []
+        self.errors = []
+        self.replies = []
+        self.reply_during_narration = False
+        self.narrating = False
+
+    async def run(self, port, rounds_done):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(encode({"type": "join", "name": self.name, "role": self.role, "table": self.table}))
+        await writer.drain()
+        probed = False
+        while not rounds_done.is_set():
+            try:
+                line = await asyncio.wait_for(reader.readline(), 0.1)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                break
+            message = json.loads(line)
+            kind = message["type"]
+            if kind == "narration_start":
+                self.narrating = True
+                if self.role == "spectator" and not probed:
+                    # Ask for the state mid-narration: the host must answer at once
+                    probed = True
+                    writer.write(encode({"type": "action", "text": "/state"}))
+                    await writer.drain()
+            elif kind == "narration_end":
+                self.narrating = False
+                self.narrations.append(message["text"])
+            elif kind == "reply":
+                self.replies.append(message["text"])
+                self.reply_during_narration |= self.narrating
+            elif kind == "error":
+                self.errors.append(message["text"])
+            elif kind == "turn":
+                self.turns.append(message["player"])
+                if message["player"] == self.name and self.actions:
+                    writer.write(encode({"type": "action", "text": self.actions.pop(0)}))
+                    await writer.drain()
+                elif self.role == "player" and len(self.turns) == 1:
+                    # Try to act out of turn once; the host must refuse
+                    writer.write(encode({"type": "action", "text": "I sneak ahead"}))
+                    await writer.drain()
+        writer.close()
+
+async def run_loopback(num_players=5, rounds=2, tables=1):
+    host = GameHost(num_players, "Fantasy", reply_fn=fake_stream_reply, voice=False)
+    port = await host.start("127.0.0.1", 0)
+    rounds_done = asyncio.Event()
+
+    names = ["Aria", "Borin", "Cale", "Dara", "Eryn"][:num_players]
+    actions = ["I search the room", "I open the door", "I listen carefully", "I light a torch"]
+    table_names = [DEFAULT_TABLE] + [f"table{i}" for i in range(2, tables + 1)]
+    seated = {}
+    for table_name in table_names:
+        players = [ScriptedClient(name, table_name, actions=[random.choice(actions) for _ in range(rounds)])
+                   for name in names]
+        seated[table_name] = (players, ScriptedClient("Watcher", table_name, role="spectator"))
+
+    async def watch():
+        while (len(host.tables) < tables
+               or any(table.session.rounds_completed < rounds for table in host.tables.values())):
+            await asyncio.sleep(0.05)
+        finished.update({name: table.session.rounds_completed for name, table in host.tables.items()})
+        await asyncio.sleep(0.2)
+        rounds_done.set()
+
+    finished = {}
+    started = time.monotonic()
+    clients = []
+    for players, spectator in seated.values():
+        clients.append(asyncio.ensure_future(spectator.run(port, rounds_done)))
+    await asyncio.sleep(0.05)
+    for players, _ in seated.values():
+        for player in players:
+            clients.append(asyncio.ensure_future(player.run(port, rounds_done)))
+            await asyncio.sleep(0.02)
+    await asyncio.wait_for(watch(), 60)
+    await asyncio.gather(*clients)
+    host.server.close()
+    elapsed = time.monotonic() - started
+
+    expected_turns = [names[i % num_players] for i in range(num_players * rounds + 1)]
+    for table_name, (players, spectator) in seated.items():
+        for client in players + [spectator]:
+            assert client.turns[:len(expected_turns)] == expected_turns, (table_name, client.name, client.turns)
+            # Opening, one reply per action and one summary per round
+            assert len(client.narrations) == 1 + num_players * rounds + rounds, (table_name, client.name, len(client.narrations))
+            assert client.narrations == spectator.narrations
+        assert all(player.errors for player in players[1:]), f"{table_name}: out-of-turn action accepted"
+        assert spectator.replies and spectator.reply_during_narration, f"{table_name}: host blocked while narrating"
+        assert finished[table_name] == rounds
+    print(f"Loopback OK: {tables} table(s) of {num_players} players + 1 spectator, {rounds} rounds each, "
+          f"{sum(len(spectator.narrations) for _, spectator in seated.values())} narrations in {elapsed:.2f}s")
+    for line in game.llm_scheduler.report():
+        print(line)
+
+# --- entry point ---
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="LAN multiplayer for the RPG adventure")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    host = commands.add_parser("host", help="host a game on this machine")
+    host.add_argument("--players", type=int, default=2, help="default number of players per table (2-5)")
+    host.add_argument("--genre", choices=[genre for genre, _ in game.genres.values() if genre != "Random"],
+                      help="default genre for new tables (random if omitted)")
+    host.add_argument("--max-tables", type=int, default=MAX_TABLES)
+    host.add_argument("--priority", action="append", default=[], metavar="TABLE=LEVEL",
+                      help="serve this table's model requests first (higher level wins)")
+    host.add_argument("--bind", default="0.0.0.0")
+    host.add_argument("--port", type=int, default=DEFAULT_PORT)
+    host.add_argument("--no-voice", action="store_true", help="do not narrate on the host's speakers")
+
+    connect = commands.add_parser("connect", help="join a hosted game")
+    connect.add_argument("host")
+    connect.add_argument("--port", type=int, default=DEFAULT_PORT)
+    connect.add_argument("--name", required=True)
+    connect.add_argument("--class", dest="player_class")
+    connect.add_argument("--spectator", action="store_true")
+    connect.add_argument("--table", help=f"table to join or open (default: {DEFAULT_TABLE})")
+    connect.add_argument("--players", type=int, help="number of players when opening a new table")
+    connect.add_argument("--genre", help="genre when opening a new table")
+
+    loopback = commands.add_parser("loopback", help="run scripted clients against a fake DM")
+    loopback.add_argument("--players", type=int, default=MAX_PLAYERS)
+    loopback.add_argument("--rounds", type=int, default=2)
+    loopback.add_argument("--tables", type=int, default=1)
+
+    args = parser.parse_args()
+    game.configure_logging()
+    if args.command == "host":
+        if not MIN_PLAYERS <= args.players <= MAX_PLAYERS:
+            parser.error(f"--players must be between {MIN_PLAYERS} and {MAX_PLAYERS}")
+        priorities = {}
+        for item in args.priority:
+            table, _, level = item.partition("=")
+            try:
+                priorities[table] = int(level)
+            except ValueError:
+                parser.error(f"--priority expects TABLE=LEVEL, got {item}")
+        game.health_monitor.start()
+        game.model_catalog.refresh()
+        game.choose_model()
+        # Every table starts on the chosen models: load them before anyone joins
+        game.ModelRegistry().warm_up()
+
+        async def serve():
+            host = GameHost(args.players, args.genre, voice=not args.no_voice,
+                            priorities=priorities, max_tables=args.max_tables)
+            port = await host.start(args.bind, args.port)
+            print(f"Hosting on port {port} with up to {args.max_tables} tables. Waiting for players...")
+            async with host.server:
+                await host.server.serve_forever()
+
+        asyncio.run(serve())
+    elif args.command == "connect":
+        asyncio.run(run_client(args.host, args.port, args.name, "spectator" if args.spectator else "player",
+                               args.player_class, args.table, args.players, args.genre))
+    else:
+        asyncio.run(run_loopback(args.players, args.rounds, args.tables))
+
+if __name__ == "__main__":
+    try:
+        main_cli()
+    except KeyboardInterrupt:
+        pass
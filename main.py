@@ -1,40 +1,679 @@
 import random
+import bisect
 import requests
-import sounddevice as sd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 import os
-import subprocess
 import re
 import logging
+import logging.handlers
 import datetime
+import atexit
+import contextvars
+import uuid
+import copy
 import sys
-from collections import defaultdict
+import json
+import queue
+import threading
+import itertools
+import contextlib
+import functools
+import hashlib
+import struct
+import time
+from collections import defaultdict, deque, namedtuple
 
-# Configure logging
-log_filename = f"rpg_adventure_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-logging.basicConfig(filename=log_filename, level=logging.ERROR,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+# Importing this module has no side effects: logging, model discovery and the
+# model prompt happen in main() (or the LAN server's entry point)
+DEFAULT_MODEL = "llama3:instruct"
+ollama_model = DEFAULT_MODEL
+log_filename = None
+log_listener = None
 
-# API URLs
-ALLTALK_API_URL = "http://localhost:7851/api/tts-generate"
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+# Logging. LOG_LEVEL: ERROR (the default) records failures only, INFO adds one
+# line per turn (player, prompt and reply size, time, Ollama token counts)
+# plus round summaries, compactions and saves, DEBUG adds every Ollama and
+# AllTalk request. LOG_FORMAT=json writes one JSON object per line. Records
+# are written by a background thread, so logging never blocks a turn, and the
+# file rotates at LOG_MAX_BYTES, keeping LOG_BACKUPS old files. LOG_FILE
+# replaces the default rpg_adventure_<timestamp>.log.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "ERROR").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+LOG_FILE = os.environ.get("LOG_FILE") or None
+LOG_MAX_BYTES = 10_000_000
+LOG_BACKUPS = 5
 
-#getting the models from ollama
-def get_installed_models():
+# Correlation ids ("session", "turn") of the code running now; every log
+# record is stamped with them. Threads started for a turn copy them.
+log_ids = contextvars.ContextVar("log_ids", default={})
+
+@contextlib.contextmanager
+def log_context(**ids):
+    token = log_ids.set({**log_ids.get(), **ids})
     try:
-        result = subprocess.run(
-            ["ollama", "list"], capture_output=True, text=True, check=True
+        yield
+    finally:
+        log_ids.reset(token)
+
+def log_event(level, message, **fields):
+    """Log message with structured fields (JSON keys, or key=value in text logs)."""
+    logging.log(level, message, extra={"fields": fields})
+
+class LogContextFilter(logging.Filter):
+    """Stamps each record with the correlation ids of the thread that logged it."""
+
+    def filter(self, record):
+        ids = log_ids.get()
+        record.session = ids.get("session", "-")
+        record.turn = ids.get("turn", "-")
+        return True
+
+class LogFormatter(logging.Formatter):
+    """Log lines as text, or as one JSON object per line with json_lines."""
+
+    def __init__(self, json_lines=False):
+        super().__init__('%(asctime)s - %(levelname)s - [%(session)s/%(turn)s] %(message)s')
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, "fields", None) or {}
+        if not self.json_lines:
+            text = super().format(record)
+            return text + "".join(f" {key}={value}" for key, value in fields.items())
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "session": getattr(record, "session", "-"),
+            "turn": getattr(record, "turn", "-"),
+            "message": record.getMessage(),
+            **fields,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for the listener thread with the traceback rendered
+    into exc_text; the stock prepare() folds it into the message, where the
+    JSON "exception" field never sees it."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # The traceback's frames are not needed once it is text
+        record.exc_info = None
+        return record
+
+def configure_logging():
+    """Log to a rotating file in the working directory, through a queue
+    drained by a background thread."""
+    global log_filename, log_listener
+    if log_listener is not None:
+        return
+    log_filename = LOG_FILE or f"rpg_adventure_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    level = logging.getLevelName(LOG_LEVEL)
+    if not isinstance(level, int):
+        level = logging.ERROR
+    file_handler = logging.handlers.RotatingFileHandler(log_filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                        encoding="utf-8", delay=True)
+    file_handler.setFormatter(LogFormatter(json_lines=LOG_FORMAT == "json"))
+    log_queue = queue.SimpleQueue()
+    queue_handler = LogQueueHandler(log_queue)
+    queue_handler.addFilter(LogContextFilter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    # Connection pool chatter from requests is not ours to debug
+    logging.getLogger("urllib3").setLevel(max(level, logging.WARNING))
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    log_listener.start()
+    # Write out whatever is still queued when the game exits
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Write out the queued records and stop the listener thread."""
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+# Backend servers (override with environment variables to use another machine on the LAN)
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+ALLTALK_BASE_URL = os.environ.get("ALLTALK_BASE_URL", "http://localhost:7851")
+
+# API URLs
+ALLTALK_API_URL = f"{ALLTALK_BASE_URL}/api/tts-generate"
+OLLAMA_API_URL = f"{OLLAMA_BASE_URL}/api/generate"
+
+# Retries for failed connections and 502/503/504 answers, with exponential backoff
+HTTP_RETRIES = 2
+HTTP_BACKOFF = 0.5
+HTTP_POOL_SIZE = 4
+
+# Background backend health probes: seconds between probes, how long a result
+# stays valid, and the timeout for a single probe
+HEALTH_CHECK_INTERVAL = 15
+HEALTH_CHECK_TTL = 45
+HEALTH_CHECK_TIMEOUT = 5
+
+# Print DM replies token by token as Ollama generates them
+STREAM_RESPONSES = True
+# Synthesize and play narration sentence by sentence in the background
+NARRATION_PIPELINE = True
+
+# How long the list of installed Ollama models is trusted before it is fetched again
+MODEL_LIST_TTL = 300
+
+# Model for each kind of request; None uses the session's active model (the
+# one picked at startup or with /change). Round summaries and context
+# compaction run in the background, so a small, fast model suits them, e.g.
+# SUMMARY_MODEL=llama3.2:3b python main.py
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL") or None
+MODEL_ROUTES = {
+    "narration": None,
+    "summary": SUMMARY_MODEL,
+    "compaction": SUMMARY_MODEL,
+}
+# Load a model into Ollama as soon as it is selected, so the first turn that
+# uses it does not wait for the load
+MODEL_WARMUP = True
+
+# Narration audio: clips are played back to back on one output stream, opened
+# on first use at the sample rate and channel count of the first clip (the
+# AUDIO_SAMPLE_RATE mono default is only used before that). AUDIO_DEVICE picks
+# the sounddevice output (name or index; "null" discards audio at the
+# playback rate), AUDIO_VOLUME is 0.0-1.0
+AUDIO_SAMPLE_RATE = 22050
+AUDIO_BLOCK_SIZE = 1024
+AUDIO_DEVICE = os.environ.get("AUDIO_DEVICE") or None
+AUDIO_VOLUME = 1.0
+
+# Synthesized narration is cached on disk in TTS_CACHE_DIR, keyed by a hash of
+# the text, voice and TTS settings; past TTS_CACHE_MAX_BYTES the least
+# recently played clips are removed (None: no cache)
+TTS_CACHE_DIR = "tts_cache"
+TTS_CACHE_MAX_BYTES = 200_000_000
+
+# Use AllTalk's streaming endpoint, so narration starts playing while the clip
+# is still downloading (it has no narrator voice); TTS_CHUNK_BYTES is how much
+# audio is read at a time
+TTS_STREAMING = False
+TTS_CHUNK_BYTES = 16384
+
+# Prompt history limits: recent exchanges kept verbatim, token budget for the
+# whole history block and for the running summary of older turns
+CONTEXT_KEEP_EXCHANGES = 8
+CONTEXT_TOKEN_BUDGET = 1500
+SUMMARY_TOKEN_BUDGET = 300
+
+# Most Ollama generations allowed in flight at once across all sessions
+# (match OLLAMA_NUM_PARALLEL on the server)
+LLM_MAX_IN_FLIGHT = 2
+
+# How long Ollama keeps the model (and its prompt cache) loaded between turns
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Longest world-state text put into a DM prompt; the oldest objects, resources
+# and faction entries are left out first when it is exceeded (None: no cap)
+STATE_PROMPT_MAX_CHARS = 2500
+# Longest consequence line in that capped text. Consequences quote whole DM
+# replies, which the prompt's history already carries
+STATE_CONSEQUENCE_CHARS = 200
+
+# How much history the world state keeps: world events and consequences are
+# ring buffers of this many entries, and past OBJECT_RETENTION object states
+# the least recently changed ones are forgotten (None: keep everything)
+WORLD_EVENT_RETENTION = 20
+CONSEQUENCE_RETENTION = 5
+OBJECT_RETENTION = 500
+
+# Save slots live in SAVES_DIR as <slot>.sav, summarized in its index.json.
+# SAVE_FILE and LEGACY_SAVE_FILE are the single-save files of older versions,
+# moved into DEFAULT_SLOT on startup.
+SAVES_DIR = "saves"
+DEFAULT_SLOT = "adventure"
+SAVE_FILE = "adventure.sav"
+LEGACY_SAVE_FILE = "adventure.txt"
+SAVE_FORMAT = "rpg-adventure-save"
+SAVE_FORMAT_VERSION = 1
+
+# Autosave journal: fsync after this many records or seconds, and fold the
+# journal into a fresh snapshot after this many records
+JOURNAL_FSYNC_EVERY = 8
+JOURNAL_FSYNC_INTERVAL = 2.0
+JOURNAL_COMPACT_EVERY = 200
+
+# Stage timings of every turn, shown by /perf over the last PERF_WINDOW
+# samples of each stage. PERF_FILE also appends each turn's timings to a JSON
+# Lines file. With PERF_ENABLED off a timed stage costs one attribute check.
+PERF_ENABLED = True
+PERF_WINDOW = 200
+PERF_FILE = os.environ.get("PERF_FILE") or None
+
+# Upper bounds (seconds) of the /perf histogram buckets, plus one for the rest
+PERF_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+HISTOGRAM_BARS = " ▁▂▃▄▅▆▇█"
+NULL_SPAN = contextlib.nullcontext()
+
+class PerfRecorder:
+    """Rolling timings of the stages of a turn.
+
+    span(stage) times a block and add(stage, seconds) records a duration
+    measured elsewhere, such as Ollama's own prompt_eval_duration. Each stage
+    keeps its last `window` samples for report(). turn() marks the turn run
+    by the calling thread: the stages recorded on that thread meanwhile are
+    summed into one record and appended to export_path as a JSON line.
+    Stages timed on background threads (speech synthesis, round summaries,
+    compaction) only go to the rolling windows.
+    """
+
+    def __init__(self, enabled=PERF_ENABLED, window=PERF_WINDOW, export_path=PERF_FILE):
+        self.enabled = enabled
+        self.window = window
+        self.export_path = export_path
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.local = threading.local()
+        self.turns = 0
+
+    def span(self, stage):
+        if not self.enabled:
+            return NULL_SPAN
+        return self._span(stage)
+
+    @contextlib.contextmanager
+    def _span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+        stages = getattr(self.local, "stages", None)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def turn(self, **labels):
+        """Time one turn; labels (e.g. the LAN table) go into its exported record."""
+        if not self.enabled:
+            yield
+            return
+        self.local.stages = stages = {}
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.local.stages = None
+            total = time.perf_counter() - started
+            self.add("turn", total)
+            with self.lock:
+                self.turns += 1
+                number = self.turns
+            if self.export_path:
+                self.export({"time": datetime.datetime.now().isoformat(timespec="milliseconds"), "turn": number,
+                             **labels, "total": round(total, 6),
+                             "stages": {stage: round(seconds, 6) for stage, seconds in stages.items()}})
+
+    def export(self, record):
+        try:
+            with self.lock, open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            logging.error(f"Error writing performance metrics: {e}")
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def report(self):
+        if not self.enabled:
+            return ["Performance timing is off (PERF_ENABLED)."]
+        with self.lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+        if not samples:
+            return ["Nothing timed yet."]
+        bounds = " ".join(f"<{bound * 1000:g}" for bound in PERF_BUCKETS)
+        lines = [f"Last {self.window} samples per stage, in ms (histogram buckets: {bounds} and over)",
+                 f"  {'stage':24}{'count':>6}{'p50':>9}{'p95':>9}{'max':>9}  histogram"]
+        for stage, values in samples.items():
+            counts = [0] * (len(PERF_BUCKETS) + 1)
+            for value in values:
+                counts[bisect.bisect_left(PERF_BUCKETS, value)] += 1
+            top = max(counts)
+            bars = "".join(HISTOGRAM_BARS[-(-count * (len(HISTOGRAM_BARS) - 1) // top)] for count in counts)
+            p50 = values[len(values) // 2]
+            p95 = values[min(len(values) - 1, len(values) * 95 // 100)]
+            lines.append(f"  {stage:24}{len(values):>6}{p50 * 1000:>9.1f}{p95 * 1000:>9.1f}{values[-1] * 1000:>9.1f}  {bars}")
+        return lines
+
+perf = PerfRecorder()
+
+class BackendClient:
+    """Keep-alive HTTP session for one backend server.
+
+    Connections are pooled and reused across turns and threads instead of
+    opening a new TCP connection for every request.
+    """
+
+    def __init__(self, base_url, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, pool_size=HTTP_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False
         )
-        lines = result.stdout.strip().splitlines()
-        models = []
-        for line in lines[1:]:
-            parts = line.split()
-            if parts:
-                models.append(parts[0])
-        return models
-    except Exception as e:
-        logging.error(f"Error getting installed models: {e}")
-        return []
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path, **kwargs):
+        return self.session.get(self.url(path), **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.session.post(self.url(path), **kwargs)
+
+ollama_client = BackendClient(OLLAMA_BASE_URL)
+alltalk_client = BackendClient(ALLTALK_BASE_URL)
+
+class HealthMonitor:
+    """Probes backend servers in the background and caches whether they are up.
+
+    The game only ever reads the cached status, so a turn never waits on a
+    health check. Failed requests on the hot path call mark_down() so a
+    backend that just went away is skipped until the next successful probe.
+    """
+
+    def __init__(self, interval=HEALTH_CHECK_INTERVAL, ttl=HEALTH_CHECK_TTL):
+        self.interval = interval
+        self.ttl = ttl
+        self.backends = {}
+        self.status = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def register(self, name, client, path):
+        self.backends[name] = (client, path)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            for name in list(self.backends):
+                self.check(name)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def check(self, name):
+        client, path = self.backends[name]
+        started = time.monotonic()
+        try:
+            response = client.session.get(client.url(path), timeout=HEALTH_CHECK_TIMEOUT)
+            available = response.status_code == 200
+            error = None if available else f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            available = False
+            error = type(e).__name__
+        latency = time.monotonic() - started
+        with self.lock:
+            was_down = name in self.status and not self.status[name]["available"]
+            self.status[name] = {
+                "available": available,
+                "latency": latency if available else None,
+                "checked_at": time.time(),
+                "error": error
+            }
+        # Log changes only: a backend left off (AllTalk is optional) would
+        # otherwise add an error every interval
+        if not available and not was_down:
+            logging.error(f"{name} health check failed: {error}")
+        elif available and was_down:
+            logging.warning(f"{name} is available again")
+        return available
+
+    def is_available(self, name):
+        """Cached liveness. Unknown or stale entries count as available and
+        trigger a background re-probe rather than blocking the caller."""
+        self.start()
+        with self.lock:
+            status = self.status.get(name)
+        if status is None or time.time() - status["checked_at"] > self.ttl:
+            self.wake.set()
+            return True
+        return status["available"]
+
+    def mark_down(self, name, error):
+        with self.lock:
+            self.status[name] = {
+                "available": False,
+                "latency": None,
+                "checked_at": time.time(),
+                "error": error
+            }
+        self.wake.set()
+
+    def report(self):
+        lines = []
+        now = time.time()
+        with self.lock:
+            for name in self.backends:
+                status = self.status.get(name)
+                if status is None:
+                    lines.append(f"{name}: not checked yet")
+                    continue
+                age = now - status["checked_at"]
+                if status["available"]:
+                    lines.append(f"{name}: up, {status['latency'] * 1000:.0f} ms (checked {age:.0f}s ago)")
+                else:
+                    lines.append(f"{name}: DOWN - {status['error']} (checked {age:.0f}s ago)")
+        return lines
+
+health_monitor = HealthMonitor()
+health_monitor.register("Ollama", ollama_client, "/")
+health_monitor.register("AllTalk", alltalk_client, "/api/ready")
+
+class ModelCatalog:
+    """Models installed on the Ollama server, read from its /api/tags endpoint.
+
+    refresh() fetches the list on a background thread; models() returns the
+    cached list, waiting a little for a fetch still in flight, and starts a
+    new fetch once the list is older than ttl.
+    """
+
+    def __init__(self, client, ttl=MODEL_LIST_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.fetched = threading.Event()
+        self.fetching = False
+        self.fetched_at = None
+        self._models = []
+
+    def refresh(self):
+        with self.lock:
+            if self.fetching:
+                return
+            self.fetching = True
+        threading.Thread(target=self._fetch, daemon=True).start()
+
+    def _fetch(self):
+        models = None
+        try:
+            response = self.client.get("/api/tags", timeout=HEALTH_CHECK_TIMEOUT)
+            response.raise_for_status()
+            models = [model["name"] for model in response.json().get("models", [])]
+        except Exception as e:
+            logging.error(f"Error getting installed models: {e}")
+        with self.lock:
+            if models is not None:
+                self._models = models
+            self.fetched_at = time.monotonic()
+            self.fetching = False
+        self.fetched.set()
+
+    def models(self, timeout=HEALTH_CHECK_TIMEOUT):
+        with self.lock:
+            stale = self.fetched_at is None or time.monotonic() - self.fetched_at > self.ttl
+        if stale:
+            self.refresh()
+        self.fetched.wait(timeout)
+        with self.lock:
+            return list(self._models)
+
+model_catalog = ModelCatalog(ollama_client)
+
+def get_installed_models():
+    return model_catalog.models()
+
+def choose_model():
+    """Ask which installed model to use and make it the current one."""
+    global ollama_model
+    installed_models = get_installed_models()
+    if installed_models:
+        print("Available Ollama models:")
+        for idx, m in enumerate(installed_models, 1):
+            print(f"  {idx}: {m}")
+        while True:
+            choice = input(f"Select a model by number (or press Enter for default {DEFAULT_MODEL}): ").strip()
+            if not choice:
+                break
+            try:
+                idx = int(choice) - 1
+                if 0 <= idx < len(installed_models):
+                    ollama_model = installed_models[idx]
+                    break
+                print("Invalid selection. Please try again.")
+            except ValueError:
+                print("Invalid input. Please enter a number.")
+    else:
+        model_input = input(f"Enter Ollama model name (e.g., {DEFAULT_MODEL}): ").strip()
+        if model_input:
+            ollama_model = model_input
+
+    print(f"Using Ollama model: {ollama_model}\n")
+
+class ModelWarmer:
+    """Loads models into Ollama ahead of their first request.
+
+    warm_up() sends a generate request without a prompt, which makes Ollama
+    load the model and keep it for OLLAMA_KEEP_ALIVE, on a background thread.
+    A model already being loaded is not requested twice; status() reports
+    how long each load took.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.loading = set()
+        self.loaded = {}  # model -> seconds the last warm-up took
+
+    def warm_up(self, model):
+        if not MODEL_WARMUP or not model:
+            return
+        with self.lock:
+            if model in self.loading:
+                return
+            self.loading.add(model)
+        threading.Thread(target=self._load, args=(model,), daemon=True).start()
+
+    def _load(self, model):
+        started = time.monotonic()
+        try:
+            if not health_monitor.is_available("Ollama"):
+                return
+            response = self.client.post("/api/generate", json={"model": model, "keep_alive": OLLAMA_KEEP_ALIVE},
+                                        timeout=120)
+            response.raise_for_status()
+            seconds = time.monotonic() - started
+            with self.lock:
+                self.loaded[model] = seconds
+            log_event(logging.INFO, "Model loaded", model=model, seconds=round(seconds, 3))
+        except Exception as e:
+            logging.error(f"Error warming up model {model}: {e}")
+        finally:
+            with self.lock:
+                self.loading.discard(model)
+
+    def status(self, model):
+        with self.lock:
+            if model in self.loading:
+                return "loading"
+            if model in self.loaded:
+                return f"loaded in {self.loaded[model]:.1f}s"
+        return "not loaded yet"
+
+model_warmer = ModelWarmer(ollama_client)
+
+class ModelRegistry:
+    """The models one session sends its requests to.
+
+    active is the model picked at startup or with /change; routes maps a
+    kind of request ("narration", "summary", "compaction") to a model of its
+    own, falling back to active. Every call looks the model up, so a change
+    applies to the session's next request.
+    """
+
+    def __init__(self, active=None, routes=None):
+        self.active = active or ollama_model
+        self.routes = dict(MODEL_ROUTES if routes is None else routes)
+
+    def model_for(self, kind="narration"):
+        return self.routes.get(kind) or self.active
+
+    def select(self, model, kind=None):
+        """Make model the active one, or route one kind of request to it, and load it."""
+        if kind:
+            self.routes[kind] = model
+        else:
+            self.active = model
+        log_event(logging.INFO, "Model selected", model=model, kind=kind or "active")
+        model_warmer.warm_up(model)
+
+    def warm_up(self):
+        for model in self.models():
+            model_warmer.warm_up(model)
+
+    def models(self):
+        """Distinct models in use, the active one first."""
+        return list(dict.fromkeys([self.active] + [model for model in self.routes.values() if model]))
+
+    def report(self):
+        lines = [f"Model: {self.active} ({model_warmer.status(self.active)})"]
+        for kind, model in self.routes.items():
+            if model and model != self.active:
+                lines.append(f"  {kind}: {model} ({model_warmer.status(model)})")
+        return lines
 
 def count_subarrays(arr, k):
     n = len(arr)
@@ -57,32 +696,6 @@ def count_subarrays(arr, k):
 
     return total
 
-installed_models = get_installed_models()
-ollama_model = "llama3:instruct"  # Default model
-
-if installed_models:
-    print("Available Ollama models:")
-    for idx, m in enumerate(installed_models, 1):
-        print(f"  {idx}: {m}")
-    while True:
-        choice = input("Select a model by number (or press Enter for default llama3:instruct): ").strip()
-        if not choice:
-            break
-        try:
-            idx = int(choice) - 1
-            if 0 <= idx < len(installed_models):
-                ollama_model = installed_models[idx]
-                break
-            print("Invalid selection. Please try again.")
-        except ValueError:
-            print("Invalid input. Please enter a number.")
-else:
-    model_input = input("Enter Ollama model name (e.g., llama3:instruct): ").strip()
-    if model_input:
-        ollama_model = model_input
-
-print(f"Using Ollama model: {ollama_model}\n")
-
 CURRENCY_MAP = {
     "Fantasy": "gold",
     "Sci-Fi": "credits",
@@ -920,179 +1533,1293 @@ def get_current_state(player_choices, genre):
     
     return "\n".join(state)
 
-def get_ai_response(prompt, model=ollama_model):
-    try:
+class OrderedSet:
+    """Names in the order they were added, with O(1) membership tests."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items=()):
+        self.items = dict.fromkeys(items)
+
+    def add(self, item):
+        self.items[item] = None
+
+    def discard(self, item):
+        self.items.pop(item, None)
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return f"OrderedSet({list(self.items)})"
+
+class WorldState:
+    """What the party has done to the world, tracked for the DM prompt.
+
+    Name lists are OrderedSets, world events and consequences are ring
+    buffers, and objects beyond object_retention are evicted least recently
+    changed first. Code that changes a section calls changed() with its name;
+    render() then rebuilds only those blocks of the get_current_state text.
+    """
+
+    __slots__ = (
+        "currency", "allies", "enemies", "discoveries", "reputation", "resources",
+        "factions", "completed_quests", "active_quests", "world_events",
+        "consequences", "objects", "object_retention", "dirty", "blocks", "genre",
+        "rendered"
+    )
+
+    # Blocks of get_current_state in order, each named after its section
+    BLOCKS = (
+        "currency", "allies", "enemies", "reputation", "active_quests",
+        "completed_quests", "resources", "factions", "world_events",
+        "consequences", "objects"
+    )
+    # Blocks that grow without bound. A size-capped rendering shows only their
+    # newest entries, objects getting any room factions and resources leave;
+    # it also shortens each consequence to STATE_CONSEQUENCE_CHARS
+    TRIMMABLE = ("objects", "resources", "factions")
+    HEADINGS = {"resources": "Resources:", "factions": "Faction Relationships:", "objects": "Object States:"}
+    LISTED = {
+        "allies": "Allies", "enemies": "Enemies",
+        "active_quests": "Active Quests", "completed_quests": "Completed Quests",
+    }
+
+    def __init__(self, world_event_retention=WORLD_EVENT_RETENTION, consequence_retention=CONSEQUENCE_RETENTION,
+                 object_retention=OBJECT_RETENTION):
+        self.currency = {}
+        self.allies = OrderedSet()
+        self.enemies = OrderedSet()
+        self.discoveries = OrderedSet()
+        self.reputation = 0
+        self.resources = {}
+        self.factions = defaultdict(int)
+        self.completed_quests = OrderedSet()
+        self.active_quests = OrderedSet()
+        self.world_events = deque(maxlen=world_event_retention)
+        self.consequences = deque(maxlen=consequence_retention)
+        self.objects = {}
+        self.object_retention = object_retention
+        self.dirty = set(self.BLOCKS)
+        self.blocks = {}
+        self.genre = None
+        self.rendered = {}
+
+    def changed(self, *sections):
+        self.dirty.update(sections)
+
+    def set_object(self, name, status):
+        # Re-inserting moves the object to the newest end, so eviction always
+        # drops the one the story has left alone the longest
+        self.objects.pop(name, None)
+        self.objects[name] = status
+        if self.object_retention is not None and len(self.objects) > self.object_retention:
+            del self.objects[next(iter(self.objects))]
+        self.changed("objects")
+
+    def to_dict(self):
+        """The plain player_choices layout used in saves."""
+        return {
+            "currency": dict(self.currency),
+            "allies": list(self.allies),
+            "enemies": list(self.enemies),
+            "discoveries": list(self.discoveries),
+            "reputation": self.reputation,
+            "resources": dict(self.resources),
+            "factions": dict(self.factions),
+            "completed_quests": list(self.completed_quests),
+            "active_quests": list(self.active_quests),
+            "world_events": list(self.world_events),
+            "consequences": list(self.consequences),
+            "objects": dict(self.objects),
+        }
+
+    @classmethod
+    def from_dict(cls, data, **retention):
+        state = cls(**retention)
+        state.currency = dict(data.get("currency", {}))
+        state.allies = OrderedSet(data.get("allies", []))
+        state.enemies = OrderedSet(data.get("enemies", []))
+        state.discoveries = OrderedSet(data.get("discoveries", []))
+        state.reputation = data.get("reputation", 0)
+        state.resources = dict(data.get("resources", {}))
+        state.factions = defaultdict(int, data.get("factions", {}))
+        state.completed_quests = OrderedSet(data.get("completed_quests", []))
+        state.active_quests = OrderedSet(data.get("active_quests", []))
+        state.world_events.extend(data.get("world_events", []))
+        state.consequences.extend(data.get("consequences", []))
+        for name, status in data.get("objects", {}).items():
+            state.set_object(name, status)
+        state.dirty = set(cls.BLOCKS)
+        return state
+
+    def render(self, genre, max_chars=None):
+        """The get_current_state text, cut down to max_chars if given."""
+        if genre != self.genre:
+            self.genre = genre
+            self.dirty.add("currency")
+        if self.dirty:
+            for key in self.dirty:
+                self.blocks.pop(key, None)
+            self.dirty.clear()
+            self.rendered = {}
+        text = self.rendered.get(max_chars)
+        if text is None:
+            text = self._join(max_chars)
+            self.rendered[max_chars] = text
+        return text
+
+    def _block(self, key):
+        lines = self.blocks.get(key)
+        if lines is None:
+            lines = self.blocks[key] = self._render_block(key)
+        return lines
+
+    def _render_block(self, key):
+        value = getattr(self, key)
+        if key == "currency":
+            lines = [f"Currency ({CURRENCY_MAP.get(self.genre, 'currency')}):"]
+            lines.extend(f"  - {player}: {amount}" for player, amount in value.items())
+            return lines
+        if key in self.LISTED:
+            return [f"{self.LISTED[key]}: {', '.join(value) if value else 'None'}"]
+        if key == "reputation":
+            return [f"Reputation: {value}"]
+        if not value:
+            return []
+        if key == "world_events":
+            return ["Recent World Events:"] + [f"  - {event}" for event in list(value)[-3:]]
+        if key == "consequences":
+            return ["Recent Consequences:"] + [f"  - {cons}" for cons in list(value)[-3:]]
+        return [self.HEADINGS[key]] + [self._item_line(key, name, item) for name, item in value.items()]
+
+    @staticmethod
+    def _item_line(key, name, value):
+        if key == "factions":
+            return f"  - {name}: {'+' if value > 0 else ''}{value}"
+        return f"  - {name}: {value}"
+
+    def _tail(self, key, budget):
+        """The heading and as many of the newest entries of a growing block as
+        fit in budget characters, walking back from the newest so the cost
+        does not depend on how large the block has grown."""
+        value = getattr(self, key)
+        if not value:
+            return []
+        heading = self.HEADINGS[key]
+        used = len(heading) + 1
+        lines = []
+        for name, item in reversed(value.items()):
+            line = self._item_line(key, name, item)
+            if used + len(line) + 1 > budget:
+                break
+            lines.append(line)
+            used += len(line) + 1
+        else:
+            lines.reverse()
+            return [heading] + lines
+        note = f"  - ({len(value) - len(lines)} older entries not shown)"
+        while lines and used + len(note) + 1 > budget:
+            used -= len(lines.pop()) + 1
+            note = f"  - ({len(value) - len(lines)} older entries not shown)"
+        if used + len(note) + 1 > budget:
+            # No room for even one entry: leave the block out
+            return []
+        lines.reverse()
+        return [heading, note] + lines
+
+    @staticmethod
+    def _shorten(line, limit):
+        if len(line) <= limit:
+            return line
+        return line[:limit - 3].rsplit(" ", 1)[0] + "..."
+
+    def _join(self, max_chars):
+        header = "### Current World State ###"
+        if max_chars is None:
+            blocks = {key: self._block(key) for key in self.BLOCKS}
+        else:
+            blocks = {key: self._block(key) for key in self.BLOCKS if key not in self.TRIMMABLE}
+            blocks["consequences"] = [self._shorten(line, STATE_CONSEQUENCE_CHARS) for line in blocks["consequences"]]
+            budget = max_chars - len(header) - sum(len(line) + 1 for lines in blocks.values() for line in lines)
+            # Split the room left between the growing blocks; room one of
+            # them does not need passes on to the next
+            for remaining, key in enumerate(reversed(self.TRIMMABLE)):
+                share = budget // (len(self.TRIMMABLE) - remaining)
+                blocks[key] = self._tail(key, share)
+                budget -= sum(len(line) + 1 for line in blocks[key])
+        lines = [header]
+        for key in self.BLOCKS:
+            lines.extend(blocks[key])
+        text = "\n".join(lines)
+        if max_chars is None or len(text) <= max_chars:
+            return text
+        # The fixed blocks alone are over the cap: drop whole lines from the end
+        return text[:max(text.rfind("\n", 0, max_chars + 1), 0)]
+
+def state_prompt(player_choices, genre):
+    """World-state text for a DM prompt, from the render cache and size-capped
+    when player_choices is a WorldState."""
+    if isinstance(player_choices, WorldState):
+        return player_choices.render(genre, STATE_PROMPT_MAX_CHARS)
+    return get_current_state(player_choices, genre)
+
+class LLMScheduler:
+    """Admission control for Ollama requests shared by every session in the process.
+
+    At most max_in_flight generations run at once. Waiting requests are served
+    by priority, and within a priority level round-robin across sessions (the
+    session served least recently goes first), so a busy table cannot starve
+    the others. A thread picks its session with `with llm_scheduler.session(...)`;
+    requests made outside of one are queued under "default".
+    """
+
+    def __init__(self, max_in_flight=LLM_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.cond = threading.Condition()
+        self.local = threading.local()
+        self.in_flight = 0
+        self.waiting = []
+        self.tickets = itertools.count()
+        self.last_served = {}
+        self.stats = defaultdict(lambda: {"requests": 0, "wait": 0.0})
+
+    @contextlib.contextmanager
+    def session(self, session_id, priority=0):
+        previous = getattr(self.local, "session", None)
+        self.local.session = (session_id, priority)
         try:
-            health_check = requests.get("http://localhost:11434/", timeout=5)
-            if health_check.status_code != 200:
-                logging.error("Ollama service not running or inaccessible")
-                print("Error: Could not connect to Ollama. Make sure it's running.")
-                return ""
-        except requests.exceptions.ConnectionError:
+            yield
+        finally:
+            self.local.session = previous
+
+    @contextlib.contextmanager
+    def slot(self):
+        session_id, priority = getattr(self.local, "session", None) or ("default", 0)
+        ticket = (next(self.tickets), session_id, priority)
+        queued_at = time.monotonic()
+        with self.cond:
+            self.waiting.append(ticket)
+            while not self._grant(ticket):
+                self.cond.wait()
+            if self.waiting and self.in_flight < self.max_in_flight:
+                # Several slots came free at once and a waiter that was not
+                # next went back to sleep: wake them to take the one left
+                self.cond.notify_all()
+            stats = self.stats[session_id]
+            stats["requests"] += 1
+            stats["wait"] += time.monotonic() - queued_at
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.in_flight -= 1
+                self.cond.notify_all()
+
+    def _grant(self, ticket):
+        # Called with the lock held: is `ticket` the next request to run?
+        if self.in_flight >= self.max_in_flight:
+            return False
+        best = min(self.waiting, key=lambda t: (-t[2], self.last_served.get(t[1], -1), t[0]))
+        if best is not ticket:
+            return False
+        self.waiting.remove(ticket)
+        self.last_served[ticket[1]] = ticket[0]
+        self.in_flight += 1
+        return True
+
+    def report(self):
+        with self.cond:
+            lines = [f"LLM scheduler: {self.in_flight}/{self.max_in_flight} in flight, {len(self.waiting)} waiting"]
+            for session_id, stats in self.stats.items():
+                average = stats["wait"] / stats["requests"] if stats["requests"] else 0
+                lines.append(f"  {session_id}: {stats['requests']} requests, average wait {average * 1000:.0f} ms")
+        return lines
+
+llm_scheduler = LLMScheduler()
+
+# Counters from the last finished Ollama generation (prompt_eval_count is the
+# number of prompt tokens that were not served from the KV cache)
+last_generation_stats = {}
+
+GENERATION_STATS_KEYS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration",
+                         "total_duration", "load_duration")
+
+def record_generation_stats(json_resp):
+    last_generation_stats.clear()
+    for key in GENERATION_STATS_KEYS:
+        if key in json_resp:
+            last_generation_stats[key] = json_resp[key]
+    log_event(logging.DEBUG, "Ollama generation", model=json_resp.get("model"), **last_generation_stats)
+    # Ollama reports durations in nanoseconds
+    for key, stage in (("load_duration", "ollama.load"), ("prompt_eval_duration", "ollama.prompt_eval"),
+                       ("eval_duration", "ollama.eval")):
+        if json_resp.get(key):
+            perf.add(stage, json_resp[key] / 1e9)
+
+class Generation:
+    """Handle on a generation that another thread may cancel. While one is set
+    in current_generation, get_ai_response streams the reply and gives up as
+    soon as cancel() is called: a request still waiting for a scheduler slot
+    is never sent, and one under way has its stream closed, freeing its slot."""
+
+    def __init__(self):
+        self.cancelled = False
+        self.response = None
+
+    def cancel(self):
+        self.cancelled = True
+        response = self.response
+        if response is not None:
+            response.close()
+
+current_generation = contextvars.ContextVar("current_generation", default=None)
+
+def get_ai_response(prompt, model=None, on_token=None):
+    # Sessions pass their own model (see ModelRegistry); the default is looked
+    # up per call rather than bound when the function is defined
+    model = model or ollama_model
+    generation = current_generation.get()
+    try:
+        with perf.span("health_check"):
+            available = health_monitor.is_available("Ollama")
+        if not available:
             logging.error("Ollama service not running or inaccessible")
             print("Error: Could not connect to Ollama. Make sure it's running.")
             return ""
         
-        response = requests.post(
-            OLLAMA_API_URL,
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "num_predict": 250,
-                    "stop": ["\n\n"],
-                    "min_p": 0.05,
-                    "top_k": 40
-                }
-            },
-            timeout=60
-        )
-        response.raise_for_status()
-        json_resp = response.json()
-        return json_resp.get("response", "").strip()
-    except requests.exceptions.ConnectionError as e:
-        logging.error(f"Connection error: {e}")
-        print("Error: Could not connect to Ollama. Make sure it's running.")
-        return ""
-    except requests.exceptions.RequestException as e:
-        logging.error(f"HTTP error: {e}")
-        return ""
+        streaming = on_token is not None or generation is not None
+        queued = time.perf_counter()
+        with llm_scheduler.slot():
+            perf.add("llm.queue_wait", time.perf_counter() - queued)
+            if generation is not None and generation.cancelled:
+                return ""
+            with perf.span("ollama.request"):
+                return _generate(prompt, model, on_token, streaming, generation)
     except Exception as e:
-        logging.error(f"Unexpected error in get_ai_response: {e}")
+        if generation is not None and generation.cancelled:
+            # Closing the stream from another thread fails the read in this one
+            return ""
+        if isinstance(e, requests.exceptions.ConnectionError):
+            logging.error(f"Connection error: {e}")
+            health_monitor.mark_down("Ollama", "ConnectionError")
+            print("Error: Could not connect to Ollama. Make sure it's running.")
+        elif isinstance(e, requests.exceptions.RequestException):
+            logging.error(f"HTTP error: {e}")
+        else:
+            logging.error(f"Unexpected error in get_ai_response: {e}")
         return ""
 
-def speak(text, voice="FemaleBritishAccent_WhyLucyWhy_Voice_2.wav"):
-    try:
-        if not text.strip():
+def _generate(prompt, model, on_token, streaming, generation=None):
+    started = time.perf_counter()
+    response = ollama_client.post(
+        "/api/generate",
+        json={
+            "model": model,
+            "prompt": prompt,
+            "stream": streaming,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": 250,
+                "stop": ["\n\n"],
+                "min_p": 0.05,
+                "top_k": 40
+            }
+        },
+        timeout=60,
+        stream=streaming
+    )
+    if generation is not None:
+        generation.response = response
+        if generation.cancelled:
+            response.close()
+            return ""
+    response.raise_for_status()
+    if not streaming:
+        json_resp = response.json()
+        record_generation_stats(json_resp)
+        return json_resp.get("response", "").strip()
+
+    # Ollama streams one JSON object per line until "done" is true. A reply
+    # cut short by an error is dropped, as the non-streaming path drops it
+    chunks = []
+    with response:
+        for line in response.iter_lines():
+            if generation is not None and generation.cancelled:
+                return ""
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                logging.error(f"Ollama stream error: {chunk['error']}")
+                return ""
+            token = chunk.get("response", "")
+            if token:
+                if on_token is not None:
+                    if not chunks:
+                        perf.add("ollama.first_token", time.perf_counter() - started)
+                    on_token(token)
+                chunks.append(token)
+            if chunk.get("done"):
+                record_generation_stats(chunk)
+                return "".join(chunks).strip()
+    logging.error("Ollama stream ended before the reply was done")
+    return ""
+
+DEFAULT_VOICE = "FemaleBritishAccent_WhyLucyWhy_Voice_2.wav"
+
+# AllTalk settings that change the audio, part of every TTS cache key
+TTS_SETTINGS = {
+    "narrator_enabled": "true",
+    "narrator_voice_gen": "narrator.wav",
+    "text_filtering": "none",
+}
+
+class TTSCache:
+    """Synthesized clips on disk, one file per sha256 of (text, voice,
+    TTS_SETTINGS, sample rate), so narration heard before plays without
+    asking AllTalk. Reading a clip marks it recently used (file mtime); once
+    the files pass max_bytes the least recently used are deleted. The
+    directory is scanned on first use."""
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._sizes = None
+        self._total = 0
+
+    @staticmethod
+    def key(text, voice, samplerate=AUDIO_SAMPLE_RATE):
+        data = json.dumps([text, voice, TTS_SETTINGS, TTS_STREAMING, samplerate], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _load(self):
+        # Oldest first, so eviction can walk the dict from the front
+        if self._sizes is not None:
             return
+        files = []
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".wav"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name[:-len(".wav")], stat.st_size))
+        files.sort()
+        self._sizes = {key: size for _, key, size in files}
+        self._total = sum(self._sizes.values())
+        self._evict()
 
-        payload = {
-            "text_input": text,
-            "character_voice_gen": voice,
-            "narrator_enabled": "true",
-            "narrator_voice_gen": "narrator.wav",
-            "text_filtering": "none",
-            "output_file_name": "output",
-            "autoplay": "true",
-            "autoplay_volume": "0.8"
-        }
-        response = requests.post(ALLTALK_API_URL, data=payload, timeout=20)
-        response.raise_for_status()
+    def get(self, key):
+        with self.lock:
+            self._load()
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except OSError as e:
+                logging.error(f"Error reading cached narration {key}: {e}")
+                self._total -= self._sizes.pop(key)
+                self.misses += 1
+                return None
+            self._sizes[key] = self._sizes.pop(key)
+            self.hits += 1
+            return data
 
-        if response.headers.get("Content-Type", "").startswith("audio/"):
-            audio_data = np.frombuffer(response.content, dtype=np.int16)
-            sd.play(audio_data, samplerate=22050)
-            sd.wait()
-        else:
-            logging.error(f"Unexpected response content type: {response.headers.get('Content-Type')}")
-    except Exception as e:
-        logging.error(f"Error in speech generation: {e}")
+    def put(self, key, data):
+        with self.lock:
+            self._load()
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = self._path(key) + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logging.error(f"Error caching narration {key}: {e}")
+                return
+            self._total += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            self._evict()
 
-def show_help():
-    print("""
-Available commands:
-/? or /help       - Show this help message
-/redo             - Repeat last AI response with a new generation
-/save             - Save the full adventure to adventure.txt
-/load             - Load the adventure from adventure.txt
-/change           - Switch to a different Ollama model
-/count            - Calculate subarrays with at most k distinct elements
-/exit             - Exit the game
-/consequences     - Show recent consequences of your actions
-/state            - Show current world state
-/players          - Show current party members
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            oldest = next(iter(self._sizes))
+            self._total -= self._sizes.pop(oldest)
+            try:
+                os.remove(self._path(oldest))
+            except OSError as e:
+                logging.error(f"Error evicting cached narration {oldest}: {e}")
 
-Story Adaptation:
-Every action you take will permanently change the story:
-  - Killing characters removes them permanently
-  - Stealing items adds them to your inventory
-  - Choices affect NPC attitudes and world events
-  - Environments change based on your actions
-  - Resources are permanently gained or lost
-  - Objects can be permanently destroyed or altered
-  - You can attempt ANY action, no matter how unconventional
-  - The story adapts dynamically to your choices
-""")
+    def report(self):
+        with self.lock:
+            self._load()
+            lookups = self.hits + self.misses
+            rate = f"{self.hits / lookups:.0%}" if lookups else "n/a"
+            return (f"TTS cache: {len(self._sizes)} clips, {self._total / 1e6:.1f} of {self.max_bytes / 1e6:.0f} MB, "
+                    f"{self.hits} hits, {self.misses} misses (hit rate {rate})")
 
-def remove_last_ai_response(conversation):
-    pos = conversation.rfind("Dungeon Master:")
-    if pos == -1:
-        return conversation
+tts_cache = TTSCache() if TTS_CACHE_MAX_BYTES else None
 
-    return conversation[:pos].strip()
+WavFormat = namedtuple("WavFormat", "samplerate channels bits floating")
 
-def sanitize_response(response):
-    if not response:
-        return "The story continues..."
-
-    question_phrases = [
-        r"what will you do", r"how do you respond", r"what do you do",
-        r"what is your next move", r"what would you like to do",
-        r"what would you like to say", r"how will you proceed",
-        r"do you:", r"choose one", r"select an option", r"pick one"
-    ]
+def parse_wav_header(data):
+    """(WavFormat, offset of the samples, size of the samples) from the start
+    of a RIFF/WAVE file, or None if data does not reach the samples yet. The
+    size is None when the header leaves it open, as streamed WAVs do."""
+    view = memoryview(data)
+    if len(view) < 12:
+        return None
+    if bytes(view[:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+    wav_format = None
+    offset = 12
+    while len(view) >= offset + 8:
+        chunk_id = bytes(view[offset:offset + 4])
+        size = struct.unpack_from("<I", view, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"data":
+            if wav_format is None:
+                raise ValueError("WAV samples before the fmt chunk")
+            return wav_format, body, None if size in (0, 0xFFFFFFFF) else size
+        if len(view) < body + size:
+            return None
+        if chunk_id == b"fmt ":
+            audio_format, channels, samplerate = struct.unpack_from("<HHI", view, body)
+            bits = struct.unpack_from("<H", view, body + 14)[0]
+            if audio_format == 0xFFFE and size >= 26:
+                # WAVE_FORMAT_EXTENSIBLE: the real format is in the subformat GUID
+                audio_format = struct.unpack_from("<H", view, body + 24)[0]
+            if audio_format not in (1, 3) or bits not in (8, 16, 32) or audio_format == 3 and bits != 32:
+                raise ValueError(f"unsupported WAV format {audio_format} with {bits}-bit samples")
+            wav_format = WavFormat(samplerate, channels, bits, audio_format == 3)
+        offset = body + size + (size & 1)
+    return None
 
-    for phrase in question_phrases:
-        pattern = re.compile(rf'{phrase}.*?$', re.IGNORECASE)
-        response = pattern.sub('', response)
+def wav_samples(wav_format, buffer):
+    """Whole frames of buffer as int16 samples shaped (frames, channels).
+    16-bit PCM, what AllTalk sends, is a view of buffer rather than a copy."""
+    if wav_format.bits == 16:
+        samples = np.frombuffer(buffer, dtype="<i2")
+    elif wav_format.floating:
+        samples = (np.clip(np.frombuffer(buffer, dtype="<f4"), -1.0, 1.0) * 32767).astype(np.int16)
+    elif wav_format.bits == 8:
+        samples = ((np.frombuffer(buffer, dtype=np.uint8).astype(np.int16) - 128) << 8)
+    else:
+        samples = (np.frombuffer(buffer, dtype="<i4") >> 16).astype(np.int16)
+    return samples.reshape(-1, wav_format.channels)
 
-    structure_phrases = [
-        r"a\)", r"b\)", r"c\)", r"d\)", r"e\)", r"option [a-e]:",
-        r"immediate consequence:", r"new situation:", r"next challenges:",
-        r"choices:", r"options:"
-    ]
-    for phrase in structure_phrases:
-        pattern = re.compile(phrase, re.IGNORECASE)
-        response = pattern.sub('', response)
-
-    player_action_patterns = [
-        r"you (?:try to|attempt to|begin to|start to|decide to) .+?\.", 
-        r"you (?:successfully|carefully|quickly) .+?\.", 
-        r"you (?:manage to|fail to) .+?\."
-    ]
-    
-    for pattern in player_action_patterns:
-        response = re.sub(pattern, '', response, flags=re.IGNORECASE)
-
-    response = re.sub(
-        r'(?:\n|\. )?[A-Ea-e]\)[^\.\?\!\n]*(\n|\. |$)', 
-        '', 
-        response,
-        flags=re.IGNORECASE
-    )
-    
-    response = re.sub(
-        r'(?:something else|other) \(.*?\)', 
-        '', 
-        response, 
-        flags=re.IGNORECASE
-    )
+class WavDecoder:
+    """Decodes a WAV file fed in pieces as it downloads.
 
-    response = re.sub(r'\s{2,}', ' ', response).strip()
+    feed() returns the samples completed by each piece (None until the header
+    is in), keeping a partial frame for the next piece and ignoring anything
+    after the data chunk.
+    """
 
-    if response and response[-1] not in ('.', '!', '?', ':', ','):
-        response += '.'
-    
-    response = re.sub(r'\[[^\]]*State Tracking[^\]]*\]', '', response)
-    
-    return response
+    def __init__(self):
+        self.format = None
+        self.header = b""
+        self.remaining = None
+        self.partial = b""
 
-def validate_purchase(action, genre, player_choices, current_player):
-    currency_name = CURRENCY_MAP.get(genre, "currency")
-    pattern = r"buy (.+?) for (\d+) (" + re.escape(currency_name) + r")"
-    match = re.search(pattern, action, re.IGNORECASE)
-    
-    if match:
+    def feed(self, data):
+        if self.format is None:
+            self.header += data
+            parsed = parse_wav_header(self.header)
+            if parsed is None:
+                return None
+            self.format, offset, self.remaining = parsed
+            data = memoryview(self.header)[offset:]
+        data = memoryview(data)
+        if self.remaining is not None:
+            data = data[:self.remaining]
+            self.remaining -= len(data)
+        if self.partial:
+            data = memoryview(self.partial + bytes(data))
+        frame_size = self.format.channels * self.format.bits // 8
+        usable = len(data) - len(data) % frame_size
+        self.partial = bytes(data[usable:])
+        if not usable:
+            return None
+        return wav_samples(self.format, data[:usable])
+
+def decode_wav(data):
+    """(samples, sample rate) of a complete WAV file held in memory."""
+    decoder = WavDecoder()
+    samples = decoder.feed(data)
+    if decoder.format is None:
+        raise ValueError("truncated WAV header")
+    if samples is None:
+        samples = np.zeros((0, decoder.format.channels), dtype=np.int16)
+    return samples, decoder.format.samplerate
+
+def fetch_speech(text, voice, on_audio):
+    """Synthesize text, handing on_audio(samples, samplerate) the audio as it
+    is decoded: a cached clip at once, AllTalk's answer piece by piece while it
+    downloads. Returns whether there was any audio."""
+    try:
+        if not text.strip():
+            return False
+        key = None
+        if tts_cache is not None:
+            key = tts_cache.key(text, voice)
+            data = tts_cache.get(key)
+            if data is not None:
+                on_audio(*decode_wav(data))
+                log_event(logging.DEBUG, "Speech from cache", chars=len(text))
+                return True
+        if not health_monitor.is_available("AllTalk"):
+            return False
+
+        started = time.perf_counter()
+        if TTS_STREAMING:
+            params = {"text": text, "voice": voice, "language": "en", "output_file": "stream_output.wav"}
+            response = alltalk_client.get("/api/tts-generate-streaming", params=params, stream=True, timeout=20)
+        else:
+            payload = {
+                "text_input": text,
+                "character_voice_gen": voice,
+                **TTS_SETTINGS,
+                "output_file_name": "output",
+                "autoplay": "true",
+                "autoplay_volume": "0.8"
+            }
+            response = alltalk_client.post("/api/tts-generate", data=payload, stream=True, timeout=20)
+        with response:
+            response.raise_for_status()
+            if not response.headers.get("Content-Type", "").startswith("audio/"):
+                logging.error(f"Unexpected response content type: {response.headers.get('Content-Type')}")
+                return False
+            decoder = WavDecoder()
+            received = []
+            for chunk in response.iter_content(TTS_CHUNK_BYTES):
+                received.append(chunk)
+                samples = decoder.feed(chunk)
+                if samples is not None:
+                    on_audio(samples, decoder.format.samplerate)
+        if decoder.format is None:
+            logging.error("Error in speech generation: AllTalk sent no WAV header")
+            return False
+        log_event(logging.DEBUG, "Speech synthesized", chars=len(text), bytes=sum(len(chunk) for chunk in received),
+                  seconds=round(time.perf_counter() - started, 3))
+        if key is not None:
+            tts_cache.put(key, b"".join(received))
+        return True
+    except requests.exceptions.ConnectionError as e:
+        logging.error(f"Error in speech generation: {e}")
+        health_monitor.mark_down("AllTalk", "ConnectionError")
+    except Exception as e:
+        logging.error(f"Error in speech generation: {e}")
+    return False
+
+class NullOutputStream:
+    """Stands in for sounddevice.OutputStream when there is no audio output:
+    pulls blocks from the callback at the playback rate and discards them."""
+
+    def __init__(self, samplerate, blocksize, callback, channels=1):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.channels = channels
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        outdata = np.zeros((self.blocksize, self.channels), dtype=np.int16)
+        period = self.blocksize / self.samplerate
+        next_block = time.monotonic()
+        while not self.stopped.is_set():
+            self.callback(outdata, self.blocksize, None, None)
+            next_block += period
+            self.stopped.wait(max(0.0, next_block - time.monotonic()))
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        self.stop()
+
+class AudioEngine:
+    """Plays narration clips back to back on one persistent output stream.
+
+    play() only queues a clip. The stream's callback takes samples from the
+    queue a block at a time, running from the end of one clip straight into
+    the next, so clips join without gaps and the game never waits for audio.
+    The stream takes the format of the first clip; later clips are converted
+    only if their sample rate or channel count differs. A clip may be queued
+    in pieces as it downloads; pieces queued under the same clip id are
+    skipped together.
+    """
+
+    def __init__(self, samplerate=AUDIO_SAMPLE_RATE, device=AUDIO_DEVICE, blocksize=AUDIO_BLOCK_SIZE, volume=AUDIO_VOLUME,
+                 channels=1):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.device = device
+        self.blocksize = blocksize
+        self.volume = volume
+        self.clips = deque()  # (clip id, samples)
+        self.position = 0
+        self.clip_ids = itertools.count(1)
+        # The clip the callback is playing, and the last one skipped
+        self.current = None
+        self.skipped = None
+        self.lock = threading.Lock()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.stream = None
+        self.stream_lock = threading.Lock()
+
+    def start(self, samplerate=None, channels=None):
+        """Open the output stream, in the given format, if it is not open yet."""
+        with self.stream_lock:
+            if self.stream is not None:
+                return
+            self.samplerate = samplerate or self.samplerate
+            self.channels = channels or self.channels
+            if self.device != "null":
+                device = int(self.device) if str(self.device).isdigit() else self.device
+                try:
+                    # Imported on first use: loading PortAudio is slow, and without
+                    # sounddevice or a sound card narration plays into the null stream
+                    import sounddevice as sd
+                    stream = sd.OutputStream(samplerate=self.samplerate, blocksize=self.blocksize, device=device,
+                                             channels=self.channels, dtype="int16", callback=self._callback)
+                    stream.start()
+                    self.stream = stream
+                    return
+                except Exception as e:
+                    logging.error(f"Error opening audio output, narration audio is discarded: {e}")
+            self.stream = NullOutputStream(self.samplerate, self.blocksize, self._callback, self.channels)
+            self.stream.start()
+
+    def new_clip(self):
+        """An id to queue the pieces of one clip under."""
+        with self.lock:
+            return next(self.clip_ids)
+
+    def play(self, samples, samplerate=AUDIO_SAMPLE_RATE, clip=None):
+        """Queue int16 samples, shaped (frames,) or (frames, channels), after
+        whatever is already playing. Without a clip id they are a clip of
+        their own; pieces of a clip that was skipped are dropped."""
+        if samples.ndim == 1:
+            samples = samples.reshape(-1, 1)
+        self.start(samplerate, samples.shape[1])
+        samples = self.convert(samples, samplerate)
+        with self.lock:
+            if clip is None:
+                clip = next(self.clip_ids)
+            elif clip == self.skipped:
+                return
+            self.clips.append((clip, samples))
+            self.idle.clear()
+
+    def queued_seconds(self):
+        """Seconds of audio still to play: how long a clip queued now waits."""
+        with self.lock:
+            return (sum(len(samples) for _, samples in self.clips) - self.position) / self.samplerate
+
+    def convert(self, samples, samplerate):
+        """samples in the stream's format: the same array when it already
+        matches, otherwise mixed to its channel count and linearly resampled."""
+        if samples.shape[1] != self.channels:
+            mono = samples.mean(axis=1, keepdims=True) if samples.shape[1] > 1 else samples
+            samples = np.repeat(mono, self.channels, axis=1).astype(np.int16)
+        if samplerate != self.samplerate and len(samples):
+            frames = int(round(len(samples) * self.samplerate / samplerate))
+            positions = np.arange(frames) * (samplerate / self.samplerate)
+            original = np.arange(len(samples))
+            samples = np.stack([np.interp(positions, original, samples[:, channel])
+                                for channel in range(self.channels)], axis=1).astype(np.int16)
+        return samples
+
+    def _callback(self, outdata, frames, time_info, status):
+        filled = 0
+        with self.lock:
+            while filled < frames and self.clips:
+                self.current, clip = self.clips[0]
+                chunk = clip[self.position:self.position + frames - filled]
+                outdata[filled:filled + len(chunk)] = chunk
+                filled += len(chunk)
+                self.position += len(chunk)
+                if self.position >= len(clip):
+                    self.clips.popleft()
+                    self.position = 0
+            if not self.clips:
+                self.idle.set()
+            volume = self.volume
+        outdata[filled:] = 0
+        if filled and volume != 1.0:
+            np.multiply(outdata[:filled], volume, out=outdata[:filled], casting="unsafe")
+
+    def skip(self):
+        """Drop the clip that is playing, with any of its pieces still to
+        come; the next one starts right away."""
+        with self.lock:
+            self.skipped = self.clips[0][0] if self.clips else self.current
+            while self.clips and self.clips[0][0] == self.skipped:
+                self.clips.popleft()
+            self.position = 0
+            if not self.clips:
+                self.idle.set()
+
+    def stop(self):
+        """Drop every queued clip, including the one playing."""
+        with self.lock:
+            self.clips.clear()
+            self.position = 0
+            self.idle.set()
+
+    def set_volume(self, volume):
+        with self.lock:
+            self.volume = min(1.0, max(0.0, volume))
+
+    def wait(self, timeout=None):
+        """Block until the queue has played out; False on timeout."""
+        return self.idle.wait(timeout)
+
+    def close(self):
+        with self.stream_lock:
+            if self.stream is not None:
+                try:
+                    self.stream.stop()
+                    self.stream.close()
+                except Exception as e:
+                    logging.error(f"Error closing audio output: {e}")
+                self.stream = None
+
+audio_engine = AudioEngine()
+
+def play_audio(samples, samplerate=AUDIO_SAMPLE_RATE, clip=None):
+    try:
+        audio_engine.play(samples, samplerate, clip)
+    except Exception as e:
+        logging.error(f"Error in audio playback: {e}")
+
+def speak(text, voice=DEFAULT_VOICE):
+    if NARRATION_PIPELINE:
+        narrator.say(text)
+        return
+    with perf.span("tts.synthesis"):
+        fetch_speech(text, voice, functools.partial(play_audio, clip=audio_engine.new_clip()))
+
+class NarrationPipeline:
+    """Synthesizes and plays narration sentence by sentence in the background.
+
+    Text is cut into sentences as it arrives. A synthesis thread sends each
+    sentence to AllTalk and queues the finished clip on the audio engine, so
+    audio starts before the DM has finished generating and the game loop
+    never waits for it.
+    """
+
+    def __init__(self, voice=DEFAULT_VOICE, min_chars=40):
+        self.voice = voice
+        self.min_chars = min_chars
+        self.pending = ""
+        self.generation = 0
+        self.sentences = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._synthesis_worker, daemon=True)
+            self.thread.start()
+
+    def feed(self, text):
+        """Add streamed text; complete sentences are queued for synthesis."""
+        with self.lock:
+            self.pending += text
+            last = None
+            for last in SENTENCE_END_PATTERN.finditer(self.pending):
+                pass
+            if last is None or last.end() < self.min_chars:
+                return
+            ready, self.pending = self.pending[:last.end()], self.pending[last.end():]
+            self._enqueue(ready)
+
+    def flush(self):
+        """Queue whatever text is left over once a reply is complete."""
+        with self.lock:
+            ready, self.pending = self.pending, ""
+            self._enqueue(ready)
+
+    def say(self, text):
+        self.feed(text)
+        self.flush()
+
+    def cancel(self):
+        """Drop queued narration and stop the clip that is playing."""
+        with self.lock:
+            self.generation += 1
+            self.pending = ""
+        while True:
+            try:
+                self.sentences.get_nowait()
+            except queue.Empty:
+                break
+        audio_engine.stop()
+
+    def _enqueue(self, text):
+        text = text.strip()
+        if text:
+            self._start()
+            self.sentences.put((self.generation, text, log_ids.get()))
+
+    def _synthesis_worker(self):
+        while True:
+            generation, text, ids = self.sentences.get()
+            if generation != self.generation:
+                continue
+            if perf.enabled:
+                perf.add("playback.wait", audio_engine.queued_seconds())
+            with log_context(**ids), perf.span("tts.synthesis"):
+                fetch_speech(text, self.voice, functools.partial(self._play, generation, audio_engine.new_clip()))
+
+    def _play(self, generation, clip, samples, samplerate):
+        # Each piece is queued as it is decoded, so a streamed clip starts
+        # playing while the rest downloads; the sentence is one clip to /skip
+        audio_engine.start(samplerate, samples.shape[1] if samples.ndim > 1 else 1)
+        # Under the lock so a cancel() cannot slip in between the check and the queueing
+        with self.lock:
+            if generation == self.generation:
+                play_audio(samples, samplerate, clip)
+
+narrator = NarrationPipeline()
+
+def audio_command(text):
+    """Run /skip, /stop or /volume [0-100] and return the message to show."""
+    words = text.lower().split()
+    if words[0] == "/skip":
+        audio_engine.skip()
+        return "Skipped."
+    if words[0] == "/stop":
+        narrator.cancel()
+        return "Narration stopped."
+    if len(words) > 1:
+        try:
+            audio_engine.set_volume(int(words[1]) / 100)
+        except ValueError:
+            return "Usage: /volume [0-100]"
+    return f"Volume: {round(audio_engine.volume * 100)}%"
+
+def perf_command(text):
+    """Handle /perf and /perf reset; returns the text to show."""
+    if text.split()[1:] == ["reset"]:
+        perf.reset()
+        return "Performance timings cleared."
+    lines = perf.report()
+    if perf.enabled and perf.export_path:
+        lines.append(f"Each turn is also written to {perf.export_path}")
+    return "\n".join(lines)
+
+def show_help():
+    print("""
+Available commands:
+/? or /help       - Show this help message
+/redo             - Repeat last AI response with a new generation
+/save [slot]      - Save the adventure (to a new slot if named; turns are also autosaved)
+/load [slot]      - Load a saved adventure
+/saves            - List save slots
+/change           - Switch to a different Ollama model
+/change summary   - Use a different model for round summaries (or: compaction, narration)
+/count            - Calculate subarrays with at most k distinct elements
+/exit             - Exit the game
+/consequences     - Show recent consequences of your actions
+/state            - Show current world state
+/players          - Show current party members
+/status           - Show the models in use and Ollama/AllTalk availability and latency
+/skip             - Skip the narration clip that is playing
+/stop             - Stop all queued narration
+/volume [0-100]   - Show or set the narration volume
+/cache            - Show narration cache size and hit rate
+/perf [reset]     - Show how long each stage of a turn takes (or clear the timings)
+
+Story Adaptation:
+Every action you take will permanently change the story:
+  - Killing characters removes them permanently
+  - Stealing items adds them to your inventory
+  - Choices affect NPC attitudes and world events
+  - Environments change based on your actions
+  - Resources are permanently gained or lost
+  - Objects can be permanently destroyed or altered
+  - You can attempt ANY action, no matter how unconventional
+  - The story adapts dynamically to your choices
+""")
+
+def remove_last_ai_response(conversation):
+    pos = conversation.rfind("Dungeon Master:")
+    if pos == -1:
+        return conversation
+
+    return conversation[:pos].strip()
+
+# Case folding that maps every character re.IGNORECASE treats as an ASCII
+# letter onto that letter, so a plain substring test on the folded text is a
+# safe pre-check for a case-insensitive regex made of literal words
+_TRIGGER_FOLD = str.maketrans({
+    **{c: c.lower() for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"},
+    "\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"
+})
+
+class ResponseSanitizer:
+    """Strips player-facing prompts, option lists and narrated player actions
+    from a DM reply.
+
+    Rules are compiled once and applied in order, exactly like a chain of
+    re.sub calls. Each rule may carry trigger words; the reply is folded once
+    and a rule only scans it when one of its triggers is present, so most
+    replies only pay for the few rules that can actually match. House filters
+    can be appended with add_rule and run after the built-in ones.
+    """
+
+    QUESTION_PHRASES = [
+        "what will you do", "how do you respond", "what do you do",
+        "what is your next move", "what would you like to do",
+        "what would you like to say", "how will you proceed",
+        "do you:", "choose one", "select an option", "pick one"
+    ]
+    STRUCTURE_PHRASES = [
+        "a)", "b)", "c)", "d)", "e)", "option [a-e]:",
+        "immediate consequence:", "new situation:", "next challenges:",
+        "choices:", "options:"
+    ]
+    WHITESPACE_PATTERN = re.compile(r'\s{2,}')
+    STATE_TRACKING_PATTERN = re.compile(r'\[[^\]]*State Tracking[^\]]*\]')
+
+    def __init__(self):
+        self.rules = []
+        for phrase in self.QUESTION_PHRASES:
+            self.add_rule(re.escape(phrase) + '.*?$', (phrase,))
+        for phrase in self.STRUCTURE_PHRASES:
+            if phrase.startswith("option ["):
+                self.add_rule(r"option [a-e]:", ("option ",))
+            else:
+                self.add_rule(re.escape(phrase), (phrase,))
+        self.add_rule(r"you (?:try to|attempt to|begin to|start to|decide to) .+?\.",
+                      ("you try to", "you attempt to", "you begin to", "you start to", "you decide to"))
+        self.add_rule(r"you (?:successfully|carefully|quickly) .+?\.",
+                      ("you successfully", "you carefully", "you quickly"))
+        self.add_rule(r"you (?:manage to|fail to) .+?\.", ("you manage to", "you fail to"))
+        self.add_rule(r'(?:\n|\. )?[A-Ea-e]\)[^\.\?\!\n]*(\n|\. |$)', ("a)", "b)", "c)", "d)", "e)"))
+        self.add_rule(r'(?:something else|other) \(.*?\)', ("something else (", "other ("))
+
+    def add_rule(self, pattern, triggers=None, replacement='', flags=re.IGNORECASE):
+        """Append a substitution. Triggers, if given, must be literal text of
+        which at least one appears in every match of the pattern."""
+        folded = bool(flags & re.IGNORECASE)
+        if triggers is not None:
+            triggers = tuple(t.translate(_TRIGGER_FOLD) if folded else t for t in triggers)
+        self.rules.append((re.compile(pattern, flags), replacement, triggers, folded))
+
+    def sanitize(self, response):
+        if not response:
+            return "The story continues..."
+
+        folded = response.translate(_TRIGGER_FOLD)
+        for pattern, replacement, triggers, use_folded in self.rules:
+            if triggers is not None:
+                text = folded if use_folded else response
+                if not any(trigger in text for trigger in triggers):
+                    continue
+            response, count = pattern.subn(replacement, response)
+            if count:
+                folded = response.translate(_TRIGGER_FOLD)
+
+        response = self.WHITESPACE_PATTERN.sub(' ', response).strip()
+
+        if response and response[-1] not in ('.', '!', '?', ':', ','):
+            response += '.'
+
+        if "State Tracking" in response:
+            response = self.STATE_TRACKING_PATTERN.sub('', response)
+
+        return response
+
+@functools.lru_cache(maxsize=None)
+def get_response_sanitizer():
+    # Compiled on first use rather than at import
+    return ResponseSanitizer()
+
+def sanitize_response(response):
+    return get_response_sanitizer().sanitize(response)
+
+class StreamingSanitizer:
+    """Runs sanitize_response over a streamed reply one sentence at a time.
+
+    Tokens are buffered until a sentence boundary; the completed sentences are
+    sanitized and only text that the final sanitize_response pass would keep
+    in the same place is released for display.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.emitted = ""
+        self.scanned = 0
+
+    def feed(self, token):
+        self.raw += token
+        boundary = None
+        for boundary in SENTENCE_END_PATTERN.finditer(self.raw, self.scanned):
+            pass
+        if boundary is None:
+            return ""
+        self.scanned = boundary.end()
+        # Hold back the last character: on a partial buffer it may be the
+        # full stop sanitize_response appends to unterminated text.
+        return self._advance(sanitize_response(self.raw[:self.scanned].strip())[:-1])
+
+    def finish(self):
+        """Return (final_text, remaining_display_text, consistent)."""
+        final = sanitize_response(self.raw.strip())
+        consistent = final.startswith(self.emitted)
+        remaining = final[len(self.emitted):] if consistent else final
+        self.emitted = final
+        return final, remaining, consistent
+
+    def _advance(self, text):
+        if not text.startswith(self.emitted):
+            return ""
+        delta = text[len(self.emitted):]
+        self.emitted = text
+        return delta
+
+SENTENCE_END_PATTERN = re.compile(r'[.!?]["\')\]]*\s+')
+
+def stream_reply(prompt, on_text, model=None):
+    """Stream a DM reply, passing sanitized text to on_text as sentences complete.
+
+    Returns (reply, consistent). reply is sanitize_response of the full text;
+    consistent is False if the final text does not continue what on_text was
+    given, in which case the caller should show reply again in full.
+    """
+    sanitizer = StreamingSanitizer()
+    # Sanitizing runs once per token: time it as one stage per reply
+    sanitizing = 0.0
+
+    def on_token(token):
+        nonlocal sanitizing
+        started = time.perf_counter()
+        text = sanitizer.feed(token)
+        sanitizing += time.perf_counter() - started
+        if text:
+            on_text(text)
+
+    raw = get_ai_response(prompt, model, on_token=on_token)
+    if not raw:
+        return "", True
+    started = time.perf_counter()
+    reply, remaining, consistent = sanitizer.finish()
+    perf.add("sanitize", sanitizing + time.perf_counter() - started)
+    if consistent and remaining:
+        on_text(remaining)
+    return reply, consistent
+
+def narrate(prompt, label="Dungeon Master", on_reply=None, model=None):
+    """Generate a sanitized DM reply, print it under the given label and speak it.
+
+    With STREAM_RESPONSES enabled the reply is printed while Ollama is still
+    generating, and with NARRATION_PIPELINE each finished sentence is sent to
+    TTS straight away; the returned text is always sanitize_response of the
+    full reply. on_reply gets the final text before it is spoken.
+    """
+    if not STREAM_RESPONSES:
+        reply = get_ai_response(prompt, model)
+        if reply:
+            with perf.span("sanitize"):
+                reply = sanitize_response(reply)
+            print(f"{label}: {reply}")
+            if on_reply:
+                on_reply(reply)
+            speak(reply)
+        return reply
+
+    started = False
+
+    def show(text):
+        nonlocal started
+        if not text:
+            return
+        if not started:
+            print(f"{label}: ", end="", flush=True)
+            started = True
+        print(text, end="", flush=True)
+        if NARRATION_PIPELINE:
+            narrator.feed(text)
+
+    reply, consistent = stream_reply(prompt, show, model)
+    if not reply:
+        if started:
+            # Text of a generation that failed part way: do not speak the rest of it
+            print()
+            if NARRATION_PIPELINE:
+                narrator.cancel()
+        return ""
+
+    if consistent:
+        print()
+        if on_reply:
+            on_reply(reply)
+        if NARRATION_PIPELINE:
+            narrator.flush()
+        else:
+            speak(reply)
+    else:
+        # A later sentence changed how earlier text sanitizes; show the final version
+        if started:
+            print()
+        print(f"{label}: {reply}")
+        if on_reply:
+            on_reply(reply)
+        if NARRATION_PIPELINE:
+            narrator.cancel()
+        speak(reply)
+    return reply
+
+def generate_reply(prompt, model=None):
+    """A sanitized DM reply generated without printing or speaking it."""
+    reply = get_ai_response(prompt, model)
+    return sanitize_response(reply) if reply else ""
+
+def present(text, label="Dungeon Master"):
+    """Print and speak DM text that was generated ahead of time."""
+    print(f"{label}: {text}")
+    speak(text)
+
+def validate_purchase(action, genre, player_choices, current_player):
+    currency_name = CURRENCY_MAP.get(genre, "currency")
+    pattern = r"buy (.+?) for (\d+) (" + re.escape(currency_name) + r")"
+    match = re.search(pattern, action, re.IGNORECASE)
+    
+    if match:
         item = match.group(1)
         amount = int(match.group(2))
         currency = match.group(3)
         
         # Check current player's currency
-        if current_player not in player_choices['currency']:
+        if current_player not in player_choices.currency:
             return False, f"You have no {currency_name}!"
-        if player_choices['currency'][current_player] < amount:
+        if player_choices.currency[current_player] < amount:
             return False, f"You don't have enough {currency_name} for that purchase!"
         return True, None
     
@@ -1125,286 +2852,1358 @@ def enforce_class_restrictions(action, player_class, genre):
     
     return True, None
 
+class WorldStateRules:
+    """The extraction patterns used by update_world_state, compiled once.
+
+    Each rule carries trigger words, at least one of which must appear in
+    the text for the pattern to match at all. A reply is folded once and
+    scanned with cheap substring tests; only rules whose triggers are present
+    run their regex, so a typical reply costs a handful of regex scans
+    instead of fifteen. Results are identical to running every rule.
+    """
+
+    def __init__(self, currency_name):
+        currency = re.escape(currency_name)
+        currency_trigger = (currency_name.translate(_TRIGGER_FOLD),)
+        self.rules = {}
+        self.add("ally", r'(\b[A-Z][a-z]+\b) (?:joins|helps|saves|allies with|becomes your ally|supports you)',
+                 ("joins", "helps", "saves", "allies with", "becomes your ally", "supports you"))
+        self.add("enemy", r'(\b[A-Z][a-z]+\b) (?:dies|killed|falls|perishes|becomes your enemy|turns against you|hates you)',
+                 ("dies", "killed", "falls", "perishes", "becomes your enemy", "turns against you", "hates you"))
+        self.add("resource_gain", r'(?:get|find|acquire|obtain|receive|gain|steal|take) (\d+) (\w+)',
+                 ("get", "find", "acquire", "obtain", "receive", "gain", "steal", "take"))
+        self.add("resource_loss", r'(?:lose|drop|spend|use|expend|give|donate|surrender) (\d+) (\w+)',
+                 ("lose", "drop", "spend", "use", "expend", "give", "donate", "surrender"))
+        self.add("currency_gain", r'(?:find|earn|receive|get|acquire|obtain|gain|steal|take) (\d+) ' + currency,
+                 currency_trigger)
+        self.add("currency_loss", r'(?:spend|pay|lose|drop|use|expend|give|donate|surrender) (\d+) ' + currency,
+                 currency_trigger)
+        # Improved pattern for multi-word locations
+        self.add("world_event", r'(?:The|A|An) ([A-Za-z\s]+) (?:is|has been|becomes) (destroyed|created|changed|revealed|altered|ruined|rebuilt)',
+                 ("destroyed", "created", "changed", "revealed", "altered", "ruined", "rebuilt"))
+        # Improved quest detection patterns
+        self.add("quest_completed", r'quest ["\']?(.*?)["\']? (?:is|has been)? completed', ("quest",))
+        self.add("quest_started", r'quest ["\']?(.*?)["\']? (?:is|has been)? (?:given|started)', ("quest",))
+        self.add("faction_gain", r'(?:The|Your) (\w+) faction (?:likes|respects|trusts|appreciates) you more', ("faction",))
+        self.add("faction_loss", r'(?:The|Your) (\w+) faction (?:dislikes|distrusts|hates|condemns) you more', ("faction",))
+        self.add("discovery", r'(?:discover|find|uncover|learn about|reveal) (?:a |an |the )?(.+?)\.',
+                 ("discover", "find", "uncover", "learn about", "reveal"))
+        # Improved patterns for multi-word objects
+        self.add("destroyed", r'(?:destroy|break|smash) (?:the |a |an )?([\w\s]+)', ("destroy", "break", "smash"))
+        self.add("taken", r'(?:take|steal|grab|pick up) (?:the |a |an )?([\w\s]+)', ("take", "steal", "grab", "pick up"))
+
+    def add(self, name, pattern, triggers):
+        self.rules[name] = (re.compile(pattern, re.IGNORECASE), triggers)
+
+    def scan(self, text):
+        return RuleScan(self.rules, text)
+
+class RuleScan:
+    """One text folded once, ready to be queried rule by rule."""
+
+    def __init__(self, rules, text):
+        self.rules = rules
+        self.text = text
+        self.folded = text.translate(_TRIGGER_FOLD)
+
+    def findall(self, name):
+        pattern, triggers = self.rules[name]
+        if not any(trigger in self.folded for trigger in triggers):
+            return []
+        return pattern.findall(self.text)
+
+    def search(self, name):
+        pattern, triggers = self.rules[name]
+        if not any(trigger in self.folded for trigger in triggers):
+            return None
+        return pattern.search(self.text)
+
+@functools.lru_cache(maxsize=None)
+def get_world_state_rules(currency_name):
+    return WorldStateRules(currency_name)
+
 def update_world_state(action, response, player_choices, genre, current_player):
     currency_name = CURRENCY_MAP.get(genre, "currency")
+    rules = get_world_state_rules(currency_name)
+    reply = rules.scan(response)
+    lowered = response.lower()
     
-    player_choices['consequences'].append(f"{current_player} '{action}': {response}")
+    player_choices.consequences.append(f"{current_player} '{action}': {response}")
+    player_choices.changed("consequences")
     
-    if len(player_choices['consequences']) > 5:
-        player_choices['consequences'] = player_choices['consequences'][-5:]
+    for ally in reply.findall("ally"):
+        if ally not in player_choices.allies:
+            player_choices.allies.add(ally)
+            player_choices.enemies.discard(ally)
+            player_choices.changed("allies", "enemies")
     
-    ally_matches = re.findall(
-        r'(\b[A-Z][a-z]+\b) (?:joins|helps|saves|allies with|becomes your ally|supports you)',
-        response, 
-        re.IGNORECASE
-    )
-    for ally in ally_matches:
-        if ally not in player_choices['allies']:
-            player_choices['allies'].append(ally)
-            if ally in player_choices['enemies']:
-                player_choices['enemies'].remove(ally)
+    for enemy in reply.findall("enemy"):
+        player_choices.enemies.add(enemy)
+        player_choices.allies.discard(enemy)
+        player_choices.changed("allies", "enemies")
     
-    enemy_matches = re.findall(
-        r'(\b[A-Z][a-z]+\b) (?:dies|killed|falls|perishes|becomes your enemy|turns against you|hates you)',
-        response, 
-        re.IGNORECASE
-    )
-    for enemy in enemy_matches:
-        if enemy not in player_choices['enemies']:
-            player_choices['enemies'].append(enemy)
-        if enemy in player_choices['allies']:
-            player_choices['allies'].remove(enemy)
-    
-    resource_matches = re.findall(
-        r'(?:get|find|acquire|obtain|receive|gain|steal|take) (\d+) (\w+)',
-        response, 
-        re.IGNORECASE
-    )
-    for amount, resource in resource_matches:
+    for amount, resource in reply.findall("resource_gain"):
         resource = resource.lower()
-        player_choices['resources'].setdefault(resource, 0)
-        player_choices['resources'][resource] += int(amount)
+        player_choices.resources.setdefault(resource, 0)
+        player_choices.resources[resource] += int(amount)
+        player_choices.changed("resources")
     
-    lost_matches = re.findall(
-        r'(?:lose|drop|spend|use|expend|give|donate|surrender) (\d+) (\w+)',
-        response, 
-        re.IGNORECASE
-    )
-    for amount, resource in lost_matches:
+    for amount, resource in reply.findall("resource_loss"):
         resource = resource.lower()
-        if resource in player_choices['resources']:
-            player_choices['resources'][resource] = max(0, player_choices['resources'][resource] - int(amount))
+        if resource in player_choices.resources:
+            player_choices.resources[resource] = max(0, player_choices.resources[resource] - int(amount))
+            player_choices.changed("resources")
 
-    gain_matches = re.findall(
-        r'(?:find|earn|receive|get|acquire|obtain|gain|steal|take) (\d+) ' + re.escape(currency_name),
-        response, 
-        re.IGNORECASE
-    )
-    for amount in gain_matches:
-        if current_player in player_choices['currency']:
-            player_choices['currency'][current_player] += int(amount)
+    for amount in reply.findall("currency_gain"):
+        if current_player in player_choices.currency:
+            player_choices.currency[current_player] += int(amount)
+            player_choices.changed("currency")
     
-    loss_matches = re.findall(
-        r'(?:spend|pay|lose|drop|use|expend|give|donate|surrender) (\d+) ' + re.escape(currency_name),
-        response, 
-        re.IGNORECASE
-    )
-    for amount in loss_matches:
-        if current_player in player_choices['currency']:
-            player_choices['currency'][current_player] = max(0, player_choices['currency'][current_player] - int(amount))
+    for amount in reply.findall("currency_loss"):
+        if current_player in player_choices.currency:
+            player_choices.currency[current_player] = max(0, player_choices.currency[current_player] - int(amount))
+            player_choices.changed("currency")
     
-    # Improved pattern for multi-word locations
-    world_event_matches = re.findall(
-        r'(?:The|A|An) ([A-Za-z\s]+) (?:is|has been|becomes) (destroyed|created|changed|revealed|altered|ruined|rebuilt)',
-        response, 
-        re.IGNORECASE
-    )
-    for location, event in world_event_matches:
-        player_choices['world_events'].append(f"{location.strip()} {event}")
+    for location, event in reply.findall("world_event"):
+        player_choices.world_events.append(f"{location.strip()} {event}")
+        player_choices.changed("world_events")
     
-    # Improved quest detection patterns
-    if "quest completed" in response.lower() or "completed the quest" in response.lower():
-        quest_match = re.search(r'quest ["\']?(.*?)["\']? (?:is|has been)? completed', response, re.IGNORECASE)
+    if "quest completed" in lowered or "completed the quest" in lowered:
+        quest_match = reply.search("quest_completed")
         if quest_match:
             quest_name = quest_match.group(1).strip()
-            if quest_name in player_choices['active_quests']:
-                player_choices['active_quests'].remove(quest_name)
-                player_choices['completed_quests'].append(quest_name)
+            if quest_name in player_choices.active_quests:
+                player_choices.active_quests.discard(quest_name)
+                player_choices.completed_quests.add(quest_name)
+                player_choices.changed("active_quests", "completed_quests")
     
-    if "new quest" in response.lower() or "quest started" in response.lower() or "quest given" in response.lower():
-        quest_match = re.search(r'quest ["\']?(.*?)["\']? (?:is|has been)? (?:given|started)', response, re.IGNORECASE)
+    if "new quest" in lowered or "quest started" in lowered or "quest given" in lowered:
+        quest_match = reply.search("quest_started")
         if quest_match:
             quest_name = quest_match.group(1).strip()
-            if quest_name not in player_choices['active_quests'] and quest_name not in player_choices['completed_quests']:
-                player_choices['active_quests'].append(quest_name)
+            if quest_name not in player_choices.active_quests and quest_name not in player_choices.completed_quests:
+                player_choices.active_quests.add(quest_name)
+                player_choices.changed("active_quests")
     
-    if "reputation increases" in response.lower() or "reputation improved" in response.lower():
-        player_choices['reputation'] += 1
-    elif "reputation decreases" in response.lower() or "reputation damaged" in response.lower():
-        player_choices['reputation'] = max(-5, player_choices['reputation'] - 1)
+    if "reputation increases" in lowered or "reputation improved" in lowered:
+        player_choices.reputation += 1
+        player_choices.changed("reputation")
+    elif "reputation decreases" in lowered or "reputation damaged" in lowered:
+        player_choices.reputation = max(-5, player_choices.reputation - 1)
+        player_choices.changed("reputation")
     
-    faction_matches = re.findall(
-        r'(?:The|Your) (\w+) faction (?:likes|respects|trusts|appreciates) you more', 
-        response, 
-        re.IGNORECASE
-    )
-    for faction in faction_matches:
-        player_choices['factions'][faction] += 1
+    for faction in reply.findall("faction_gain"):
+        player_choices.factions[faction] += 1
+        player_choices.changed("factions")
     
-    faction_loss_matches = re.findall(
-        r'(?:The|Your) (\w+) faction (?:dislikes|distrusts|hates|condemns) you more', 
-        response, 
-        re.IGNORECASE
-    )
-    for faction in faction_loss_matches:
-        player_choices['factions'][faction] -= 1
+    for faction in reply.findall("faction_loss"):
+        player_choices.factions[faction] -= 1
+        player_choices.changed("factions")
         
-    discovery_matches = re.findall(
-        r'(?:discover|find|uncover|learn about|reveal) (?:a |an |the )?(.+?)\.', 
-        response, 
-        re.IGNORECASE
-    )
-    for discovery in discovery_matches:
-        if discovery not in player_choices['discoveries']:
-            player_choices['discoveries'].append(discovery)
+    for discovery in reply.findall("discovery"):
+        player_choices.discoveries.add(discovery)
     
-    # Improved patterns for multi-word objects
-    destroyed_matches = re.findall(
-        r'(?:destroy|break|smash) (?:the |a |an )?([\w\s]+)', 
-        action, 
-        re.IGNORECASE
-    )
-    for obj in destroyed_matches:
-        player_choices['objects'][obj.strip()] = "destroyed"
+    player_action = rules.scan(action)
+    for obj in player_action.findall("destroyed"):
+        player_choices.set_object(obj.strip(), "destroyed")
     
-    taken_matches = re.findall(
-        r'(?:take|steal|grab|pick up) (?:the |a |an )?([\w\s]+)', 
-        action, 
-        re.IGNORECASE
+    for obj in player_action.findall("taken"):
+        player_choices.set_object(obj.strip(), "taken")
+
+def estimate_tokens(text):
+    # Rough rule of thumb for English text with Llama-style tokenizers
+    return len(text) // 4 + 1
+
+SUMMARY_PROMPT = """You are keeping notes for a Dungeon Master. Rewrite the story summary below so that it also covers the new events. Keep names, places, items, promises and unresolved threats. Write plain prose in a single paragraph of at most {max_words} words.
+
+### Story Summary ###
+{summary}
+
+### New Events ###
+{events}
+
+Updated Summary:"""
+
+class ConversationContext:
+    """Bounded prompt history: the adventure setting, a running summary and the
+    most recent exchanges verbatim.
+
+    Exchanges that fall out of the window are queued in `pending` and folded
+    into the summary by compact(), which GameSession.commit_round runs in
+    the background. The rendered history never exceeds `token_budget`.
+    """
+
+    def __init__(self, opening="", keep_exchanges=None, token_budget=None, summary_budget=None):
+        self.opening = opening.strip()
+        self.keep_exchanges = keep_exchanges or CONTEXT_KEEP_EXCHANGES
+        self.token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+        self.summary_budget = summary_budget or SUMMARY_TOKEN_BUDGET
+        self.summary = ""
+        self.recent = []
+        self.pending = []
+        self.lock = threading.RLock()
+        self.compactor = None
+        # Called as on_summary(summary, consumed) under self.lock after a compaction
+        self.on_summary = None
+
+    @classmethod
+    def from_transcript(cls, conversation, player_names):
+        """Rebuild a context from a saved transcript (text or a list of lines)."""
+        lines = conversation.splitlines() if isinstance(conversation, str) else conversation
+        start = 0
+        for i, line in enumerate(lines):
+            if "### Adventure Setting ###" in line:
+                start = i
+                break
+        speakers = tuple(["Dungeon Master", "Player: "] + [f"{name}: " for name in player_names])
+        blocks = []
+        for line in itertools.islice(lines, start, None):
+            if blocks and not line.startswith(speakers):
+                blocks[-1] += "\n" + line
+            else:
+                blocks.append(line)
+
+        opening = []
+        rest = 0
+        for block in blocks:
+            opening.append(block)
+            rest += 1
+            if block.startswith("Dungeon Master"):
+                break
+        context = cls("\n".join(opening))
+        exchange = []
+        exchanges = []
+        for block in itertools.islice(blocks, rest, None):
+            if not block.strip():
+                continue
+            exchange.append(block.strip())
+            if block.startswith("Dungeon Master"):
+                exchanges.append("\n".join(exchange))
+                exchange = []
+        # Trim once for the whole transcript instead of after every exchange
+        context.restore(exchanges)
+        return context
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "opening": self.opening,
+                "summary": self.summary,
+                "recent": list(self.recent),
+                "pending": list(self.pending),
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        context = cls(data.get("opening", ""))
+        context.summary = data.get("summary", "")
+        context.recent = list(data.get("recent", []))
+        context.pending = list(data.get("pending", []))
+        return context
+
+    def add(self, entry):
+        with self.lock:
+            self.recent.append(entry.strip())
+            self._trim()
+
+    def remove_last_exchange(self):
+        """Drop the newest player exchange and anything after it (for /redo)."""
+        with self.lock:
+            removed = []
+            while self.recent:
+                entry = self.recent.pop()
+                removed.insert(0, entry)
+                if not entry.startswith("Dungeon Master"):
+                    break
+            return removed
+
+    def restore(self, entries):
+        with self.lock:
+            self.recent.extend(entries)
+            self._trim()
+
+    def render(self):
+        with self.lock:
+            parts = []
+            if self.opening:
+                parts.append(self.opening)
+            if self.summary:
+                parts.append(f"### Story So Far ###\n{self.summary}")
+            if self.recent:
+                parts.append("\n".join(self.recent))
+            return "\n\n".join(parts)
+
+    def _trim(self):
+        fixed = estimate_tokens(self.opening) + estimate_tokens(self.summary)
+        tokens = fixed + sum(estimate_tokens(e) for e in self.recent)
+        if len(self.recent) <= self.keep_exchanges and tokens <= self.token_budget:
+            return
+        # Trim down to half the window in one go rather than one exchange per
+        # turn, so the rendered history is append-only for several turns and
+        # Ollama can keep reusing its cached prompt prefix. The newest
+        # exchange always stays so the DM sees the last reply.
+        keep = len(self.recent)
+        while keep > 1 and (
+            keep > self.keep_exchanges // 2
+            or tokens > self.token_budget // 2
+        ):
+            tokens -= estimate_tokens(self.recent[-keep])
+            keep -= 1
+        cut = len(self.recent) - keep
+        self.pending.extend(self.recent[:cut])
+        del self.recent[:cut]
+
+    def compact(self, model=None):
+        """Fold pending exchanges into the running summary with the LLM."""
+        with self.lock:
+            events = list(self.pending)
+            summary = self.summary
+        if not events:
+            return
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_budget * 3 // 4,
+            summary=summary or "The adventure has just begun.",
+            events="\n".join(events)
+        )
+        # Summaries are background work: let every table's turns go first
+        with llm_scheduler.session("compaction", priority=-1), perf.span("compaction"):
+            new_summary = get_ai_response(prompt, model)
+        if not new_summary:
+            logging.error("Context compaction failed; keeping older turns pending")
+            return
+        new_summary = " ".join(new_summary.split())
+        # Hard cap in case the model ignores the word limit: keep the newest text
+        max_chars = self.summary_budget * 4
+        if len(new_summary) > max_chars:
+            new_summary = new_summary[-max_chars:].split(" ", 1)[-1]
+        log_event(logging.INFO, "Context compacted", exchanges=len(events), summary_chars=len(new_summary))
+        with self.lock:
+            self.apply_summary(new_summary, len(events))
+            if self.on_summary:
+                self.on_summary(new_summary, len(events))
+
+    def apply_summary(self, summary, consumed):
+        """Replace the summary with one covering the first `consumed` pending exchanges."""
+        with self.lock:
+            self.summary = summary
+            del self.pending[:consumed]
+            self._trim()
+
+    def compact_async(self, model=None):
+        if self.compactor and self.compactor.is_alive():
+            return
+        self.compactor = threading.Thread(target=contextvars.copy_context().run, args=(self.compact, model),
+                                          daemon=True)
+        self.compactor.start()
+
+def format_system_prompt(party, starting_location, genre):
+    return DM_SYSTEM_PROMPT.format(
+        num_players=len(party),
+        player_names=", ".join(name for name, _ in party),
+        player_classes=", ".join(player_class for _, player_class in party),
+        starting_location=starting_location,
+        currency_name=CURRENCY_MAP.get(genre, "currency")
     )
-    for obj in taken_matches:
-        player_choices['objects'][obj.strip()] = "taken"
 
-def get_round_summary(conversation, player_choices, genre, starting_location, party):
-    """Generate a summary of the round's actions and progress the story"""
-    currency_name = CURRENCY_MAP.get(genre, "currency")
-    player_names = [name for name, _ in party]
-    player_classes = [pc for _, pc in party]
-    
-    summary_prompt = (
-        f"{DM_SYSTEM_PROMPT.format(num_players=len(party), player_names=', '.join(player_names), player_classes=', '.join(player_classes), starting_location=starting_location, currency_name=currency_name)}\n\n"
-        f"### Current World State ###\n{get_current_state(player_choices, genre)}\n\n"
-        f"{conversation}\n"
-        f"### Additional Instruction ###\n"
-        f"The party has completed a full round of actions. As the Dungeon Master, summarize the consequences of their choices and progress the story naturally to the next significant event or challenge.\n"
-        f"Dungeon Master:"
+def build_dm_prompt(system_prompt, context, state, turn):
+    """Assemble a DM prompt with the stable parts first.
+
+    The system prompt and the history only ever grow at the end between
+    context compactions, so consecutive prompts share a long common prefix that
+    Ollama answers from its KV cache. The world state changes every turn and is
+    placed after the history, next to the new player action.
+    """
+    return (
+        f"{system_prompt}\n\n"
+        f"{context.render()}\n\n"
+        f"{state}\n\n"
+        f"{turn}\n"
+        "Dungeon Master:"
     )
-    
-    return get_ai_response(summary_prompt)
 
-def main():
-    global ollama_model
-    last_ai_reply = ""
-    conversation = ""
-    adventure_started = False
-    last_player_input = ""
-    current_player_index = 0
-    last_player_name = None
-    round_count = 0  # Track rounds for DM narration
-    
-    party = []
-    num_players = 0
-    selected_genre = ""
-    starting_location = ""
-
-    player_choices = {
-        "currency": {},
-        "allies": [],
-        "enemies": [],
-        "discoveries": [],
-        "reputation": 0,
-        "resources": {},
-        "factions": defaultdict(int),
-        "completed_quests": [],
-        "active_quests": [],
-        "world_events": [],
-        "consequences": [],
-        "objects": {}
+def round_summary_prompt(context, player_choices, genre, starting_location, party, state=None):
+    """The prompt asking the DM to summarize the round's actions and progress the story."""
+    return build_dm_prompt(
+        format_system_prompt(party, starting_location, genre),
+        context,
+        state if state is not None else state_prompt(player_choices, genre),
+        "### Additional Instruction ###\n"
+        "The party has completed a full round of actions. As the Dungeon Master, summarize the consequences of their choices and progress the story naturally to the next significant event or challenge."
+    )
+
+class SpeculativeSummary:
+    """A round summary generated on a background thread.
+
+    It starts as soon as the round's last reply is final, so it generates
+    while that reply is still being read out. A /redo of the reply discard()s
+    it, which cancels the generation so the redo does not queue behind it.
+    """
+
+    def __init__(self, generate_fn, prompt):
+        self.result = None
+        self.discarded = False
+        self.generation = Generation()
+        self.done = threading.Event()
+        # The thread logs under the ids of the turn that started it
+        threading.Thread(target=contextvars.copy_context().run, args=(self._run, generate_fn, prompt),
+                         daemon=True).start()
+
+    def _run(self, generate_fn, prompt):
+        current_generation.set(self.generation)
+        try:
+            with perf.span("round_summary.generate"):
+                self.result = generate_fn(prompt)
+        except Exception as e:
+            logging.error(f"Error generating round summary: {e}")
+        finally:
+            self.done.set()
+
+    def wait(self):
+        """The summary text ("" if generation failed), or None once discarded."""
+        self.done.wait()
+        return None if self.discarded else self.result or ""
+
+    def discard(self):
+        self.discarded = True
+        self.generation.cancel()
+
+def new_player_choices():
+    return WorldState()
+
+def write_save(path, sections):
+    """Write a save file: one JSON header line, then one JSON line per section.
+
+    The header indexes every section by byte offset (counted from the end of
+    the header line) and length, so a reader can jump straight to the
+    sections it needs. The file is replaced atomically.
+    """
+    index = {}
+    body = []
+    offset = 0
+    for name, value in sections.items():
+        line = (json.dumps(value, ensure_ascii=False) + "\n").encode("utf-8")
+        index[name] = [offset, len(line)]
+        offset += len(line)
+        body.append(line)
+    header = {
+        "format": SAVE_FORMAT,
+        "version": SAVE_FORMAT_VERSION,
+        "saved_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "sections": index,
     }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write((json.dumps(header) + "\n").encode("utf-8"))
+        f.writelines(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class SaveFile:
+    """Read access to a save written by write_save, one section at a time."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            self.base = f.tell()
+        if header.get("format") != SAVE_FORMAT:
+            raise ValueError(f"{path} is not an adventure save")
+        if header.get("version", 0) > SAVE_FORMAT_VERSION:
+            raise ValueError(f"{path} uses save format {header['version']}, newer than this game supports")
+        self.header = header
+        self.sections = header["sections"]
+
+    def read(self, name):
+        offset, length = self.sections[name]
+        with open(self.path, "rb") as f:
+            f.seek(self.base + offset)
+            return json.loads(f.read(length).decode("utf-8"))
+
+def journal_path(save_path):
+    return save_path + ".journal"
+
+class TurnJournal:
+    """Append-only log of the changes made to a game since its last snapshot.
+
+    Each record is one JSON line carrying a sequence number. Lines are flushed
+    as they are written, so a crash of the game loses nothing; fsync (against
+    power loss) runs in batches of fsync_every records or fsync_interval
+    seconds. Writing a record costs the same however long the campaign is.
+    """
+
+    def __init__(self, path, seq=0, fsync_every=JOURNAL_FSYNC_EVERY, fsync_interval=JOURNAL_FSYNC_INTERVAL):
+        self.path = path
+        self.seq = seq
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.file = open(path, "ab")
+        self.records = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def append(self, record):
+        with self.lock:
+            self.seq += 1
+            record["seq"] = self.seq
+            self.file.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.file.flush()
+            self.records += 1
+            self.unsynced += 1
+            if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def reset(self):
+        """Empty the journal once its records are covered by a snapshot."""
+        with self.lock:
+            self.file.truncate(0)
+            self.file.seek(0)
+            self._sync()
+            self.records = 0
+
+    def close(self):
+        with self.lock:
+            if self.unsynced:
+                self._sync()
+            self.file.close()
+
+    @staticmethod
+    def read(path, repair=False):
+        """Yield the records in a journal, stopping at a line torn by a crash.
+        With repair, the torn line is cut off once the records before it are
+        read, so that records appended afterwards do not end up behind it."""
+        if not os.path.exists(path):
+            return
+        valid = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("no line end")
+                    record = json.loads(line)
+                except ValueError:
+                    logging.error(f"Ignoring incomplete record at the end of {path}")
+                    break
+                yield record
+                valid += len(line)
+            else:
+                return
+        if repair:
+            os.truncate(path, valid)
+
+def slot_name(name):
+    return re.sub(r"[^\w\-]+", "_", name.strip()).strip("_")
+
+def slot_path(slot, saves_dir=SAVES_DIR):
+    return os.path.join(saves_dir, f"{slot}.sav")
+
+class SaveIndex:
+    """Summary of every save slot (party, genre, round, save time, last DM
+    line), kept in index.json so that listing and picking slots never opens
+    the saves themselves. The index is read on first use and rebuilt from the
+    saves' meta sections if it is missing or damaged."""
+
+    def __init__(self, saves_dir=SAVES_DIR):
+        self.saves_dir = saves_dir
+        self.path = os.path.join(saves_dir, "index.json")
+        self.lock = threading.Lock()
+        self._entries = None
+
+    def entries(self):
+        with self.lock:
+            if self._entries is None:
+                self._entries = self._read()
+            return dict(self._entries)
+
+    def listing(self):
+        """(slot, entry) pairs, most recently saved first."""
+        return sorted(self.entries().items(), key=lambda item: item[1].get("saved_at", ""), reverse=True)
+
+    def update(self, path, meta):
+        with self.lock:
+            if self._entries is None:
+                self._entries = self._read()
+            self.update_entry(path, meta, time.time())
+            self._write()
+
+    def remove(self, slot):
+        with self.lock:
+            if self._entries is None:
+                self._entries = self._read()
+            if self._entries.pop(slot, None) is not None:
+                self._write()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logging.error(f"Rebuilding damaged save index {self.path}: {e}")
+        entries = self._entries = {}
+        if os.path.isdir(self.saves_dir):
+            for filename in sorted(os.listdir(self.saves_dir)):
+                if not filename.endswith(".sav"):
+                    continue
+                path = os.path.join(self.saves_dir, filename)
+                try:
+                    self.update_entry(path, SaveFile(path).read("meta"), os.path.getmtime(path))
+                except Exception as e:
+                    logging.error(f"Skipping unreadable save {path}: {e}")
+        if entries:
+            self._write()
+        return entries
+
+    def update_entry(self, path, meta, mtime):
+        slot = os.path.splitext(os.path.basename(path))[0]
+        self._entries[slot] = {
+            "genre": meta.get("genre", ""),
+            "party": [list(member) for member in meta.get("party", [])],
+            "round_count": meta.get("round_count", 0),
+            "saved_at": datetime.datetime.fromtimestamp(mtime).isoformat(timespec="seconds"),
+            "last_line": " ".join(meta.get("last_ai_reply", "").split())[:120],
+        }
+
+    def _write(self):
+        os.makedirs(self.saves_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+save_index = SaveIndex()
+
+def describe_slot(slot, entry):
+    party = ", ".join(f"{name} the {player_class}" for name, player_class in entry.get("party", []))
+    text = f"{slot}: {entry.get('genre') or 'Unknown genre'} - {party or 'no party'} - round {entry.get('round_count', 0)}, saved {entry.get('saved_at', '?').replace('T', ' ')}"
+    if entry.get("last_line"):
+        text += f"\n     \"{entry['last_line']}\""
+    return text
+
+def migrate_legacy_saves(index=save_index):
+    """Move a save from before slots existed into DEFAULT_SLOT."""
+    path = slot_path(DEFAULT_SLOT, index.saves_dir)
+    if os.path.exists(path) or not (os.path.exists(SAVE_FILE) or os.path.exists(LEGACY_SAVE_FILE)):
+        return False
+    os.makedirs(index.saves_dir, exist_ok=True)
+    if os.path.exists(SAVE_FILE):
+        if os.path.exists(journal_path(SAVE_FILE)):
+            os.replace(journal_path(SAVE_FILE), journal_path(path))
+        os.replace(SAVE_FILE, path)
+    else:
+        import_legacy_save(LEGACY_SAVE_FILE, path)
+    index.update(path, SaveFile(path).read("meta"))
+    return True
+
+def delete_slot(slot, index=save_index):
+    path = slot_path(slot, index.saves_dir)
+    for filename in (path, journal_path(path)):
+        if os.path.exists(filename):
+            os.remove(filename)
+    index.remove(slot)
+
+def choose_slot(index=save_index, prompt="Choose a save slot", skip="cancel"):
+    """Ask for one of the listed slots by number or name. Returns None if
+    the player just presses Enter."""
+    slots = index.listing()
+    if not slots:
+        print("No saved adventures found.")
+        return None
+    for i, (slot, entry) in enumerate(slots, 1):
+        print(f"{i}: {describe_slot(slot, entry)}")
+    while True:
+        choice = input(f"{prompt} (Enter to {skip}): ").strip()
+        if not choice:
+            return None
+        if choice.isdigit() and 1 <= int(choice) <= len(slots):
+            return slots[int(choice) - 1][0]
+        if slot_name(choice) in dict(slots):
+            return slot_name(choice)
+        print("Invalid selection. Please try again.")
+
+def new_slot_name(index=save_index):
+    entries = index.entries()
+    default = DEFAULT_SLOT
+    n = 2
+    while default in entries:
+        default = f"{DEFAULT_SLOT}-{n}"
+        n += 1
+    while True:
+        slot = slot_name(input(f"Name for this adventure's save slot (Enter for '{default}'): ")) or default
+        if slot not in entries:
+            return slot
+        if input(f"Slot '{slot}' already exists. Replace it? (y/n): ").strip().lower() == "y":
+            return slot
+
+def parse_legacy_state(state_lines, player_choices):
+    """Fill player_choices from the get_current_state lines of an old save.
 
-    if os.path.exists("adventure.txt"):
-        print("A saved adventure exists. Load it now? (y/n)")
-        if input().strip().lower() == "y":
+    Only what that text shows can be recovered: the last few world events and
+    consequences, and list entries joined with ", ".
+    """
+    list_fields = {
+        "Allies": "allies",
+        "Enemies": "enemies",
+        "Active Quests": "active_quests",
+        "Completed Quests": "completed_quests",
+    }
+    item_sections = {
+        "Resources": "resources",
+        "Faction Relationships": "factions",
+        "Recent World Events": "world_events",
+        "Recent Consequences": "consequences",
+        "Object States": "objects",
+    }
+    section = None
+    for line in state_lines:
+        stripped = line.strip()
+        if stripped.startswith("- ") and section:
+            item = stripped[2:]
+            if section in ("world_events", "consequences"):
+                player_choices[section].append(item)
+            elif section == "objects":
+                obj, _, status = item.partition(": ")
+                player_choices['objects'][obj.strip()] = status.strip()
+            else:
+                key, _, amount = item.rpartition(": ")
+                try:
+                    player_choices[section][key.strip()] = int(amount)
+                except ValueError:
+                    pass
+            continue
+        section = None
+        label, _, value = stripped.partition(":")
+        value = value.strip()
+        if label.startswith("Currency ("):
+            section = "currency"
+        elif label in item_sections:
+            section = item_sections[label]
+        elif label in list_fields:
+            if value and value != "None":
+                player_choices[list_fields[label]] = [v.strip() for v in value.split(",")]
+        elif label == "Reputation":
             try:
-                with open("adventure.txt", "r", encoding="utf-8") as f:
-                    content = f.read()
-                
-                if "### Party Information ###" in content:
-                    party_section = content.split("### Party Information ###")[1]
-                    party_section = party_section.split("### Persistent World State ###")[0].strip()
-                    
-                    genre_match = re.search(r"Genre: (.+)", party_section)
-                    if genre_match:
-                        selected_genre = genre_match.group(1).strip()
-                    
-                    loc_match = re.search(r"Starting Location: (.+)", party_section)
-                    if loc_match:
-                        starting_location = loc_match.group(1).strip()
-                    
-                    player_lines = [line.strip() for line in party_section.splitlines() if line.startswith("- ")]
-                    party = []
-                    for line in player_lines:
-                        match = re.match(r"- (.+?) \((.+?)\)", line)
-                        if match:
-                            name = match.group(1).strip()
-                            player_class = match.group(2).strip()
-                            party.append((name, player_class))
-                    
-                    num_players = len(party)
-                
-                conversation = content.split("### Persistent World State ###")[0].strip()
-                
-                print("Adventure loaded.\n")
-                last_dm_pos = conversation.rfind("Dungeon Master:")
-                if last_dm_pos != -1:
-                    reply = conversation[last_dm_pos + len("Dungeon Master:"):].strip()
-                    print(f"Dungeon Master: {reply}")
-                    speak(reply)
-                    last_ai_reply = reply
-                    adventure_started = True
-                    
-                    if "### Persistent World State ###" in content:
-                        state_section = content.split("### Persistent World State ###")[1]
-                        
-                        # Improved state parsing
-                        if "Currency (" in state_section:
-                            currency_section = state_section.split("Currency (")[1]
-                            currency_name = currency_section.split("):")[0]
-                            currency_lines = currency_section.split("):")[1]
-                            currency_pattern = r"- (.+?): (\d+)"
-                            currency_matches = re.findall(currency_pattern, currency_lines)
-                            for player, amount in currency_matches:
-                                player_choices['currency'][player] = int(amount)
-                            
-                        if "Allies:" in state_section:
-                            allies_line = state_section.split("Allies:")[1].split("\n")[0].strip()
-                            if allies_line != "None":
-                                player_choices['allies'] = [a.strip() for a in allies_line.split(",")]
-                        
-                        if "Enemies:" in state_section:
-                            enemies_line = state_section.split("Enemies:")[1].split("\n")[0].strip()
-                            if enemies_line != "None":
-                                player_choices['enemies'] = [e.strip() for e in enemies_line.split(",")]
-                        
-                        if "Resources:" in state_section:
-                            resources_section = state_section.split("Resources:")[1]
-                            if "Faction Relationships:" in resources_section:
-                                resources_section = resources_section.split("Faction Relationships:")[0]
-                            resource_pattern = r"- (.+?): (\d+)"
-                            resource_matches = re.findall(resource_pattern, resources_section)
-                            for resource, amount in resource_matches:
-                                player_choices['resources'][resource.strip()] = int(amount)
-                        
-                        if "Consequences:" in state_section:
-                            cons_section = state_section.split("Consequences:")[1]
-                            if "Object States:" in cons_section:
-                                cons_section = cons_section.split("Object States:")[0]
-                            cons_pattern = r"- (.+)"
-                            cons_matches = re.findall(cons_pattern, cons_section)
-                            for cons in cons_matches:
-                                player_choices['consequences'].append(cons.strip())
-                        
-                        if "Object States:" in state_section:
-                            obj_section = state_section.split("Object States:")[1]
-                            obj_pattern = r"- (.+?): (.+)"
-                            obj_matches = re.findall(obj_pattern, obj_section)
-                            for obj, status in obj_matches:
-                                player_choices['objects'][obj.strip()] = status.strip()
+                player_choices['reputation'] = int(value)
+            except ValueError:
+                pass
+
+def parse_legacy_save(lines):
+    """Convert an old adventure.txt save into save sections in a single pass
+    over its lines: the transcript, then the party, then the world state."""
+    meta = {"genre": "", "starting_location": "", "starting_scenario": "", "party": [], "round_count": 0}
+    conversation = []
+    state_lines = []
+    part = conversation
+    last_dm = None
+    for line in lines:
+        line = line.rstrip("\n")
+        marker = line.strip()
+        if marker == "### Party Information ###":
+            part = "party"
+            continue
+        if marker == "### Persistent World State ###":
+            part = state_lines
+            continue
+        if part is conversation:
+            conversation.append(line)
+            if "Dungeon Master" in line:
+                meta["round_count"] += line.count("Dungeon Master (Round Summary):")
+                pos = line.rfind("Dungeon Master:")
+                if pos != -1:
+                    last_dm = (len(conversation) - 1, pos)
+            elif not meta["starting_scenario"] and line.startswith("Starting Scenario: "):
+                meta["starting_scenario"] = line[len("Starting Scenario: "):].strip()
+        elif part is state_lines:
+            state_lines.append(line)
+        elif line.startswith("Genre: "):
+            meta["genre"] = line[len("Genre: "):].strip()
+        elif line.startswith("Starting Location: "):
+            meta["starting_location"] = line[len("Starting Location: "):].strip()
+        else:
+            match = re.match(r"- (.+?) \((.+?)\)", line)
+            if match:
+                meta["party"].append([match.group(1).strip(), match.group(2).strip()])
+
+    meta["adventure_started"] = last_dm is not None
+    meta["last_ai_reply"] = ""
+    if last_dm:
+        index, pos = last_dm
+        tail = [conversation[index][pos + len("Dungeon Master:"):]] + conversation[index + 1:]
+        meta["last_ai_reply"] = "\n".join(tail).strip()
+
+    player_choices = copy.deepcopy(player_choices_template)
+    parse_legacy_state(state_lines, player_choices)
+    context = ConversationContext.from_transcript(conversation, [name for name, _ in meta["party"]])
+    return {
+        "meta": meta,
+        "state": WorldState.from_dict(player_choices).to_dict(),
+        "context": context.to_dict(),
+        "conversation": "\n".join(conversation).strip(),
+    }
+
+def import_legacy_save(legacy_path=LEGACY_SAVE_FILE, path=SAVE_FILE):
+    """One-shot conversion of an old text save into the structured format."""
+    with open(legacy_path, "r", encoding="utf-8") as f:
+        sections = parse_legacy_save(f)
+    write_save(path, sections)
+
+def load_slot(session, slot):
+    """Load a save slot into session and keep autosaving to it; the one load
+    path used by the startup picker and /load. Returns True on success."""
+    try:
+        if session.journal:
+            session.checkpoint()
+        replayed = session.load(slot_path(slot))
+        session.autosave(slot_path(slot))
+    except Exception as e:
+        logging.error(f"Error loading adventure: {e}")
+        print("Error loading adventure. Details logged.")
+        return False
+
+    stats = session.load_stats
+    print(f"Adventure loaded in {stats['total_ms']:.1f} ms "
+          f"(snapshot {stats['snapshot_ms']:.1f} ms, journal {stats['journal_ms']:.1f} ms).")
+    if replayed:
+        print(f"Recovered {replayed} autosaved change(s) since the last save.")
+    if session.last_ai_reply:
+        print(f"\nDungeon Master: {session.last_ai_reply}")
+        speak(session.last_ai_reply)
+    return True
+
+class GameSession:
+    """State and turn logic for one adventure.
+
+    The console game in main() and the LAN server both drive a GameSession;
+    narrate_fn and announce_fn decide where DM text and notices go, and
+    generate_fn and present_fn generate a round summary quietly and show it.
+    """
+
+    def __init__(self, narrate_fn=None, announce_fn=None, generate_fn=None, present_fn=None):
+        self.narrate = narrate_fn or narrate
+        self.announce = announce_fn or print
+        self.generate = generate_fn or generate_reply
+        self.present = present_fn or present
+        # The models this session's requests go to; /change updates them
+        self.models = ModelRegistry()
+        # Whether this session's narration plays on the local speakers
+        self.voice = True
+        # Correlation ids stamped on this session's log records
+        self.session_id = uuid.uuid4().hex[:8]
+        self.turn_number = 0
+        # Guards player_choices and the history against concurrent readers
+        self.lock = threading.RLock()
+        self.party = []
+        self.selected_genre = ""
+        self.starting_location = ""
+        self.starting_scenario = ""
+        self.player_choices = new_player_choices()
+        self._conversation = ""
+        # Text appended since the transcript was last joined or read
+        self._conversation_tail = []
+        # Save file the transcript is read from on first use (see load)
+        self.conversation_source = None
+        self.set_context(ConversationContext())
+        self.adventure_started = False
+        self.current_player_index = 0
+        self.round_count = 0  # Track rounds for DM narration
+        self.last_ai_reply = ""
+        self.last_player_input = ""
+        self.last_player_name = None
+        # Autosave: the journal of changes since the snapshot at save_path
+        self.journal = None
+        self.journal_seq = 0
+        self.save_path = None
+        # History taken out by undo_reply, kept until the redo settles
+        self.undone = None
+        # Round summary being generated, and the one shown but not yet applied
+        # (None when there is none); a /redo of the round's last reply drops both
+        self.round_job = None
+        self.pending_round = None
+        # SaveIndex told about every snapshot written, if any
+        self.save_index = None
+        # Timings of the last load()
+        self.load_stats = {}
+
+    @property
+    def num_players(self):
+        return len(self.party)
+
+    @property
+    def current_player(self):
+        return self.party[self.current_player_index]
+
+    @property
+    def rounds_completed(self):
+        # Counts a round whose summary is shown but not applied yet
+        return self.round_count + (self.pending_round is not None)
+
+    @property
+    def conversation(self):
+        # The full transcript is only needed for /save and /redo, so a loaded
+        # game reads it from the save file on first use
+        if self.conversation_source is not None:
+            source, self.conversation_source = self.conversation_source, None
+            try:
+                self._conversation = source.read("conversation")
             except Exception as e:
-                logging.error(f"Error loading adventure: {e}")
-                print("Error loading adventure. Details logged.")
+                logging.error(f"Error reading transcript from {source.path}: {e}")
+                self._conversation = ""
+        if self._conversation_tail:
+            self._conversation += "".join(self._conversation_tail)
+            self._conversation_tail = []
+        return self._conversation
+
+    @conversation.setter
+    def conversation(self, value):
+        self.conversation_source = None
+        self._conversation_tail = []
+        self._conversation = value
+
+    def append_conversation(self, text):
+        # Turns only append to the transcript; joining is left to whoever
+        # reads it, so a turn costs the same however long the campaign is
+        self._conversation_tail.append(text)
+
+    def snapshot(self):
+        """Everything needed to resume this adventure, as save sections."""
+        self.commit_round()
+        with self.lock:
+            return {
+                "meta": {
+                    "genre": self.selected_genre,
+                    "starting_location": self.starting_location,
+                    "starting_scenario": self.starting_scenario,
+                    "party": [list(member) for member in self.party],
+                    "adventure_started": self.adventure_started,
+                    "current_player_index": self.current_player_index,
+                    "round_count": self.round_count,
+                    "last_ai_reply": self.last_ai_reply,
+                    "last_player_input": self.last_player_input,
+                    "last_player_name": self.last_player_name,
+                    "journal_seq": self.journal.seq if self.journal else self.journal_seq,
+                },
+                "state": self.player_choices.to_dict(),
+                "context": self.context.to_dict(),
+                "conversation": self.conversation,
+            }
+
+    def restore(self, sections):
+        """Replace the whole game with a snapshot; nothing of the previous game
+        (consequences, history, a pending redo) carries over."""
+        with self.lock:
+            meta = sections["meta"]
+            self.undone = None
+            self.discard_round()
+            self.selected_genre = meta.get("genre", "")
+            self.starting_location = meta.get("starting_location", "")
+            self.starting_scenario = meta.get("starting_scenario", "")
+            self.party = [tuple(member) for member in meta.get("party", [])]
+            self.adventure_started = meta.get("adventure_started", False) and bool(self.party)
+            self.current_player_index = meta.get("current_player_index", 0)
+            self.round_count = meta.get("round_count", 0)
+            self.last_ai_reply = meta.get("last_ai_reply", "")
+            self.last_player_input = meta.get("last_player_input", "")
+            self.last_player_name = meta.get("last_player_name")
+            self.journal_seq = meta.get("journal_seq", 0)
+            self.player_choices = WorldState.from_dict(sections["state"])
+            self.set_context(ConversationContext.from_dict(sections["context"]))
+            if "conversation" in sections:
+                self.conversation = sections["conversation"]
+
+    def save(self, path=SAVE_FILE):
+        if self.journal and path == self.save_path:
+            self.checkpoint()
+        else:
+            # A journal left there by another game would be replayed on top
+            # of this snapshot when it is loaded
+            if os.path.exists(journal_path(path)):
+                os.remove(journal_path(path))
+            self.write_snapshot(path)
+
+    def write_snapshot(self, path):
+        sections = self.snapshot()
+        write_save(path, sections)
+        if self.save_index:
+            self.save_index.update(path, sections["meta"])
+
+    def load(self, path=SAVE_FILE):
+        """Restore a saved game, replaying any autosave journal written after
+        its snapshot. Reads only the small sections up front; the transcript
+        stays on disk until something needs it. Returns the number of journal
+        records replayed."""
+        started = time.perf_counter()
+        self.stop_autosave()
+        save = SaveFile(path)
+        self.restore({name: save.read(name) for name in ("meta", "state", "context")})
+        self.conversation_source = save
+        loaded = time.perf_counter()
+        replayed = 0
+        for record in TurnJournal.read(journal_path(path), repair=True):
+            if record.get("seq", 0) <= self.journal_seq:
+                continue
+            self.replay(record)
+            self.journal_seq = record["seq"]
+            replayed += 1
+        finished = time.perf_counter()
+        self.load_stats = {
+            "snapshot_ms": (loaded - started) * 1000,
+            "journal_ms": (finished - loaded) * 1000,
+            "total_ms": (finished - started) * 1000,
+            "records": replayed,
+        }
+        log_event(logging.INFO, "Save loaded", session=self.session_id, path=path, records=replayed,
+                  ms=round(self.load_stats["total_ms"], 1))
+        return replayed
+
+    def autosave(self, path=SAVE_FILE):
+        """Journal every change from now on next to the snapshot at path."""
+        self.stop_autosave()
+        self.save_path = path
+        if not os.path.exists(path):
+            self.write_snapshot(path)
+        self.journal = TurnJournal(journal_path(path), self.journal_seq)
+
+    def stop_autosave(self):
+        if self.journal:
+            self.journal_seq = self.journal.seq
+            self.journal.close()
+            self.journal = None
+
+    def checkpoint(self):
+        """Fold the journal into a fresh snapshot."""
+        with self.lock:
+            self.write_snapshot(self.save_path)
+            self.journal.reset()
+        log_event(logging.INFO, "Autosave snapshot written", path=self.save_path)
+
+    def record(self, record):
+        if self.journal:
+            self.journal.append(record)
+
+    def maybe_checkpoint(self):
+        if self.journal and self.journal.records >= JOURNAL_COMPACT_EVERY:
+            try:
+                with perf.span("autosave.snapshot"):
+                    self.checkpoint()
+            except Exception as e:
+                logging.error(f"Error writing autosave snapshot: {e}")
+
+    def set_context(self, context):
+        # A compaction still running on the old context must not reach our journal
+        old = getattr(self, "context", None)
+        if old is not None:
+            old.on_summary = None
+        self.context = context
+        self.context.on_summary = lambda summary, consumed: self.record(
+            {"type": "summary", "summary": summary, "consumed": consumed})
+
+    def replay(self, record):
+        kind = record["type"]
+        if kind == "turn":
+            self.apply_turn(record["player"], record["input"], record["reply"])
+        elif kind == "round":
+            self.pending_round = None
+            self.apply_round(record["summary"])
+        elif kind == "round_pending":
+            self.pending_round = record["summary"]
+        elif kind == "undo":
+            # A redo drops the summary made from the reply it replaces
+            self.pending_round = None
+            self.undo_reply()
+        elif kind == "undo_cancel":
+            self.cancel_undo()
+        elif kind == "redo":
+            self.apply_redo(record["reply"])
+        elif kind == "summary":
+            self.context.apply_summary(record["summary"], record["consumed"])
+        else:
+            logging.error(f"Unknown journal record type: {kind}")
+
+    def system_prompt(self):
+        return format_system_prompt(self.party, self.starting_location, self.selected_genre)
+
+    def state_text(self, full=False):
+        """The world state for a DM prompt, or all of it with full=True."""
+        with self.lock:
+            if full:
+                return self.player_choices.render(self.selected_genre)
+            return state_prompt(self.player_choices, self.selected_genre)
+
+    def setup(self, genre, party, starting_location):
+        self.selected_genre = genre
+        self.party = list(party)
+        self.starting_location = starting_location
+        # Initialize per-player currency
+        for name, player_class in self.party:
+            start_currency = CLASS_STARTING_CURRENCY.get(genre, {}).get(player_class, 10)
+            self.player_choices.currency[name] = start_currency
+        self.player_choices.changed("currency")
+        starter = get_role_starter(genre, "any")
+        self.starting_scenario = f"{starter} at {starting_location}."
+
+    def begin(self):
+        """Narrate the opening scene of a freshly set up adventure."""
+        initial_context = (
+            f"### Adventure Setting ###\n"
+            f"Genre: {self.selected_genre}\n"
+            f"Starting Location: {self.starting_location}\n"
+            f"Starting Scenario: {self.starting_scenario}\n"
+        )
+        self.conversation = self.system_prompt() + "\n\n" + initial_context + "\n\nDungeon Master: "
+
+        with log_context(session=self.session_id, turn=self.turn_number):
+            log_event(logging.INFO, "Adventure started", genre=self.selected_genre, party=len(self.party),
+                      location=self.starting_location)
+            ai_reply = self.narrate(self.conversation, model=self.models.model_for("narration"))
+        if ai_reply:
+            with self.lock:
+                self.append_conversation(ai_reply)
+                self.set_context(ConversationContext(f"{initial_context}\nDungeon Master: {ai_reply}"))
+                self.last_ai_reply = ai_reply
+                self.player_choices.consequences.append(f"Start: {ai_reply.split('.')[0]}")
+                self.player_choices.changed("consequences")
+                self.adventure_started = True
+        return ai_reply
+
+    def play_turn(self, user_input):
+        """Run the current player's action past the DM.
+
+        Returns (error_message, ai_reply); error_message is set when the action
+        was refused before reaching the model.
+        """
+        self.turn_number += 1
+        self.prompt_chars = 0
+        player_name = self.current_player[0]
+        started = time.perf_counter()
+        with log_context(session=self.session_id, turn=self.turn_number):
+            error_msg, ai_reply = self._play_turn(user_input)
+            log_event(logging.INFO, "Turn refused" if error_msg else "Turn", player=player_name,
+                      action_chars=len(user_input), prompt_chars=self.prompt_chars, reply_chars=len(ai_reply),
+                      seconds=round(time.perf_counter() - started, 3))
+        return error_msg, ai_reply
+
+    def _play_turn(self, user_input):
+        current_player_name, current_player_class = self.current_player
+        valid, error_msg = validate_purchase(user_input, self.selected_genre, self.player_choices, current_player_name)
+        if not valid:
+            return error_msg, ""
+            
+        valid, error_msg = enforce_class_restrictions(user_input, current_player_class, self.selected_genre)
+        if not valid:
+            return error_msg, ""
+
+        formatted_input = f"{current_player_name}: {user_input}"
+        self.commit_round()
+        
+        with perf.span("prompt"):
+            full_conversation = build_dm_prompt(self.system_prompt(), self.context, self.state_text(), formatted_input)
+        self.prompt_chars = len(full_conversation)
+        applied = []
+
+        def on_reply(ai_reply):
+            applied.append(ai_reply)
+            self.apply_turn(current_player_name, user_input, ai_reply)
+            # After all players have taken a turn, start the round summary
+            # while this reply is still being spoken
+            if self.current_player_index == 0:
+                self.start_round_summary()
+
+        ai_reply = self.narrate(full_conversation, "\nDungeon Master", on_reply=on_reply,
+                                model=self.models.model_for("narration"))
+        
+        if ai_reply:
+            if not applied:
+                on_reply(ai_reply)
+            if self.round_job:
+                self.finish_round()
+            self.maybe_checkpoint()
+        return None, ai_reply
+
+    def apply_turn(self, player_name, user_input, ai_reply):
+        formatted_input = f"{player_name}: {user_input}"
+        with self.lock, self.context.lock:
+            self.append_conversation(f"\n{formatted_input}\nDungeon Master: {ai_reply}")
+            self.context.add(f"{formatted_input}\nDungeon Master: {ai_reply}")
+            self.last_ai_reply = ai_reply
+            self.last_player_input = user_input
+            self.last_player_name = player_name
+            
+            with perf.span("world_state"):
+                update_world_state(user_input, ai_reply, self.player_choices, self.selected_genre, player_name)
+            
+            # Move to next player
+            self.current_player_index = (self.current_player_index + 1) % self.num_players
+            self.record({"type": "turn", "player": player_name, "input": user_input, "reply": ai_reply})
+
+    def start_round_summary(self):
+        with self.lock:
+            prompt = round_summary_prompt(self.context, self.player_choices, self.selected_genre,
+                                          self.starting_location, self.party, self.state_text())
+        generate = functools.partial(self.generate, model=self.models.model_for("summary"))
+        self.round_job = SpeculativeSummary(generate, prompt)
+
+    def finish_round(self):
+        """Show the round summary once it is ready. It is applied by
+        commit_round() when the game moves on, so a /redo of the round's
+        last reply can still replace it."""
+        self.announce(f"\n--- Round {self.round_count + 1} Complete ---")
+        job, self.round_job = self.round_job, None
+        started = time.perf_counter()
+        with perf.span("round_summary.wait"):
+            round_summary = job.wait()
+        log_event(logging.INFO, "Round summary", round=self.round_count + 1,
+                  summary_chars=len(round_summary or ""), waited=round(time.perf_counter() - started, 3))
+        if round_summary is None:
+            return None
+        if round_summary:
+            self.present(round_summary, "\nDungeon Master (Round Summary)")
+        self.pending_round = round_summary
+        # Journaled now so a crash cannot lose a summary the party has seen
+        self.record({"type": "round_pending", "summary": round_summary})
+        return round_summary
 
-    if not adventure_started:
+    def commit_round(self):
+        if self.pending_round is None:
+            return
+        round_summary, self.pending_round = self.pending_round, None
+        self.apply_round(round_summary)
+        self.context.compact_async(self.models.model_for("compaction"))
+        if self.journal and self.save_index:
+            # Keep the slot listing current between snapshots
+            self.save_index.update(self.save_path, {
+                "genre": self.selected_genre,
+                "party": self.party,
+                "round_count": self.round_count,
+                "last_ai_reply": self.last_ai_reply,
+            })
+
+    def discard_round(self):
+        """Drop a round summary made from a reply that is being redone.
+        Returns whether there was one."""
+        job, self.round_job = self.round_job, None
+        if job:
+            job.discard()
+        pending, self.pending_round = self.pending_round, None
+        return job is not None or pending is not None
+
+    def apply_round(self, round_summary):
+        with self.lock, self.context.lock:
+            self.round_count += 1
+            if round_summary:
+                # Update conversation and world state
+                self.append_conversation(f"\nDungeon Master (Round Summary): {round_summary}")
+                self.context.add(f"Dungeon Master (Round Summary): {round_summary}")
+                update_world_state(
+                    "Round Summary", 
+                    round_summary, 
+                    self.player_choices, 
+                    self.selected_genre, 
+                    "System"
+                )
+            self.record({"type": "round", "summary": round_summary})
+
+    def redo(self):
+        """Regenerate the last DM reply. Returns False if there is nothing to redo."""
+        if not (self.last_ai_reply and self.last_player_input and self.last_player_name):
+            return False
+        started = time.perf_counter()
+        with log_context(session=self.session_id, turn=self.turn_number):
+            self._redo()
+            log_event(logging.INFO, "Redo", player=self.last_player_name, reply_chars=len(self.last_ai_reply),
+                      seconds=round(time.perf_counter() - started, 3))
+        return True
+
+    def _redo(self):
+        ended_round = self.discard_round()
+        self.undo_reply()
+        if self.voice:
+            narrator.cancel()
+        
+        with perf.span("prompt"):
+            full_conversation = build_dm_prompt(
+                self.system_prompt(),
+                self.context,
+                self.state_text(),
+                f"{self.last_player_name}: {self.last_player_input}"
+            )
+        applied = []
+
+        def on_reply(ai_reply):
+            applied.append(ai_reply)
+            self.apply_redo(ai_reply)
+            if ended_round:
+                self.start_round_summary()
+
+        ai_reply = self.narrate(full_conversation, "\nDungeon Master", on_reply=on_reply,
+                                model=self.models.model_for("narration"))
+        if ai_reply:
+            if not applied:
+                on_reply(ai_reply)
+            if self.round_job:
+                self.finish_round()
+            self.maybe_checkpoint()
+        else:
+            self.cancel_undo()
+            if ended_round:
+                self.start_round_summary()
+                self.finish_round()
+
+    def undo_reply(self):
+        """Take the last DM reply out of the history ahead of a redo."""
+        with self.lock, self.context.lock:
+            self.undone = (self.conversation, self.context.remove_last_exchange())
+            self.conversation = remove_last_ai_response(self.conversation)
+            self.record({"type": "undo"})
+
+    def cancel_undo(self):
+        with self.lock, self.context.lock:
+            self.conversation, removed_context = self.undone
+            self.context.restore(removed_context)
+            self.record({"type": "undo_cancel"})
+
+    def apply_redo(self, ai_reply):
+        """Add the regenerated reply once the old one has been removed."""
+        with self.lock, self.context.lock:
+            self.append_conversation(f"\nPlayer: {self.last_player_name}: {self.last_player_input}\nDungeon Master: {ai_reply}")
+            self.context.add(f"{self.last_player_name}: {self.last_player_input}\nDungeon Master: {ai_reply}")
+            self.last_ai_reply = ai_reply
+            
+            with perf.span("world_state"):
+                update_world_state(self.last_player_input, ai_reply, self.player_choices, self.selected_genre, self.last_player_name)
+            self.record({"type": "redo", "reply": ai_reply})
+
+def main():
+    configure_logging()
+    health_monitor.start()
+    model_catalog.refresh()
+    choose_model()
+    session = GameSession()
+    session.models.warm_up()
+
+    session.save_index = save_index
+    slot = None
+
+    try:
+        if migrate_legacy_saves():
+            print(f"Moved your saved adventure into the '{DEFAULT_SLOT}' save slot.")
+    except Exception as e:
+        logging.error(f"Error migrating old save: {e}")
+
+    if save_index.entries():
+        print("\nSaved adventures:")
+        slot = choose_slot(prompt="Choose an adventure to continue", skip="start a new one")
+        if slot:
+            load_slot(session, slot)
+
+    if not session.adventure_started:
+        party = []
         while True:
             try:
                 num_players = int(input("How many players are there? (2-5): ").strip())
@@ -1469,11 +4268,6 @@ def main():
             party.append((name, player_class))
             print(f"{name} the {player_class} created!")
         
-        # Initialize per-player currency
-        for name, player_class in party:
-            start_currency = CLASS_STARTING_CURRENCY.get(selected_genre, {}).get(player_class, 10)
-            player_choices['currency'][name] = start_currency
-        
         locations = GENRE_LOCATIONS.get(selected_genre, [])
         if not locations:
             # Create 25 generic locations if none defined
@@ -1492,52 +4286,32 @@ def main():
                     break
             print(f"Invalid choice. Please enter a number between 1 and {len(locations)}.")
         
-        starter = get_role_starter(selected_genre, "any")
-        starting_scenario = f"{starter} at {starting_location}."
+        session.setup(selected_genre, party, starting_location)
         
         print(f"\n--- Adventure Start: The {selected_genre} Party ---")
         print(f"Party members:")
         for name, player_class in party:
             print(f"  - {name} the {player_class}")
         print(f"Starting location: {starting_location}")
-        print(f"Starting scenario: {starting_scenario}")
+        print(f"Starting scenario: {session.starting_scenario}")
         print("Type '/?' or '/help' for commands.\n")
 
-        initial_context = (
-            f"### Adventure Setting ###\n"
-            f"Genre: {selected_genre}\n"
-            f"Starting Location: {starting_location}\n"
-            f"Starting Scenario: {starting_scenario}\n"
-        )
-        
-        player_names = [name for name, _ in party]
-        player_classes = [player_class for _, player_class in party]
-        currency_name = CURRENCY_MAP.get(selected_genre, "currency")
-        dm_system_prompt = DM_SYSTEM_PROMPT.format(
-            num_players=num_players,
-            player_names=", ".join(player_names),
-            player_classes=", ".join(player_classes),
-            starting_location=starting_location,
-            currency_name=currency_name
-        )
-        
-        conversation = dm_system_prompt + "\n\n" + initial_context + "\n\nDungeon Master: "
+        slot = new_slot_name()
+        session.begin()
+        if session.adventure_started:
+            delete_slot(slot)
 
-        ai_reply = get_ai_response(conversation)
-        if ai_reply:
-            ai_reply = sanitize_response(ai_reply)
-            print(f"Dungeon Master: {ai_reply}")
-            speak(ai_reply)
-            conversation += ai_reply
-            last_ai_reply = ai_reply
-            
-            player_choices['consequences'].append(f"Start: {ai_reply.split('.')[0]}")
-            
-            adventure_started = True
+    if session.adventure_started and not session.journal:
+        try:
+            os.makedirs(SAVES_DIR, exist_ok=True)
+            session.autosave(slot_path(slot))
+        except Exception as e:
+            logging.error(f"Error starting autosave: {e}")
+            print("Autosave is unavailable. Details logged.")
 
-    while adventure_started:
+    while session.adventure_started:
         try:
-            current_player_name, current_player_class = party[current_player_index]
+            current_player_name, current_player_class = session.current_player
             
             user_input = input(f"\n{current_player_name}> ").strip()
             if not user_input:
@@ -1550,13 +4324,20 @@ def main():
                 continue
 
             if cmd == "/exit":
+                try:
+                    if session.journal:
+                        session.checkpoint()
+                        session.stop_autosave()
+                except Exception as e:
+                    logging.error(f"Error saving adventure: {e}")
+                audio_engine.close()
                 print("Exiting the adventure. Goodbye!")
                 break
                     
             if cmd == "/consequences":
                 print("\nRecent Consequences of Your Actions:")
-                if player_choices['consequences']:
-                    for i, cons in enumerate(player_choices['consequences'][-5:], 1):
+                if session.player_choices.consequences:
+                    for i, cons in enumerate(list(session.player_choices.consequences)[-5:], 1):
                         print(f"{i}. {cons}")
                 else:
                     print("No consequences recorded yet.")
@@ -1564,154 +4345,83 @@ def main():
                     
             if cmd == "/state":
                 print("\nCurrent World State:")
-                print(get_current_state(player_choices, selected_genre))
+                print(session.state_text(full=True))
+                continue
+                
+            if cmd == "/status":
+                print()
+                for line in session.models.report() + health_monitor.report():
+                    print(line)
                 continue
                 
+            if cmd.split()[0] == "/perf":
+                print()
+                print(perf_command(cmd))
+                continue
+
+            if cmd in ("/skip", "/stop") or cmd.split()[0] == "/volume":
+                print(audio_command(user_input))
+                continue
+
+            if cmd == "/cache":
+                print(tts_cache.report() if tts_cache is not None else "The narration cache is off.")
+                continue
+
             if cmd == "/players":
                 print("\nParty Members:")
-                for i, (name, player_class) in enumerate(party, 1):
+                for i, (name, player_class) in enumerate(session.party, 1):
                     print(f"{i}. {name} the {player_class}")
                 continue
 
             if cmd == "/redo":
-                if last_ai_reply and last_player_input and last_player_name:
-                    original_length = len(conversation)
-                    
-                    conversation = remove_last_ai_response(conversation)
-                    
-                    state_context = get_current_state(player_choices, selected_genre)
-                    currency_name = CURRENCY_MAP.get(selected_genre, "currency")
-                    full_conversation = (
-                        f"{DM_SYSTEM_PROMPT.format(num_players=num_players, player_names=', '.join([name for name, _ in party]), player_classes=', '.join([pc for _, pc in party]), starting_location=starting_location, currency_name=currency_name)}\n\n"
-                        f"### Current World State ###\n{state_context}\n\n"
-                        f"{conversation}\n"
-                        f"Player: {last_player_name}: {last_player_input}\n"
-                        "Dungeon Master:"
-                    )
-                    
-                    ai_reply = get_ai_response(full_conversation)
-                    if ai_reply:
-                        ai_reply = sanitize_response(ai_reply)
-                        print(f"\nDungeon Master: {ai_reply}")
-                        speak(ai_reply)
-                        
-                        conversation += f"\nPlayer: {last_player_name}: {last_player_input}\nDungeon Master: {ai_reply}"
-                        last_ai_reply = ai_reply
-                        
-                        update_world_state(last_player_input, ai_reply, player_choices, selected_genre, last_player_name)
-                    else:
-                        conversation = conversation[:original_length]
-                else:
+                if not session.redo():
                     print("Nothing to redo.")
                 continue
 
-            if cmd == "/save":
+            if cmd == "/saves":
+                print("\nSave Slots:")
+                for name, entry in save_index.listing():
+                    marker = " (current)" if name == slot else ""
+                    print(f"- {describe_slot(name, entry)}{marker}")
+                continue
+
+            if cmd.split()[0] == "/save":
+                new_slot = slot_name(user_input[len("/save"):])
+                if new_slot and new_slot != slot and new_slot in save_index.entries():
+                    if input(f"Slot '{new_slot}' already exists. Replace it? (y/n): ").strip().lower() != "y":
+                        continue
                 try:
-                    with open("adventure.txt", "w", encoding="utf-8") as f:
-                        f.write(conversation)
-                        f.write("\n\n### Party Information ###\n")
-                        f.write(f"Genre: {selected_genre}\n")
-                        f.write(f"Starting Location: {starting_location}\n")
-                        for name, player_class in party:
-                            f.write(f"- {name} ({player_class})\n")
-                        f.write("\n### Persistent World State ###\n")
-                        f.write(get_current_state(player_choices, selected_genre))
-                    print("Adventure saved to adventure.txt")
+                    if new_slot and new_slot != slot:
+                        # The old game's journal must not replay into this one
+                        delete_slot(new_slot)
+                        session.save(slot_path(new_slot))
+                        session.autosave(slot_path(new_slot))
+                        slot = new_slot
+                    else:
+                        session.save(slot_path(slot))
+                    print(f"Adventure saved to slot '{slot}'")
                 except Exception as e:
                     logging.error(f"Error saving adventure: {e}")
                     print("Error saving adventure. Details logged.")
                 continue
 
-            if cmd == "/load":
-                if os.path.exists("adventure.txt"):
-                    try:
-                        with open("adventure.txt", "r", encoding="utf-8") as f:
-                            content = f.read()
-                        
-                        if "### Party Information ###" in content:
-                            party_section = content.split("### Party Information ###")[1]
-                            party_section = party_section.split("### Persistent World State ###")[0].strip()
-                            
-                            genre_match = re.search(r"Genre: (.+)", party_section)
-                            if genre_match:
-                                selected_genre = genre_match.group(1).strip()
-                            
-                            loc_match = re.search(r"Starting Location: (.+)", party_section)
-                            if loc_match:
-                                starting_location = loc_match.group(1).strip()
-                            
-                            player_lines = [line.strip() for line in party_section.splitlines() if line.startswith("- ")]
-                            party = []
-                            for line in player_lines:
-                                match = re.match(r"- (.+?) \((.+?)\)", line)
-                                if match:
-                                    name = match.group(1).strip()
-                                    player_class = match.group(2).strip()
-                                    party.append((name, player_class))
-                            
-                            num_players = len(party)
-                        
-                        conversation = content.split("### Persistent World State ###")[0].strip()
-                        print("Adventure loaded.")
-                        last_dm_pos = conversation.rfind("Dungeon Master:")
-                        if last_dm_pos != -1:
-                            last_ai_reply = conversation[last_dm_pos + len("Dungeon Master:"):].strip()
-                        
-                        if "### Persistent World State ###" in content:
-                            state_section = content.split("### Persistent World State ###")[1]
-                            
-                            # Improved state parsing
-                            if "Currency (" in state_section:
-                                currency_section = state_section.split("Currency (")[1]
-                                currency_name = currency_section.split("):")[0]
-                                currency_lines = currency_section.split("):")[1]
-                                currency_pattern = r"- (.+?): (\d+)"
-                                currency_matches = re.findall(currency_pattern, currency_lines)
-                                for player, amount in currency_matches:
-                                    player_choices['currency'][player] = int(amount)
-                                
-                            if "Allies:" in state_section:
-                                allies_line = state_section.split("Allies:")[1].split("\n")[0].strip()
-                                if allies_line != "None":
-                                    player_choices['allies'] = [a.strip() for a in allies_line.split(",")]
-                            
-                            if "Enemies:" in state_section:
-                                enemies_line = state_section.split("Enemies:")[1].split("\n")[0].strip()
-                                if enemies_line != "None":
-                                    player_choices['enemies'] = [e.strip() for e in enemies_line.split(",")]
-                            
-                            if "Resources:" in state_section:
-                                resources_section = state_section.split("Resources:")[1]
-                                if "Faction Relationships:" in resources_section:
-                                    resources_section = resources_section.split("Faction Relationships:")[0]
-                                resource_pattern = r"- (.+?): (\d+)"
-                                resource_matches = re.findall(resource_pattern, resources_section)
-                                for resource, amount in resource_matches:
-                                    player_choices['resources'][resource.strip()] = int(amount)
-                            
-                            if "Consequences:" in state_section:
-                                cons_section = state_section.split("Consequences:")[1]
-                                if "Object States:" in cons_section:
-                                    cons_section = cons_section.split("Object States:")[0]
-                                cons_pattern = r"- (.+)"
-                                cons_matches = re.findall(cons_pattern, cons_section)
-                                for cons in cons_matches:
-                                    player_choices['consequences'].append(cons.strip())
-                            
-                            if "Object States:" in state_section:
-                                obj_section = state_section.split("Object States:")[1]
-                                obj_pattern = r"- (.+?): (.+)"
-                                obj_matches = re.findall(obj_pattern, obj_section)
-                                for obj, status in obj_matches:
-                                    player_choices['objects'][obj.strip()] = status.strip()
-                    except Exception as e:
-                        logging.error(f"Error loading adventure: {e}")
-                        print("Error loading adventure. Details logged.")
-                else:
-                    print("No saved adventure found.")
+            if cmd.split()[0] == "/load":
+                new_slot = slot_name(user_input[len("/load"):]) or choose_slot(prompt="Choose an adventure to load")
+                if not new_slot:
+                    continue
+                if new_slot not in save_index.entries():
+                    print(f"No save slot named '{new_slot}'. Type /saves to list them.")
+                    continue
+                if load_slot(session, new_slot):
+                    slot = new_slot
                 continue
 
-            if cmd == "/change":
+            if cmd.split()[0] == "/change":
+                # "/change summary" routes one kind of request, "/change" the rest
+                kind = cmd.split()[1] if len(cmd.split()) > 1 else None
+                if kind and kind not in session.models.routes:
+                    print(f"Unknown request type. Choose from: {', '.join(session.models.routes)}")
+                    continue
                 installed_models = get_installed_models()
                 if installed_models:
                     print("Available models:")
@@ -1724,8 +4434,9 @@ def main():
                         try:
                             idx = int(choice) - 1
                             if 0 <= idx < len(installed_models):
-                                ollama_model = installed_models[idx]
-                                print(f"Model changed to: {ollama_model}")
+                                session.models.select(installed_models[idx], kind)
+                                target = f"{kind.capitalize()} model" if kind else "Model"
+                                print(f"{target} changed to: {installed_models[idx]} (loading it now)")
                                 break
                         except ValueError:
                             pass
@@ -1748,73 +4459,10 @@ def main():
                     print(f"Error: {e}. Please enter valid integers.")
                 continue
 
-            valid, error_msg = validate_purchase(user_input, selected_genre, player_choices, current_player_name)
-            if not valid:
-                print(f"Dungeon Master: {error_msg}")
-                continue
-                
-            valid, error_msg = enforce_class_restrictions(user_input, current_player_class, selected_genre)
-            if not valid:
+            with perf.turn():
+                error_msg, _ = session.play_turn(user_input)
+            if error_msg:
                 print(f"Dungeon Master: {error_msg}")
-                continue
-
-            formatted_input = f"{current_player_name}: {user_input}"
-            last_player_input = user_input
-            last_player_name = current_player_name
-            
-            state_context = get_current_state(player_choices, selected_genre)
-            currency_name = CURRENCY_MAP.get(selected_genre, "currency")
-            full_conversation = (
-                f"{DM_SYSTEM_PROMPT.format(num_players=num_players, player_names=', '.join([name for name, _ in party]), player_classes=', '.join([pc for _, pc in party]), starting_location=starting_location, currency_name=currency_name)}\n\n"
-                f"### Current World State ###\n{state_context}\n\n"
-                f"{conversation}\n"
-                f"{formatted_input}\n"
-                "Dungeon Master:"
-            )
-            
-            ai_reply = get_ai_response(full_conversation)
-            
-            if ai_reply:
-                ai_reply = sanitize_response(ai_reply)
-                print(f"\nDungeon Master: {ai_reply}")
-                speak(ai_reply)
-                
-                conversation += f"\n{formatted_input}\nDungeon Master: {ai_reply}"
-                last_ai_reply = ai_reply
-                
-                update_world_state(user_input, ai_reply, player_choices, selected_genre, current_player_name)
-                
-                # Move to next player
-                current_player_index = (current_player_index + 1) % num_players
-                
-                # After all players have taken a turn, add DM narration
-                if current_player_index == 0:
-                    round_count += 1
-                    print(f"\n--- Round {round_count} Complete ---")
-                    
-                    # Generate DM narration for the round
-                    round_summary = get_round_summary(
-                        conversation, 
-                        player_choices, 
-                        selected_genre, 
-                        starting_location, 
-                        party
-                    )
-                    
-                    if round_summary:
-                        round_summary = sanitize_response(round_summary)
-                        print(f"\nDungeon Master (Round Summary): {round_summary}")
-                        speak(round_summary)
-                        
-                        # Update conversation and world state
-                        conversation += f"\nDungeon Master (Round Summary): {round_summary}"
-                        update_world_state(
-                            "Round Summary", 
-                            round_summary, 
-                            player_choices, 
-                            selected_genre, 
-                            "System"
-                        )
 
         except Exception as e:
             logging.error(f"Unexpected error in main loop: {e}")